@@ -48,15 +48,23 @@ from __init__ import (
 from config import Config
 from helpers import database
 from helpers.utils import UserSettings, get_readable_file_size, get_time_left as get_readable_time, is_url_safe
-from helpers.downloader import download_from_url, download_from_tg  # NEW
+from helpers.downloader import download_from_url, download_from_tg, helper_sessions  # NEW
+from helpers.preflight import preflight_url, queue_mismatches, format_preflight
 from helpers.uploader import upload_to_telegram, GofileUploader
 from helpers.merger import merge_videos  # NEW
+from helpers.loop_monitor import loop_monitor
+from helpers.http_client import http_client
+from helpers.rclone_rc import rclone_daemons
+from helpers.media_cache import media_cache
+from helpers.admission import disk_admission, estimate_merge_footprint
+from helpers.thumbnail import forget_thumbnails
 
 botStartTime = time.time()
 parent_id = Config.GDRIVE_FOLDER_ID
 
 async def delete_all(root: str):
     """Recursively remove all files under `root` directory."""
+    forget_thumbnails(root)
     if os.path.isdir(root):
         shutil.rmtree(root)
 
@@ -70,16 +78,31 @@ __all__ = [
 ]
 
 class MergeBot(Client):
-    def start(self):
-        super().start()
+    async def start(self):
+        await super().start()
+        loop_monitor.start()
+        await http_client.start()
+        if userBot and Config.TG_USERBOT_DOWNLOAD and LOGCHANNEL:
+            try:
+                await userBot.start()
+                helper_sessions.append(userBot)
+                LOGGER.info("User session will share large Telegram downloads")
+            except Exception as err:
+                LOGGER.error(f"User session could not be started for downloads: {err}")
         try:
-            self.send_message(chat_id=int(Config.OWNER), text="**ðŸš€ Enhanced Merge Bot Started!**\n\nâœ… URL Downloads: Enabled\nâœ… GoFile Upload: Available")
+            await self.send_message(chat_id=int(Config.OWNER), text="**ðŸš€ Enhanced Merge Bot Started!**\n\nâœ… URL Downloads: Enabled\nâœ… GoFile Upload: Available")
         except Exception as err:
             LOGGER.error("Boot alert failed! Please start bot in PM")
         return LOGGER.info("Enhanced Merge Bot Started!")
 
-    def stop(self):
-        super().stop()
+    async def stop(self):
+        loop_monitor.stop()
+        await rclone_daemons.stop()
+        await http_client.close()
+        if userBot in helper_sessions:
+            helper_sessions.remove(userBot)
+            await userBot.stop()
+        await super().stop()
         return LOGGER.info("Enhanced Merge Bot Stopped")
 
 mergeApp = MergeBot(
@@ -88,6 +111,7 @@ mergeApp = MergeBot(
     api_id=Config.TELEGRAM_API,
     bot_token=Config.BOT_TOKEN,
     workers=300,
+    max_concurrent_transmissions=Config.TG_MAX_TRANSMISSIONS,
     plugins=dict(root="plugins"),
     app_version="6.0+enhanced-mergebot",
 )
@@ -156,7 +180,7 @@ async def stats_handler(c: Client, m: Message):
     free = get_readable_file_size(free)
     sent = get_readable_file_size(psutil.net_io_counters().bytes_sent)
     recv = get_readable_file_size(psutil.net_io_counters().bytes_recv)
-    cpuUsage = psutil.cpu_percent(interval=0.5)
+    cpuUsage = await asyncio.to_thread(psutil.cpu_percent, 0.5)
     memory = psutil.virtual_memory().percent
     disk = psutil.disk_usage("/").percent
     
@@ -172,6 +196,10 @@ async def stats_handler(c: Client, m: Message):
         f"**â”œðŸ–¥ CPU : {cpuUsage}%**\n"
         f"**â”œâš™ï¸ RAM : {memory}%**\n"
         f"**â”œðŸ’¿ DISK : {disk}%**\n"
+        f"**â”œ Loop Lag : {loop_monitor.last_lag * 1000:.0f}ms (max {loop_monitor.recent_max_lag * 1000:.0f}ms)**\n"
+        f"**â”œ Disk Reserved : {get_readable_file_size(disk_admission.reserved)} ({disk_admission.waiting} job(s) waiting)**\n"
+        f"**â”œ HTTP Pool : {http_client.stats['connections_reused']} reused / {http_client.stats['connections_created']} new ({http_client.reuse_ratio:.0%} reuse)**\n"
+        f"**â”œ Media Cache : {get_readable_file_size(media_cache.size)} / {get_readable_file_size(media_cache.quota)}**\n"
         f"**â”‚**\n"
         f"**â”œðŸ”— URL Downloads : {'âœ… Enabled' if Config.ENABLE_URL_DOWNLOAD else 'âŒ Disabled'}**\n"
         f"**â”œðŸ“ GoFile Upload : {'âœ… Available' if Config.GOFILE_TOKEN else 'âš ï¸ No Token'}**\n"
@@ -216,12 +244,26 @@ async def url_handler(c: Client, m: Message):
         )
         return
     
+    # Pre-flight: check size and streams before anything is downloaded
+    status_msg = await m.reply_text("ðŸ”Ž **Checking links...**", quote=True)
+    results = await asyncio.gather(*[preflight_url(url) for url in valid_urls])
+    rejected = "".join(f"\nâŒ `{r['name']}`: {r['error']}" for r in results if r["error"])
+    results = [r for r in results if not r["error"]]
+    valid_urls = [r["url"] for r in results]
+    if not valid_urls:
+        await status_msg.edit_text(f"âŒ **Can't download these links!**\n{rejected}")
+        return
+    
     # Handle URL downloads based on merge mode
     if user.merge_mode == 5 or len(valid_urls) > 1:  # URL merge mode or multiple URLs
         if urlDB.get(user.user_id, None) is None:
             urlDB.update({user.user_id: {"urls": [], "downloaded_files": []}})
         
         urlDB.get(user.user_id)["urls"].extend(valid_urls)
+        preflight = urlDB.get(user.user_id).setdefault("preflight", {})
+        preflight.update({r["url"]: r for r in results})
+        mismatched = queue_mismatches(list(preflight.values()))
+        added = "\n".join(format_preflight(r, r["url"] in mismatched) for r in results)
         
         markup = InlineKeyboardMarkup([
             [InlineKeyboardButton("ðŸ“¥ Download & Merge", callback_data="download_urls")],
@@ -229,16 +271,17 @@ async def url_handler(c: Client, m: Message):
             [InlineKeyboardButton("ðŸ—‘ï¸ Clear Queue", callback_data="clear_url_queue")]
         ])
         
-        await m.reply_text(
+        await status_msg.edit_text(
             text=f"âœ… **Added {len(valid_urls)} URL(s) to download queue**\n\n"
+                 f"{added}\n{rejected}\n\n"
                  f"**Total URLs in queue:** {len(urlDB.get(user.user_id)['urls'])}\n\n"
                  f"Add more URLs or start downloading!",
             reply_markup=markup,
-            quote=True
+            disable_web_page_preview=True
         )
     else:
         # Single URL - download directly
-        status_msg = await m.reply_text("ðŸ“¥ **Starting download...**", quote=True)
+        await status_msg.edit_text("ðŸ“¥ **Starting download...**")
         downloaded_file = await download_from_url(valid_urls[0], user.user_id, status_msg)
         
         if downloaded_file:
@@ -302,6 +345,17 @@ async def files_handler(c: Client, m: Message):
             return
     
     if user.merge_mode == 4:  # extract_mode
+        await m.reply_text(
+            text="**Which streams do you want to extract?**",
+            reply_markup=InlineKeyboardMarkup(
+                bMaker.makebuttons(
+                    ["Audios", "Subtitles", "Audios & Subtitles", "Cancel"],
+                    [f"extract_audio_{m.id}", f"extract_subtitle_{m.id}", f"extract_all_{m.id}", "cancel"],
+                    rows=2,
+                )
+            ),
+            quote=True,
+        )
         return
 
     # Check if user is already processing files
@@ -350,6 +404,13 @@ async def files_handler(c: Client, m: Message):
             )
             return
 
+        if not disk_admission.could_fit(estimate_merge_footprint([media.file_size])):
+            await m.reply_text(
+                f"This file is too large to merge with the disk space available ({get_readable_file_size(media.file_size)}).",
+                quote=True,
+            )
+            return
+
         editable = await m.reply_text("Please Wait ...", quote=True)
         MessageText = "Okay,\nNow Send Me Next Video or Press **Merge Now** Button!"
 
@@ -546,6 +607,7 @@ try:
         name="enhanced-merge-bot-user",
         session_string=Config.USER_SESSION_STRING,
         no_updates=True,
+        max_concurrent_transmissions=Config.TG_MAX_TRANSMISSIONS,
     )
 except KeyError:
     userBot = None
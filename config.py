@@ -18,11 +18,50 @@ class Config(object):
     
     # NEW: Enhanced configurations for your features
     GOFILE_TOKEN = os.environ.get("GOFILE_TOKEN", None)
+    GOFILE_SERVER_TTL = int(os.environ.get("GOFILE_SERVER_TTL", "600"))
+    GOFILE_UPLOAD_RETRIES = int(os.environ.get("GOFILE_UPLOAD_RETRIES", "2"))
+    # Off by default: the streamed file is live-mode matroska without a seek index (Cues) or duration
+    UPLOAD_WHILE_MERGING = os.environ.get("UPLOAD_WHILE_MERGING", "False").lower() == "true"
+    RCLONE_STATS_INTERVAL = float(os.environ.get("RCLONE_STATS_INTERVAL", "5"))
+    RCLONE_DAEMON_IDLE = int(os.environ.get("RCLONE_DAEMON_IDLE", "600"))
     ENABLE_URL_DOWNLOAD = os.environ.get("ENABLE_URL_DOWNLOAD", "True").lower() == "true"
     MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", "3"))
+    TG_DOWNLOAD_WORKERS = int(os.environ.get("TG_DOWNLOAD_WORKERS", "4"))
+    TG_PARALLEL_THRESHOLD = int(os.environ.get("TG_PARALLEL_THRESHOLD", str(100 * 1024 * 1024)))
+    TG_USERBOT_DOWNLOAD = os.environ.get("TG_USERBOT_DOWNLOAD", "False").lower() == "true"
+    # pyrogram runs one transmission per client by default, which would serialize parallel parts and concurrent downloads
+    TG_MAX_TRANSMISSIONS = int(os.environ.get("TG_MAX_TRANSMISSIONS", str(max(1, TG_DOWNLOAD_WORKERS * MAX_CONCURRENT_DOWNLOADS))))
+    MAX_DOWNLOADS_PER_HOST = int(os.environ.get("MAX_DOWNLOADS_PER_HOST", "2"))
+    DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "2"))
     DOWNLOAD_TIMEOUT = int(os.environ.get("DOWNLOAD_TIMEOUT", "300"))
     DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "downloads")
+    MEDIA_CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", "cache")
+    MEDIA_CACHE_QUOTA = int(os.environ.get("MEDIA_CACHE_QUOTA", str(10 * 1024 ** 3)))  # 10GB default, 0 disables
+    PARTIAL_DOWNLOAD_DIR = os.environ.get("PARTIAL_DOWNLOAD_DIR", "partials")
+    PARTIAL_MAX_AGE = int(os.environ.get("PARTIAL_MAX_AGE", str(24 * 3600)))
+    DOWNLOAD_WRITE_BUFFER = int(os.environ.get("DOWNLOAD_WRITE_BUFFER", str(16 * 1024 * 1024)))
+    DOWNLOAD_SEGMENTS = int(os.environ.get("DOWNLOAD_SEGMENTS", "4"))
+    # Per-host override of DOWNLOAD_SEGMENTS, e.g. "pixeldrain.com:8,cdn.discordapp.com:2"
+    DOWNLOAD_SEGMENTS_PER_HOST = {
+        host.strip().lower(): int(count)
+        for host, _, count in (
+            item.partition(":") for item in os.environ.get("DOWNLOAD_SEGMENTS_PER_HOST", "").split(",") if item.strip()
+        )
+    }
     MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE", "4294967296"))  # 4GB default
+    DISK_HEADROOM = int(os.environ.get("DISK_HEADROOM", str(1024 ** 3)))  # 1GB always kept free
+    PREFLIGHT_TIMEOUT = int(os.environ.get("PREFLIGHT_TIMEOUT", "30"))
+    HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", "16"))
+    HTTP_DNS_CACHE_TTL = int(os.environ.get("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_KEEPALIVE_TIMEOUT = int(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    HTTP_CONNECT_TIMEOUT = int(os.environ.get("HTTP_CONNECT_TIMEOUT", "30"))
+    HTTP_READ_TIMEOUT = int(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+    PROBE_CACHE_SIZE = int(os.environ.get("PROBE_CACHE_SIZE", "256"))
+    FFMPEG_STALL_TIMEOUT = int(os.environ.get("FFMPEG_STALL_TIMEOUT", "300"))
+    FFMPEG_STDERR_LIMIT = int(os.environ.get("FFMPEG_STDERR_LIMIT", "65536"))
+    LOOP_LAG_WARN_MS = int(os.environ.get("LOOP_LAG_WARN_MS", "250"))
+    MAX_CONCURRENT_ENCODES = int(os.environ.get("MAX_CONCURRENT_ENCODES", str(max(1, (os.cpu_count() or 1) // 2))))
     
     # NEW: Supported URL domains for security
     SUPPORTED_DOMAINS = [
@@ -0,0 +1,192 @@
+# helpers/admission.py
+
+import asyncio
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from config import Config
+from __init__ import LOGGER
+from helpers.media_cache import media_cache
+from helpers.merge_planner import STRATEGY_COPY, STRATEGY_NORMALIZE, STRATEGY_REENCODE
+from helpers.utils import get_readable_file_size
+
+# How often queued jobs re-check free space, which can also change outside the bot.
+POLL_SECONDS = 10
+
+
+class InsufficientDiskSpace(Exception):
+    """The job can't fit on disk even with no other job running."""
+
+
+def estimate_merge_footprint(input_sizes: list, strategy: str = STRATEGY_COPY, transcoded_sizes: list = None) -> int:
+    """
+    Peak disk usage of a video merge: the inputs plus the merged output (about
+    the size of the inputs). Normalizing adds re-encoded copies of the
+    `transcoded_sizes` outliers, the robust path an intermediate of every input.
+    """
+    total = sum(size or 0 for size in input_sizes)
+    if strategy == STRATEGY_REENCODE:
+        return total * 3
+    if strategy == STRATEGY_NORMALIZE:
+        return total * 2 + sum(size or 0 for size in transcoded_sizes or [])
+    return total * 2
+
+
+def _written_since(path: str, since: float) -> int:
+    """
+    Bytes of the files under `path` written after `since`, counting hard-linked files once.
+    Media cache hits are linked in with their original mtime, so they cost nothing here.
+    """
+    seen, total = set(), 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            if st.st_mtime >= since and (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_size
+    return total
+
+
+class DiskAdmission:
+    """
+    Admits jobs only when their estimated peak disk usage fits.
+
+    Each running job holds a reservation for its workspace. The part of a
+    reservation the job hasn't written yet is subtracted from the free space,
+    so a job is admitted only if it fits next to everything already promised.
+    Jobs that don't fit wait in FIFO order until reservations are released.
+
+    Idle entries of `cache` count as free space: they are evicted to make room
+    before a job is refused or kept waiting.
+    """
+
+    def __init__(self, path: str, headroom: int, cache=None):
+        self.path = path
+        self.headroom = headroom
+        self.cache = cache
+        self._reservations = {}
+        self._queue = []
+        self._changed = asyncio.Event()
+
+    @property
+    def reserved(self) -> int:
+        return sum(size for _, size, _ in self._reservations.values())
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _shared_cache(self):
+        """The media cache, if evicting from it frees space on our disk."""
+        if self.cache is None or not self.cache.enabled:
+            return None
+        try:
+            if os.stat(self.cache.root).st_dev != os.stat(self.path).st_dev:
+                return None
+        except OSError:
+            return None
+        return self.cache
+
+    def _reclaimable(self) -> int:
+        cache = self._shared_cache()
+        return cache.reclaimable if cache else 0
+
+    def could_fit(self, size: int) -> bool:
+        """True if `size` bytes could be admitted once every other job has finished and the cache is emptied."""
+        os.makedirs(self.path, exist_ok=True)
+        usage = shutil.disk_usage(self.path)
+        return size <= usage.free + self._reclaimable() + self.reserved - self.headroom
+
+    async def available(self) -> int:
+        """Free bytes not yet promised to a running job."""
+        os.makedirs(self.path, exist_ok=True)
+        free = shutil.disk_usage(self.path).free
+        outstanding = 0
+        for workspace, size, since in self._reservations.values():
+            used = await asyncio.to_thread(_written_since, workspace, since) if os.path.exists(workspace) else 0
+            outstanding += max(0, size - used)
+        return free - outstanding - self.headroom
+
+    async def _make_room(self, size: int) -> bool:
+        """True if `size` bytes are available, evicting idle cache entries when that's enough to get there."""
+        short = size - await self.available()
+        if short <= 0:
+            return True
+        cache = self._shared_cache()
+        if cache is None or cache.reclaimable < short:
+            return False
+        freed = cache.release(short)
+        LOGGER.info(f"Evicted {get_readable_file_size(freed)} from the media cache to make room for a job")
+        return await self.available() >= size
+
+    async def grow(self, workspace: str, size: int):
+        """
+        Raises the reservation held for `workspace` to `size`, once a job knows it needs more
+        than it was admitted with. Doesn't wait: a running job is never put back in the queue.
+        """
+        for ticket, (reserved_workspace, reserved, since) in self._reservations.items():
+            if os.path.normpath(reserved_workspace) != os.path.normpath(workspace) or size <= reserved:
+                continue
+            if not await self._make_room(size - reserved):
+                LOGGER.warning(f"Growing the disk reservation of {workspace} to {get_readable_file_size(size)} overcommits the disk")
+            self._reservations[ticket] = (reserved_workspace, size, since)
+            LOGGER.info(f"Grew disk reservation of {workspace} to {get_readable_file_size(size)}")
+            return
+
+    @asynccontextmanager
+    async def reserve(self, workspace: str, size: int, status_message=None):
+        """
+        Holds a reservation of `size` bytes for `workspace` for the duration of the block,
+        waiting for space first if needed.
+
+        raises: InsufficientDiskSpace if `size` can never fit.
+        """
+        ticket = object()
+        self._queue.append(ticket)
+        position = None
+        try:
+            while True:
+                if not self.could_fit(size):
+                    raise InsufficientDiskSpace(
+                        f"Needs about {get_readable_file_size(size)}, "
+                        f"the disk only has {get_readable_file_size(shutil.disk_usage(self.path).free)} free."
+                    )
+                if self._queue[0] is ticket and await self._make_room(size):
+                    break
+                if status_message and position != self._queue.index(ticket):
+                    position = self._queue.index(ticket)
+                    try:
+                        await status_message.edit_text(
+                            f"⏳ **Waiting for disk space...**\n"
+                            f"➢ **Needed:** `{get_readable_file_size(size)}`\n"
+                            f"➢ **Jobs ahead:** `{position}`"
+                        )
+                    except Exception:
+                        pass
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(ticket)
+            self._notify()
+
+        self._reservations[ticket] = (workspace, size, time.time())
+        LOGGER.info(f"Reserved {get_readable_file_size(size)} of disk for {workspace}")
+        try:
+            yield
+        finally:
+            del self._reservations[ticket]
+            self._notify()
+
+
+disk_admission = DiskAdmission(Config.DOWNLOAD_DIR, Config.DISK_HEADROOM, media_cache)
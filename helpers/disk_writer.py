@@ -0,0 +1,132 @@
+# helpers/disk_writer.py
+
+import asyncio
+import os
+import queue
+import threading
+from config import Config
+from __init__ import LOGGER
+
+
+class DiskWriter:
+    """
+    Write-behind file writer.
+
+    Chunks handed to `write` are queued and written to disk by a dedicated
+    thread, so slow storage never blocks the event loop. At most `buffer_size`
+    bytes can be queued; beyond that `write` waits for the thread to catch up,
+    which in turn slows down the socket reads feeding it.
+
+    A write error in the thread is raised from the next `write`, `flush` or `close`.
+    """
+
+    def __init__(self, path: str, truncate: bool = False, buffer_size: int = None):
+        self.path = path
+        self.buffer_size = buffer_size or Config.DOWNLOAD_WRITE_BUFFER
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+        self._fd = os.open(path, flags, 0o644)
+        self._loop = asyncio.get_running_loop()
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._drained = asyncio.Event()
+        self._finished = self._loop.create_future()
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"writer:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    async def write(self, data: bytes, offset: int = None):
+        """Queues `data` for writing at `offset`, or at the current file position if None."""
+        self._raise_if_failed()
+        # A single chunk larger than the whole buffer is still accepted once everything else is written.
+        while self._pending and self._pending + len(data) > self.buffer_size:
+            self._drained.clear()
+            await self._drained.wait()
+            self._raise_if_failed()
+        self._pending += len(data)
+        self._queue.put(("write", data, offset))
+
+    def call_after_writes(self, callback):
+        """
+        Runs `callback` on the writer thread once every chunk queued so far is on
+        disk. Skipped if a write has failed, so it can safely record progress.
+        """
+        self._queue.put(("call", callback, None))
+
+    async def flush(self):
+        """Waits until every queued chunk has been written."""
+        done = self._loop.create_future()
+        self._queue.put(("flush", done, None))
+        await asyncio.shield(done)
+        self._raise_if_failed()
+
+    async def close(self):
+        """Writes out the queue, stops the thread and closes the file."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        await asyncio.shield(self._finished)
+        self._raise_if_failed()
+
+    def _release(self, size: int):
+        self._pending -= size
+        self._drained.set()
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            LOGGER.error(f"Disk write to {self.path} failed: {error}")
+            self._error = error
+        self._drained.set()
+
+    def _run(self):
+        failed = False
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                kind, payload, offset = item
+                if kind == "flush":
+                    self._loop.call_soon_threadsafe(_resolve, payload)
+                    continue
+                if failed:
+                    # Keep draining so writers waiting for buffer space are released.
+                    if kind == "write":
+                        self._loop.call_soon_threadsafe(self._release, len(payload))
+                    continue
+                try:
+                    if kind == "call":
+                        payload()
+                        continue
+                    view = memoryview(payload)
+                    while view:
+                        if offset is None:
+                            written = os.write(self._fd, view)
+                        else:
+                            written = os.pwrite(self._fd, view, offset)
+                            offset += written
+                        view = view[written:]
+                except Exception as e:
+                    failed = True
+                    self._loop.call_soon_threadsafe(self._fail, e)
+                finally:
+                    if kind == "write":
+                        self._loop.call_soon_threadsafe(self._release, len(payload))
+        finally:
+            try:
+                os.close(self._fd)
+            except OSError as e:
+                self._loop.call_soon_threadsafe(self._fail, e)
+            self._loop.call_soon_threadsafe(_resolve, self._finished)
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -1,10 +1,19 @@
 # helpers/downloader.py (Fixed imports)
 
 import aiohttp
+import asyncio
+import hashlib
+import json
 import os
+import shutil
 import time
+from urllib.parse import unquote, urlparse
 from config import Config
+from __init__ import LOGGER
 from helpers.utils import get_readable_file_size, get_progress_bar
+from helpers.http_client import http_client
+from helpers.disk_writer import DiskWriter
+from helpers.media_cache import media_cache
 
 # --- Throttling Logic ---
 last_edit_time = {}
@@ -29,55 +38,510 @@ async def smart_progress_editor(status_message, text: str):
         except Exception:
             pass
 
-async def download_from_url(url: str, user_id: int, status_message) -> str or None:
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+URL_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+MANIFEST_SUFFIX = ".part.json"
+MANIFEST_SAVE_INTERVAL = 2.0
+
+class RemoteFileChanged(Exception):
+    """The file behind a URL changed since its partial download was started."""
+
+def _url_file_name(url: str) -> str:
+    """Stable local file name for `url`, so retrying the same link finds its partial download."""
+    name = os.path.basename(unquote(urlparse(url).path))
+    return name or f"video_{hashlib.sha1(url.encode()).hexdigest()[:12]}.mp4"
+
+def _url_timeout():
+    # No total limit (large files legitimately take long); DOWNLOAD_TIMEOUT bounds how long a connection may stay silent.
+    return aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=Config.DOWNLOAD_TIMEOUT)
+
+def _segments_for(url: str) -> int:
+    """Number of parallel range connections to use for `url`'s host."""
+    host = (urlparse(url).hostname or "").lower()
+    for pattern, count in Config.DOWNLOAD_SEGMENTS_PER_HOST.items():
+        if host == pattern or host.endswith("." + pattern):
+            return max(1, count)
+    return max(1, Config.DOWNLOAD_SEGMENTS)
+
+async def fetch_url_info(session, url: str) -> dict:
+    """
+    HEAD request to find out if `url` can be fetched in byte ranges.
+
+    returns: dict with the final `url` after redirects, `size` (0 if unknown),
+    `ranges` support and the `etag` / `last_modified` validators.
+    """
+    info = {"url": url, "size": 0, "ranges": False, "etag": None, "last_modified": None}
+    try:
+        async with session.head(url, allow_redirects=True, timeout=_url_timeout()) as resp:
+            if resp.status != 200:
+                return info
+            info.update(
+                url=str(resp.url),
+                size=int(resp.headers.get('content-length', 0) or 0),
+                ranges=resp.headers.get('accept-ranges', '').lower() == 'bytes',
+                etag=resp.headers.get('etag'),
+                last_modified=resp.headers.get('last-modified'),
+            )
+    except Exception as e:
+        LOGGER.info(f"HEAD failed for {url}, using a single stream: {e}")
+    return info
+
+def _if_range(info: dict) -> str | None:
+    """Validator for the If-Range header. Weak ETags aren't allowed there, so fall back to Last-Modified."""
+    etag = info.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return info.get("last_modified")
+
+def _load_manifest(manifest_path: str, part_path: str, url: str, info: dict) -> dict | None:
+    """Returns the saved partial download state if it still matches the remote file."""
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        manifest.get("url") != url
+        or manifest.get("size") != info["size"]
+        or manifest.get("etag") != info["etag"]
+        or manifest.get("last_modified") != info["last_modified"]
+        or not os.path.exists(part_path)
+        or os.path.getsize(part_path) != info["size"]
+    ):
+        return None
+    return manifest
+
+def _save_manifest(manifest_path: str, manifest: dict):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+def _new_manifest(url: str, info: dict, segments: int) -> dict:
+    """Fresh download state. Each segment is [first byte, last byte, next byte to fetch]."""
+    total_size = info["size"]
+    segment_size = -(-total_size // segments)
+    return {
+        "url": url,
+        "size": total_size,
+        "etag": info["etag"],
+        "last_modified": info["last_modified"],
+        "segments": [
+            [start, min(start + segment_size, total_size) - 1, start]
+            for start in range(0, total_size, segment_size)
+        ],
+    }
+
+def _remove_partial(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _preallocate(path: str, size: int):
+    """Creates `path` with `size` bytes reserved."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError:
+        # Filesystems without fallocate support still take a sparse file.
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+async def _fetch_segment(session, url: str, writer: DiskWriter, segment: list, if_range: str, on_chunk):
+    """
+    Downloads the rest of `segment` through `writer` at its offset, advancing
+    its next-byte pointer as data is queued.
+
+    Dropped connections are retried from the last written byte with exponential
+    backoff. Only attempts that made no progress count towards `DOWNLOAD_RETRIES`.
+    """
+    end = segment[1]
+    failures = 0
+    while segment[2] <= end:
+        resumed_from = segment[2]
+        headers = {"Range": f"bytes={segment[2]}-{end}"}
+        if if_range:
+            headers["If-Range"] = if_range
+        try:
+            async with session.get(url, headers=headers, timeout=_url_timeout()) as resp:
+                if resp.status == 200 and if_range:
+                    raise RemoteFileChanged("Server sent the full file instead of the requested range")
+                if resp.status != 206:
+                    raise Exception(f"Server ignored range request (status {resp.status})")
+                async for chunk in resp.content.iter_chunked(URL_CHUNK_SIZE):
+                    chunk = chunk[: end + 1 - segment[2]]
+                    await writer.write(chunk, segment[2])
+                    segment[2] += len(chunk)
+                    await on_chunk(len(chunk))
+                    if segment[2] > end:
+                        break
+            if segment[2] <= end:
+                raise Exception(f"Connection closed at byte {segment[2]} of range {segment[0]}-{end}")
+        except (RemoteFileChanged, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            if writer.failed:
+                raise
+            failures = 1 if segment[2] > resumed_from else failures + 1
+            if failures > Config.DOWNLOAD_RETRIES + 1:
+                raise
+            delay = 2 ** (failures - 1)
+            LOGGER.warning(f"Range {segment[0]}-{end} of {url} interrupted at byte {segment[2]}, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+
+async def _download_ranges(session, url: str, part_path: str, manifest_path: str, manifest: dict, if_range: str, on_chunk):
+    """Fetches every unfinished segment concurrently, checkpointing progress to the manifest."""
+    last_save = time.time()
+
+    async def checkpoint(size):
+        nonlocal last_save
+        await on_chunk(size)
+        if time.time() - last_save > MANIFEST_SAVE_INTERVAL:
+            # Saved by the writer thread once the bytes it records are actually on disk.
+            snapshot = json.loads(json.dumps(manifest))
+            writer.call_after_writes(lambda: _save_manifest(manifest_path, snapshot))
+            last_save = time.time()
+
+    _save_manifest(manifest_path, manifest)
+    writer = DiskWriter(part_path)
+    try:
+        tasks = [
+            asyncio.ensure_future(_fetch_segment(session, url, writer, segment, if_range, checkpoint))
+            for segment in manifest["segments"]
+            if segment[2] <= segment[1]
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        try:
+            await writer.close()
+        finally:
+            if writer.failed:
+                # Queued progress may never have reached the disk.
+                _remove_partial(manifest_path)
+            else:
+                # Also written on failure, so the next attempt resumes from here.
+                _save_manifest(manifest_path, manifest)
+
+async def _download_single(session, url: str, part_path: str, on_chunk):
+    """Plain sequential download, for servers without range support. Retries start over."""
+    for attempt in range(Config.DOWNLOAD_RETRIES + 1):
+        written = 0
+        try:
+            async with session.get(url, timeout=_url_timeout()) as resp:
+                if resp.status != 200:
+                    raise Exception(f"Status {resp.status}")
+                total_size = int(resp.headers.get('content-length', 0) or 0)
+                writer = DiskWriter(part_path, truncate=True)
+                try:
+                    async for chunk in resp.content.iter_chunked(URL_CHUNK_SIZE):
+                        await writer.write(chunk)
+                        written += len(chunk)
+                        await on_chunk(len(chunk), total_size)
+                finally:
+                    await writer.close()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await on_chunk(-written, 0)
+            if attempt == Config.DOWNLOAD_RETRIES:
+                raise
+            LOGGER.warning(f"Download of {url} failed (attempt {attempt + 1}), retrying: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+def _url_paths(url: str, user_id: int) -> tuple:
+    """
+    returns: (file name, destination path, `.part` path, manifest path) for a URL download.
+
+    Each URL gets its own folder named after a hash of the full URL, so links
+    ending in the same file name (`?id=1` / `?id=2`, or `video.mp4` on two
+    hosts) never share a file, while retrying one link still finds its partial download.
+    The `.part` file and its manifest live under PARTIAL_DOWNLOAD_DIR, so
+    cleaning up a job's workspace doesn't throw away what a retry could resume.
+    """
+    file_name = _url_file_name(url)
+    url_key = f"url_{hashlib.sha1(url.encode()).hexdigest()[:12]}"
+    url_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id), url_key)
+    partial_dir = os.path.join(Config.PARTIAL_DOWNLOAD_DIR, str(user_id), url_key)
+    os.makedirs(url_dir, exist_ok=True)
+    os.makedirs(partial_dir, exist_ok=True)
+    part_path = os.path.join(partial_dir, file_name + PART_SUFFIX)
+    return file_name, os.path.join(url_dir, file_name), part_path, os.path.join(partial_dir, file_name + MANIFEST_SUFFIX)
+
+def prune_partials(max_age: float = None):
+    """Deletes partial URL downloads that nothing has written to for `max_age` seconds (PARTIAL_MAX_AGE)."""
+    max_age = Config.PARTIAL_MAX_AGE if max_age is None else max_age
+    cutoff = time.time() - max_age
+    if not os.path.isdir(Config.PARTIAL_DOWNLOAD_DIR):
+        return
+    for user_dir in os.scandir(Config.PARTIAL_DOWNLOAD_DIR):
+        if not user_dir.is_dir():
+            continue
+        for url_dir in os.scandir(user_dir.path):
+            try:
+                newest = max([entry.stat().st_mtime for entry in os.scandir(url_dir.path)], default=url_dir.stat().st_mtime)
+            except OSError:
+                continue
+            if newest < cutoff:
+                shutil.rmtree(url_dir.path, ignore_errors=True)
+                LOGGER.info(f"Pruned stale partial download {url_dir.path}")
+
+async def _download_url_file(url: str, user_id: int, progress) -> str:
+    """
+    Downloads one URL into the user's folder, raising on failure.
+
+    When the server supports byte ranges, the file is split into segments
+    (`DOWNLOAD_SEGMENTS`, overridable per host) that are fetched over parallel
+    connections. Otherwise it falls back to a single stream.
+
+    Ranged downloads go to `<name>.part` with a `<name>.part.json` manifest of
+    the bytes fetched so far and the server's validators. Interrupted segments
+    are retried from their last byte, and a failed or interrupted download
+    (including a bot restart) resumes when the same URL is downloaded again.
+
+    Files the server sends validators for are kept in the shared media cache,
+    so the same URL is only fetched once while it stays unchanged.
+
+    - `progress`: async callable receiving (downloaded bytes, total bytes, mode label).
+    """
+    prune_partials()
+    file_name, dest_path, part_path, manifest_path = _url_paths(url, user_id)
+    session = http_client.session
+    info = await fetch_url_info(session, url)
+    if info["size"] > Config.MAX_FILE_SIZE:
+        raise Exception(
+            f"File is {get_readable_file_size(info['size'])}, "
+            f"the limit is {get_readable_file_size(Config.MAX_FILE_SIZE)}"
+        )
+    downloaded = 0
+
+    async def fetch():
+        try:
+            await fetch_to_part()
+        except BaseException:
+            # Without a manifest the partial file can't be resumed, so don't leave it behind.
+            if not os.path.exists(manifest_path):
+                _remove_partial(part_path)
+            raise
+        await asyncio.to_thread(shutil.move, part_path, dest_path)
+        _remove_partial(manifest_path)
+        try:
+            os.rmdir(os.path.dirname(part_path))
+        except OSError:
+            pass
+        return dest_path
+
+    async def fetch_to_part():
+        nonlocal downloaded
+        if info["ranges"] and info["size"] > 0:
+            manifest = _load_manifest(manifest_path, part_path, url, info)
+            if manifest:
+                mode = " (resumed)"
+            else:
+                segments = max(1, min(_segments_for(url), info["size"] // MIN_SEGMENT_SIZE))
+                manifest = _new_manifest(url, info, segments)
+                _preallocate(part_path, info["size"])
+                mode = f" ({segments} connections)" if segments > 1 else ""
+            downloaded = sum(segment[2] - segment[0] for segment in manifest["segments"])
+
+            async def on_chunk(size):
+                nonlocal downloaded
+                downloaded += size
+                await progress(downloaded, info["size"], mode)
+
+            try:
+                await _download_ranges(session, info["url"], part_path, manifest_path, manifest, _if_range(info), on_chunk)
+            except RemoteFileChanged:
+                _remove_partial(part_path, manifest_path)
+                raise
+        else:
+            async def on_chunk(size, total):
+                nonlocal downloaded
+                downloaded += size
+                await progress(downloaded, total, "")
+
+            await _download_single(session, info["url"], part_path, on_chunk)
+
+    cache_key = media_cache.url_key(url, info["etag"], info["last_modified"], info["size"])
+    return await media_cache.get_or_fetch(cache_key, dest_path, fetch)
+
+async def download_from_url(url: str, user_id: int, status_message) -> str | None:
     """Downloads a file from a direct URL with smart progress reporting."""
-    file_name = url.split('/')[-1] or f"video_{int(time.time())}.mp4"
-    user_download_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
-    os.makedirs(user_download_dir, exist_ok=True)
-    dest_path = os.path.join(user_download_dir, file_name)
+    file_name, _, _, manifest_path = _url_paths(url, user_id)
+
+    async def progress_func(current, total, mode):
+        if total > 0:
+            progress = current / total
+            progress_text = (
+                f"📥 **Downloading from URL...**{mode}\n"
+                f"➢ `{file_name}`\n"
+                f"➢ {get_progress_bar(progress)} `{progress:.1%}`\n"
+                f"➢ **Size:** `{get_readable_file_size(current)}` / `{get_readable_file_size(total)}`"
+            )
+            await smart_progress_editor(status_message, progress_text)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=30) as resp:
-                if resp.status == 200:
-                    total_size = int(resp.headers.get('content-length', 0))
-                    downloaded = 0
-
-                    with open(dest_path, 'wb') as f:
-                        async for chunk in resp.content.iter_chunked(1024 * 1024):
-                            f.write(chunk)
-                            downloaded += len(chunk)
-
-                            if total_size > 0:
-                                progress = downloaded / total_size
-                                progress_text = (
-                                    f"📥 **Downloading from URL...**\n"
-                                    f"➢ `{file_name}`\n"
-                                    f"➢ {get_progress_bar(progress)} `{progress:.1%}`\n"
-                                    f"➢ **Size:** `{get_readable_file_size(downloaded)}` / `{get_readable_file_size(total_size)}`"
-                                )
-                                await smart_progress_editor(status_message, progress_text)
-
-                    await status_message.edit_text(f"✅ **Downloaded:** `{file_name}`\n\nPreparing to merge...")
-                    return dest_path
-                else:
-                    await status_message.edit_text(f"❌ **Download Failed!**\nStatus: {resp.status} for URL: `{url}`")
-                    return None
+        dest_path = await _download_url_file(url, user_id, progress_func)
+        await status_message.edit_text(f"✅ **Downloaded:** `{file_name}`\n\nPreparing to merge...")
+        return dest_path
     except Exception as e:
+        LOGGER.warning(f"URL download failed for {url}: {e}")
+        resumable = os.path.exists(manifest_path)
         try:
-            await status_message.edit_text(f"❌ **Download Failed!**\nError: `{str(e)}`")
+            await status_message.edit_text(
+                f"❌ **Download Failed!**\nError: `{str(e)}`\nURL: `{url}`"
+                + ("\n\nProgress was saved, send the link again to resume." if resumable else "")
+            )
         except Exception:
             pass
         return None
 
-async def download_from_tg(message, user_id: int, status_message) -> str or None:
-    """Downloads a file from Telegram with smart progress reporting."""
-    user_download_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
-    os.makedirs(user_download_dir, exist_ok=True)
+def _tg_media(message):
+    return message.video or message.document or message.audio
 
+def _tg_file_name(message) -> str:
+    media = _tg_media(message)
+    return media.file_name if media and media.file_name else "telegram_video.mp4"
+
+# pyrogram's stream_media works in fixed 1MB chunks; offsets and limits are counted in chunks.
+TG_CHUNK_SIZE = 1024 * 1024
+
+# Extra logged-in sessions (e.g. the premium user session) that large downloads
+# can spread their parts over. Registered by the bot at startup.
+helper_sessions = []
+
+async def _mirror_message(session, message):
+    """
+    Makes `message` readable by another session by copying it to the log channel.
+
+    returns: (copy as seen by the bot, the same message as seen by `session`)
+    """
+    copy = await message.copy(int(Config.LOGCHANNEL))
+    return copy, await session.get_messages(int(Config.LOGCHANNEL), copy.id)
+
+async def _download_tg_parallel(message, file_path: str, total_size: int, progress):
+    """
+    Downloads a large Telegram file as `TG_DOWNLOAD_WORKERS` parts fetched
+    concurrently with `stream_media` and written at their offsets. Parts are
+    spread over the bot session and any `helper_sessions`. A dropped part is
+    retried from its last complete chunk.
+    """
+    sources = [(message._client, message)]
+    mirrors = []
+    for session in helper_sessions:
+        try:
+            copy, mirrored = await _mirror_message(session, message)
+            mirrors.append(copy)
+            sources.append((session, mirrored))
+        except Exception as e:
+            LOGGER.warning(f"Could not share message {message.id} with a helper session: {e}")
+
+    total_chunks = -(-total_size // TG_CHUNK_SIZE)
+    workers = max(1, min(Config.TG_DOWNLOAD_WORKERS, total_chunks))
+    part_chunks = -(-total_chunks // workers)
+    downloaded = 0
+
+    async def fetch_part(index: int, first_chunk: int, last_chunk: int):
+        nonlocal downloaded
+        client, source = sources[index % len(sources)]
+        next_chunk = first_chunk
+        for attempt in range(Config.DOWNLOAD_RETRIES + 1):
+            offset = next_chunk * TG_CHUNK_SIZE
+            try:
+                async for chunk in client.stream_media(source, limit=last_chunk - next_chunk, offset=next_chunk):
+                    await writer.write(chunk, offset)
+                    offset += len(chunk)
+                    downloaded += len(chunk)
+                    if len(chunk) == TG_CHUNK_SIZE:
+                        next_chunk += 1
+                    await progress(downloaded, total_size)
+                if offset >= min(last_chunk * TG_CHUNK_SIZE, total_size):
+                    return
+                raise Exception(f"Part ended early at byte {offset}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if writer.failed or attempt == Config.DOWNLOAD_RETRIES:
+                    raise
+                # Bytes of the incomplete chunk are fetched again.
+                downloaded -= offset - next_chunk * TG_CHUNK_SIZE
+                LOGGER.warning(f"Part {index} of message {message.id} failed at byte {offset}, retrying: {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    _preallocate(file_path, total_size)
+    writer = DiskWriter(file_path)
+    try:
+        tasks = [
+            asyncio.ensure_future(fetch_part(i, first, min(first + part_chunks, total_chunks)))
+            for i, first in enumerate(range(0, total_chunks, part_chunks))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        await writer.close()
+        for copy in mirrors:
+            try:
+                await copy.delete()
+            except Exception:
+                pass
+    return file_path
+
+async def download_tg_media(message, file_path: str, progress) -> str:
+    """
+    Downloads a Telegram message's media to `file_path`, raising on failure.
+
+    Files of at least `TG_PARALLEL_THRESHOLD` bytes are fetched in parallel
+    parts; smaller ones use pyrogram's regular sequential download.
+    """
+    total_size = getattr(_tg_media(message), "file_size", 0) or 0
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    if Config.TG_DOWNLOAD_WORKERS > 1 and total_size >= Config.TG_PARALLEL_THRESHOLD:
+        try:
+            return await _download_tg_parallel(message, file_path, total_size, progress)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+    downloaded_path = await message.download(file_name=file_path, progress=progress)
+    if not downloaded_path:
+        raise Exception("Download returned no file")
+    return downloaded_path
+
+async def _download_tg_file(message, user_id: int, progress) -> str:
+    """Downloads one Telegram file into its own folder, raising on failure."""
+    # One folder per message so concurrent downloads of same-named files can't clash.
+    message_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id), str(message.id))
+    os.makedirs(message_dir, exist_ok=True)
+
+    file_path = os.path.join(message_dir, _tg_file_name(message))
+    return await media_cache.get_or_fetch(
+        media_cache.telegram_key(_tg_media(message)),
+        file_path,
+        lambda: download_tg_media(message, file_path, progress),
+    )
+
+async def download_from_tg(message, user_id: int, status_message) -> str | None:
+    """Downloads a file from Telegram with smart progress reporting."""
     async def progress_func(current, total):
         progress = current / total
-        file_name = message.video.file_name if message.video and message.video.file_name else "telegram_video.mp4"
+        file_name = _tg_file_name(message)
 
         progress_text = (
             f"📥 **Downloading from Telegram...**\n"
@@ -88,10 +552,7 @@ async def download_from_tg(message, user_id: int, status_message) -> str or None
         await smart_progress_editor(status_message, progress_text)
 
     try:
-        file_path = await message.download(
-            file_name=os.path.join(user_download_dir, ''),
-            progress=progress_func
-        )
+        file_path = await _download_tg_file(message, user_id, progress_func)
         file_name = os.path.basename(file_path)
         await status_message.edit_text(f"✅ **Downloaded:** `{file_name}`\n\nPreparing to merge...")
         return file_path
@@ -101,3 +562,176 @@ async def download_from_tg(message, user_id: int, status_message) -> str or None
         except Exception:
             pass
         return None
+
+DOWNLOAD_STATE_ICONS = {
+    "queued": "⏳",
+    "downloading": "📥",
+    "retrying": "🔁",
+    "done": "✅",
+    "failed": "❌",
+}
+
+def render_batch_progress(title: str, states: list) -> str:
+    """One status text for a batch of downloads: overall bar plus a line per file."""
+    done_bytes = sum(state["current"] for state in states)
+    total_bytes = sum(state["total"] for state in states)
+    progress = done_bytes / total_bytes if total_bytes else 0
+    lines = [
+        title,
+        f"➢ {get_progress_bar(progress)} `{progress:.1%}`",
+        f"➢ **Size:** `{get_readable_file_size(done_bytes)}` / `{get_readable_file_size(total_bytes)}`",
+        "",
+    ]
+    for i, state in enumerate(states, start=1):
+        file_progress = state["current"] / state["total"] if state["total"] else 0
+        name = state["name"] if len(state["name"]) <= 40 else state["name"][:37] + "..."
+        lines.append(f"{DOWNLOAD_STATE_ICONS[state['state']]} `{i}. {name}` `{file_progress:.0%}`")
+    return "\n".join(lines)
+
+def start_tg_downloads(messages, user_id: int, status_message, concurrency: int = None, fail_fast: bool = False) -> list:
+    """
+    Starts Telegram downloads as tasks, in queue order, with at most `concurrency`
+    (default `MAX_CONCURRENT_DOWNLOADS`) running at once and one combined progress message.
+
+    Each file is retried `DOWNLOAD_RETRIES` times with backoff. Each task resolves
+    to the downloaded file path, or None if that file failed. With `fail_fast`, the
+    first failure cancels the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or Config.MAX_CONCURRENT_DOWNLOADS))
+    states = [
+        {
+            "name": _tg_file_name(message),
+            "current": 0,
+            "total": getattr(_tg_media(message), "file_size", 0) or 0,
+            "state": "queued",
+        }
+        for message in messages
+    ]
+    tasks = []
+
+    async def report():
+        await smart_progress_editor(
+            status_message,
+            render_batch_progress(f"📥 **Downloading {len(states)} file(s) from Telegram...**", states),
+        )
+
+    async def download(index: int, message):
+        state = states[index]
+
+        async def on_progress(current, total):
+            state["current"], state["total"] = current, total
+            await report()
+
+        async with semaphore:
+            for attempt in range(Config.DOWNLOAD_RETRIES + 1):
+                state["state"] = "downloading" if attempt == 0 else "retrying"
+                try:
+                    file_path = await _download_tg_file(message, user_id, on_progress)
+                    state["state"] = "done"
+                    state["current"] = state["total"]
+                    await report()
+                    return file_path
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    LOGGER.warning(f"Telegram download failed for message {message.id} (attempt {attempt + 1}): {e}")
+                    if attempt < Config.DOWNLOAD_RETRIES:
+                        await asyncio.sleep(2 ** attempt)
+
+        state["state"] = "failed"
+        await report()
+        if fail_fast:
+            for task in tasks:
+                if task is not asyncio.current_task():
+                    task.cancel()
+        return None
+
+    tasks.extend(asyncio.ensure_future(download(i, message)) for i, message in enumerate(messages))
+    return tasks
+
+async def download_many_from_tg(messages, user_id: int, status_message) -> list | None:
+    """
+    Downloads all `messages` concurrently and fails fast.
+
+    returns: File paths in queue order, or None if any file could not be downloaded.
+    """
+    tasks = start_tg_downloads(messages, user_id, status_message, fail_fast=True)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if any(not isinstance(result, str) for result in results):
+        return None
+    return results
+
+# Shared by every user's URL batch, so one busy CDN can't be hit with more
+# than MAX_DOWNLOADS_PER_HOST downloads at a time.
+_url_slots = asyncio.Semaphore(max(1, Config.MAX_CONCURRENT_DOWNLOADS))
+_host_slots = {}
+
+def _host_slot(url: str) -> asyncio.Semaphore:
+    host = (urlparse(url).hostname or "").lower()
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(max(1, Config.MAX_DOWNLOADS_PER_HOST))
+    return _host_slots[host]
+
+def start_url_downloads(urls, user_id: int, status_message, fail_fast: bool = False) -> list:
+    """
+    Starts URL downloads as tasks, in queue order, with one combined progress message.
+
+    At most `MAX_CONCURRENT_DOWNLOADS` URLs download at once across all users,
+    and at most `MAX_DOWNLOADS_PER_HOST` from the same host. A URL queued more
+    than once is downloaded once. Each task resolves to the downloaded file
+    path, or None if that URL failed. With `fail_fast`, the first failure
+    cancels the rest of the batch.
+    """
+    states = [
+        {"name": _url_file_name(url), "current": 0, "total": 0, "state": "queued"}
+        for url in urls
+    ]
+    tasks = []
+    shared = {}
+
+    async def report():
+        await smart_progress_editor(
+            status_message,
+            render_batch_progress(f"📥 **Downloading {len(states)} URL(s)...**", states),
+        )
+
+    async def download(index: int, url: str):
+        state = states[index]
+
+        async def on_progress(current, total, mode):
+            state["current"], state["total"] = current, total
+            await report()
+
+        async with _host_slot(url), _url_slots:
+            state["state"] = "downloading"
+            try:
+                file_path = await _download_url_file(url, user_id, on_progress)
+                state["state"] = "done"
+                state["current"] = state["total"] = os.path.getsize(file_path)
+                await report()
+                return file_path
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOGGER.warning(f"URL download failed for {url}: {e}")
+
+        state["state"] = "failed"
+        await report()
+        if fail_fast:
+            for task in tasks:
+                if task is not asyncio.current_task():
+                    task.cancel()
+        return None
+
+    async def follow(index: int, original: asyncio.Future):
+        # Duplicate of an earlier queue entry: mirror its state instead of downloading again.
+        states[index] = states[urls.index(urls[index])]
+        return await asyncio.shield(original)
+
+    for i, url in enumerate(urls):
+        if url in shared:
+            tasks.append(asyncio.ensure_future(follow(i, shared[url])))
+        else:
+            shared[url] = asyncio.ensure_future(download(i, url))
+            tasks.append(shared[url])
+    return tasks
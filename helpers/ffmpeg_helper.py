@@ -1,14 +1,42 @@
 import asyncio
-import subprocess
 import shutil
 import os
 import time
-import ffmpeg
 from pyrogram.types import CallbackQuery
 from config import Config
 from pyrogram.types import Message
 from __init__ import LOGGER
-from helpers.utils import get_path_size
+from helpers.utils import get_path_size, get_progress_bar, get_time_left
+from helpers.probe import probe, probe_cache
+from helpers.ffmpeg_job import FFmpegJob
+from helpers.merger import smart_progress_editor
+
+
+def _progress_reporter(status_message, title: str):
+    """Turns FFmpegJob progress events into throttled edits of `status_message`."""
+    if status_message is None:
+        return None
+    start_time = time.time()
+
+    async def on_progress(event: dict):
+        percent = event.get("percent")
+        if percent is None:
+            return
+        progress_text = (
+            f"⚙️ **{title}**\n"
+            f"➢ {get_progress_bar(percent)} `{percent:.1%}`\n"
+            f"➢ **Time Left:** `{get_time_left(time.time() - start_time, percent)}`"
+        )
+        await smart_progress_editor(status_message, progress_text)
+
+    return on_progress
+
+
+def _duration(probe_data: dict) -> float:
+    try:
+        return float(probe_data["format"].get("duration", 0))
+    except (KeyError, TypeError, ValueError):
+        return 0
 
 
 async def MergeVideo(input_file: str, user_id: int, message: Message, format_: str):
@@ -35,13 +63,9 @@ async def MergeVideo(input_file: str, user_id: int, message: Message, format_: s
         "copy",
         output_vid,
     ]
-    process = None
+    job = FFmpegJob(file_generator_command)
     try:
-        process = await asyncio.create_subprocess_exec(
-            *file_generator_command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
+        await job.start()
     except NotImplementedError:
         await message.edit(
             text="Unable to Execute FFmpeg Command! Got `NotImplementedError` ...\n\nPlease run bot in a Linux/Unix Environment."
@@ -49,18 +73,15 @@ async def MergeVideo(input_file: str, user_id: int, message: Message, format_: s
         await asyncio.sleep(10)
         return None
     await message.edit("Merging Video Now ...\n\nPlease Keep Patience ...")
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
-    LOGGER.info(e_response)
-    LOGGER.info(t_response)
+    await job.wait()
+    LOGGER.info(job.stderr_tail)
     if os.path.lexists(output_vid):
         return output_vid
     else:
         return None
 
 
-async def MergeSub(filePath: str, subPath: str, user_id):
+async def MergeSub(filePath: str, subPath: str, user_id, status_message=None):
     """
     This is for Merging Video + Subtitle Together.
 
@@ -68,6 +89,7 @@ async def MergeSub(filePath: str, subPath: str, user_id):
     - `filePath`: Path to Video file.
     - `subPath`: Path to subtitile file.
     - `user_id`: To get parent directory.
+    - `status_message`: Optional message to edit with mux progress.
 
     returns: Merged Video File Path
     """
@@ -87,7 +109,7 @@ async def MergeSub(filePath: str, subPath: str, user_id):
     muxcmd.append("0:s:?")
     muxcmd.append("-map")
     muxcmd.append("1:s")
-    videoData = ffmpeg.probe(filename=filePath)
+    videoData = await probe(filePath)
     videoStreamsData = videoData.get("streams")
     subTrack = 0
     for i in range(len(videoStreamsData)):
@@ -103,16 +125,25 @@ async def MergeSub(filePath: str, subPath: str, user_id):
     muxcmd.append("copy")
     muxcmd.append("-c:s")
     muxcmd.append("srt")
+    muxcmd.append("-y")
     muxcmd.append(f"./downloads/{str(user_id)}/[@yashoswalyo]_softmuxed_video.mkv")
     LOGGER.info("Muxing subtitles")
-    subprocess.call(muxcmd)
+    job = FFmpegJob(
+        muxcmd,
+        duration=_duration(videoData),
+        on_progress=_progress_reporter(status_message, "Muxing Subtitles..."),
+    )
+    await job.run()
+    if not job.ok:
+        return None
     orgFilePath = shutil.move(
         f"downloads/{str(user_id)}/[@yashoswalyo]_softmuxed_video.mkv", filePath
     )
+    probe_cache.invalidate(filePath)
     return orgFilePath
 
 
-def MergeSubNew(filePath: str, subPath: str, user_id, file_list):
+async def MergeSubNew(filePath: str, subPath: str, user_id, file_list, status_message=None):
     """
     This method is for Merging Video + Subtitle(s) Together.
 
@@ -120,7 +151,8 @@ def MergeSubNew(filePath: str, subPath: str, user_id, file_list):
     - `filePath`: Path to Video file.
     - `subPath`: Path to subtitile file.
     - `user_id`: To get parent directory.
-    - `file_list`: List of all input files
+    - `file_list`: List of all input files, video first
+    - `status_message`: Optional message to edit with mux progress.
 
     returns: Merged Video File Path
     """
@@ -128,7 +160,7 @@ def MergeSubNew(filePath: str, subPath: str, user_id, file_list):
     muxcmd = []
     muxcmd.append("ffmpeg")
     muxcmd.append("-hide_banner")
-    videoData = ffmpeg.probe(filename=filePath)
+    videoData = await probe(filePath)
     videoStreamsData = videoData.get("streams")
     subTrack = 0
     for i in range(len(videoStreamsData)):
@@ -155,18 +187,37 @@ def MergeSubNew(filePath: str, subPath: str, user_id, file_list):
     muxcmd.append("copy")
     muxcmd.append("-c:s")
     muxcmd.append("srt")
+    muxcmd.append("-y")
     muxcmd.append(f"./downloads/{str(user_id)}/[@yashoswalyo]_softmuxed_video.mkv")
     LOGGER.info("Sub muxing")
-    subprocess.call(muxcmd)
+    job = FFmpegJob(
+        muxcmd,
+        duration=_duration(videoData),
+        on_progress=_progress_reporter(status_message, "Muxing Subtitles..."),
+    )
+    await job.run()
+    if not job.ok:
+        return None
     return f"downloads/{str(user_id)}/[@yashoswalyo]_softmuxed_video.mkv"
 
 
-def MergeAudio(videoPath: str, files_list: list, user_id):
+async def MergeAudio(videoPath: str, files_list: list, user_id, status_message=None):
+    """
+    This method is for Merging Video + Audio(s) Together.
+
+    Parameters:
+    - `videoPath`: Path to Video file.
+    - `files_list`: List of all input files, video first
+    - `user_id`: To get parent directory.
+    - `status_message`: Optional message to edit with mux progress.
+
+    returns: Merged Video File Path
+    """
     LOGGER.info("Generating Mux Command")
     muxcmd = []
     muxcmd.append("ffmpeg")
     muxcmd.append("-hide_banner")
-    videoData = ffmpeg.probe(filename=videoPath)
+    videoData = await probe(videoPath)
     videoStreamsData = videoData.get("streams")
     audioTracks = 0
     for i in files_list:
@@ -179,7 +230,7 @@ def MergeAudio(videoPath: str, files_list: list, user_id):
     audioTracks = 0
     for i in range(len(videoStreamsData)):
         if videoStreamsData[i]["codec_type"] == "audio":
-            muxcmd.append(f"disposition:a:{audioTracks}")
+            muxcmd.append(f"-disposition:a:{audioTracks}")
             muxcmd.append("0")
             audioTracks += 1
     fAudio = audioTracks
@@ -189,7 +240,7 @@ def MergeAudio(videoPath: str, files_list: list, user_id):
         muxcmd.append(f"-metadata:s:a:{audioTracks}")
         muxcmd.append(f"title=Track {audioTracks+1} - tg@yashoswalyo")
         audioTracks += 1
-    muxcmd.append(f"-disposition:s:a:{fAudio}")
+    muxcmd.append(f"-disposition:a:{fAudio}")
     muxcmd.append("default")
     muxcmd.append("-map")
     muxcmd.append("0:s:?")
@@ -199,11 +250,19 @@ def MergeAudio(videoPath: str, files_list: list, user_id):
     muxcmd.append("copy")
     muxcmd.append("-c:s")
     muxcmd.append("copy")
+    muxcmd.append("-y")
     muxcmd.append(f"downloads/{str(user_id)}/[@yashoswalyo]_export.mkv")
 
     LOGGER.info(muxcmd)
-    process = subprocess.call(muxcmd)
-    LOGGER.info(process)
+    job = FFmpegJob(
+        muxcmd,
+        duration=_duration(videoData),
+        on_progress=_progress_reporter(status_message, "Muxing Audio Tracks..."),
+    )
+    returncode = await job.run()
+    LOGGER.info(returncode)
+    if not job.ok:
+        return None
     return f"downloads/{str(user_id)}/[@yashoswalyo]_export.mkv"
 
 
@@ -226,16 +285,9 @@ async def cult_small_video(video_file, output_directory, start_time, end_time, f
         "-2",
         out_put_file_name,
     ]
-    process = await asyncio.create_subprocess_exec(
-        *file_generator_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
-    LOGGER.info(e_response)
-    LOGGER.info(t_response)
+    job = FFmpegJob(file_generator_command)
+    await job.run()
+    LOGGER.info(job.stderr_tail)
     if os.path.lexists(out_put_file_name):
         return out_put_file_name
     else:
@@ -284,16 +336,7 @@ async def take_screen_shot(video_file, output_directory, ttl):
             out_put_file_name,
         ]
         # width = "90"
-        process = await asyncio.create_subprocess_exec(
-            *file_genertor_command,
-            # stdout must a pipe to be accessible as process.stdout
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        # Wait for the subprocess to finish
-        stdout, stderr = await process.communicate()
-        e_response = stderr.decode().strip()
-        t_response = stdout.decode().strip()
+        await FFmpegJob(file_genertor_command).run()
     #
     if os.path.exists(out_put_file_name):
         return out_put_file_name
@@ -301,127 +344,134 @@ async def take_screen_shot(video_file, output_directory, ttl):
         return None
 
 
-async def extractAudios(path_to_file, user_id):
+def _extract_file_name(stream: dict) -> str:
+    """Output name for an extracted stream: `(lang).title.type.mka`, falling back to index based names."""
+    try:
+        output_file: str = (
+            "("
+            + stream["tags"]["language"]
+            + ") "
+            + stream["tags"]["title"]
+            + "."
+            + stream["codec_type"]
+            + ".mka"
+        )
+        return output_file.replace(" ", ".")
+    except:
+        pass
+    if stream["codec_type"] == "subtitle":
+        try:
+            return (
+                str(stream["index"])
+                + "."
+                + stream["tags"]["language"]
+                + "."
+                + stream["codec_type"]
+                + ".mka"
+            )
+        except:
+            pass
+    return str(stream["index"]) + "." + stream["codec_type"] + ".mka"
+
+
+async def _extract_one(path_to_file: str, stream: dict, output_path: str) -> bool:
     """
-    docs
+    Extracts a single stream, converting text subtitles (e.g. MP4 `mov_text`)
+    to ASS if they can't be stream-copied. A stream that still fails is skipped.
     """
-    dir_name = os.path.dirname(os.path.dirname(path_to_file))
-    if not os.path.exists(path_to_file):
-        return None
-    if not os.path.exists(dir_name + "/extract"):
-        os.makedirs(dir_name + "/extract")
-    videoStreamsData = ffmpeg.probe(path_to_file)
-    # with open("data.json",'w') as f:
-    #     f.write(json.dumps(videoStreamsData))
-    extract_dir = dir_name + "/extract"
-    audios = []
-    for stream in videoStreamsData.get("streams"):
-        try:
-            if stream["codec_type"] == "audio":
-                audios.append(stream)
-        except Exception as e:
-            LOGGER.warning(e)
-    for audio in audios:
-        extractcmd = []
-        extractcmd.append("ffmpeg")
-        extractcmd.append("-hide_banner")
-        extractcmd.append("-i")
-        extractcmd.append(path_to_file)
-        extractcmd.append("-map")
-        try:
-            index = audio["index"]
-            extractcmd.append(f"0:{index}")
-            try:
-                output_file: str = (
-                    "("
-                    + audio["tags"]["language"]
-                    + ") "
-                    + audio["tags"]["title"]
-                    + "."
-                    + audio["codec_type"]
-                    + ".mka"
-                )
-                output_file = output_file.replace(" ", ".")
-            except:
-                output_file = str(audio["index"]) + "." + audio["codec_type"] + ".mka"
-            extractcmd.append("-c")
-            extractcmd.append("copy")
-            extractcmd.append(f"{extract_dir}/{output_file}")
-            LOGGER.info(extractcmd)
-            subprocess.call(extractcmd)
-        except Exception as e:
-            LOGGER.error(f"Something went wrong: {e}")
-    if get_path_size(extract_dir) > 0:
-        return extract_dir
-    else:
-        LOGGER.warning(f"{extract_dir} is empty")
-        return None
+    attempts = [["-c", "copy"]]
+    if stream["codec_type"] == "subtitle":
+        attempts.append(["-c:s", "ass"])
+    for codec_options in attempts:
+        command = [
+            "ffmpeg", "-hide_banner", "-i", path_to_file,
+            "-map", f"0:{stream['index']}", *codec_options, "-y", output_path,
+        ]
+        job = FFmpegJob(command)
+        await job.run()
+        if job.ok:
+            return True
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    LOGGER.warning(f"Skipped stream {stream['index']} ({stream.get('codec_name')}) of {path_to_file}: {job.stderr_tail}")
+    return False
 
 
-async def extractSubtitles(path_to_file, user_id):
+async def extractStreams(path_to_file, user_id, audios=True, subtitles=True, status_message=None):
     """
-    docs
+    Extracts the selected audio and/or subtitle streams in a single demux pass.
+
+    Parameters:
+    - `path_to_file`: Path to video file.
+    - `user_id`: Pass user_id as integer.
+    - `audios`: Extract every audio stream.
+    - `subtitles`: Extract every subtitle stream.
+    - `status_message`: Optional message to edit with extraction progress.
+
+    returns: Path of the directory holding the extracted streams, or None
     """
     dir_name = os.path.dirname(os.path.dirname(path_to_file))
     if not os.path.exists(path_to_file):
         return None
     if not os.path.exists(dir_name + "/extract"):
         os.makedirs(dir_name + "/extract")
-    videoStreamsData = ffmpeg.probe(path_to_file)
-    # with open("data.json",'w') as f:
-    #     f.write(json.dumps(videoStreamsData))
+    videoStreamsData = await probe(path_to_file)
     extract_dir = dir_name + "/extract"
-    subtitles = []
+    wanted = []
+    if audios:
+        wanted.append("audio")
+    if subtitles:
+        wanted.append("subtitle")
+    streams = []
     for stream in videoStreamsData.get("streams"):
         try:
-            if stream["codec_type"] == "subtitle":
-                subtitles.append(stream)
+            if stream["codec_type"] in wanted:
+                streams.append(stream)
         except Exception as e:
             LOGGER.warning(e)
-    for subtitle in subtitles:
-        extractcmd = []
-        extractcmd.append("ffmpeg")
-        extractcmd.append("-hide_banner")
-        extractcmd.append("-i")
-        extractcmd.append(path_to_file)
-        extractcmd.append("-map")
-        try:
-            index = subtitle["index"]
-            extractcmd.append(f"0:{index}")
-            try:
-                output_file: str = (
-                    "("
-                    + subtitle["tags"]["language"]
-                    + ") "
-                    + subtitle["tags"]["title"]
-                    + "."
-                    + subtitle["codec_type"]
-                    + ".mka"
-                )
-                output_file = output_file.replace(" ", ".")
-            except:
-                try:
-                    output_file = (
-                        str(subtitle["index"])
-                        + "."
-                        + subtitle["tags"]["language"]
-                        + "."
-                        + subtitle["codec_type"]
-                        + ".mka"
-                    )
-                except:
-                    output_file = (
-                        str(subtitle["index"]) + "." + subtitle["codec_type"] + ".mka"
-                    )
-            extractcmd.append("-c")
-            extractcmd.append("copy")
-            extractcmd.append(f"{extract_dir}/{output_file}")
-            LOGGER.info(extractcmd)
-            subprocess.call(extractcmd)
-        except Exception as e:
-            LOGGER.error(f"Something went wrong: {e}")
+    if not streams:
+        LOGGER.warning(f"No {' or '.join(wanted)} streams in {path_to_file}")
+        return None
+
+    outputs = []
+    used_names = set()
+    for stream in streams:
+        output_file = _extract_file_name(stream)
+        if output_file in used_names:
+            output_file = f"{stream['index']}.{output_file}"
+        used_names.add(output_file)
+        outputs.append((stream, f"{extract_dir}/{output_file}"))
+
+    # One input, one output per stream: ffmpeg reads the file once and writes them all.
+    extractcmd = ["ffmpeg", "-hide_banner", "-i", path_to_file]
+    for stream, output_path in outputs:
+        extractcmd += ["-map", f"0:{stream['index']}", "-c", "copy", "-y", output_path]
+    LOGGER.info(extractcmd)
+    job = FFmpegJob(
+        extractcmd,
+        duration=_duration(videoStreamsData),
+        on_progress=_progress_reporter(status_message, f"Extracting {len(streams)} Stream(s)..."),
+    )
+    await job.run()
+
+    if not job.ok:
+        # One stream the container can't hold fails every output; fall back to one pass per stream.
+        LOGGER.warning(f"Single-pass extraction failed, extracting streams one by one: {job.stderr_tail}")
+        for stream, output_path in outputs:
+            await _extract_one(path_to_file, stream, output_path)
+
     if get_path_size(extract_dir) > 0:
         return extract_dir
     else:
         LOGGER.warning(f"{extract_dir} is empty")
         return None
+
+
+async def extractAudios(path_to_file, user_id, status_message=None):
+    """Extracts every audio stream of `path_to_file`."""
+    return await extractStreams(path_to_file, user_id, audios=True, subtitles=False, status_message=status_message)
+
+
+async def extractSubtitles(path_to_file, user_id, status_message=None):
+    """Extracts every subtitle stream of `path_to_file`."""
+    return await extractStreams(path_to_file, user_id, audios=False, subtitles=True, status_message=status_message)
@@ -0,0 +1,169 @@
+# helpers/ffmpeg_job.py
+
+import asyncio
+import time
+from typing import List
+from config import Config
+from __init__ import LOGGER
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class FFmpegJob:
+    """
+    Runs one ffmpeg process without blocking the event loop.
+
+    - stdout and stderr are drained concurrently, so neither pipe can fill up and stall ffmpeg.
+    - `-progress pipe:1` output is parsed into events passed to `on_progress`.
+    - Only the last `stderr_limit` bytes of stderr are kept.
+    - A watchdog kills the process if it produces no output for `stall_timeout`
+      seconds, or runs longer than `timeout` seconds.
+    - Cancelling the awaiting task terminates the process.
+
+    Parameters:
+    - `command`: ffmpeg argument list. `-progress pipe:1` is added unless `on_stdout` is given.
+    - `duration`: Expected output duration in seconds, used to fill `percent` in progress events.
+    - `on_progress`: async callable receiving a dict for every progress block.
+    - `on_stdout`: async callable receiving raw stdout chunks, for commands that write media to pipe:1.
+    - `stdin`: Open a pipe to the process' stdin (available as `job.process.stdin`).
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        duration: float = None,
+        on_progress=None,
+        on_stdout=None,
+        stdin: bool = False,
+        stall_timeout: float = None,
+        timeout: float = None,
+        stderr_limit: int = None,
+    ):
+        self.command = list(command)
+        if on_stdout is None and "-progress" not in self.command:
+            self.command[1:1] = ["-progress", "pipe:1", "-nostats"]
+        self.duration = duration
+        self.on_progress = on_progress
+        self.on_stdout = on_stdout
+        self.stdin = stdin
+        self.stall_timeout = Config.FFMPEG_STALL_TIMEOUT if stall_timeout is None else stall_timeout
+        self.timeout = timeout
+        self.stderr_limit = stderr_limit or Config.FFMPEG_STDERR_LIMIT
+        self.process = None
+        self.returncode = None
+        self.stalled = False
+        self.timed_out = False
+        self._stderr = bytearray()
+        self._last_activity = time.time()
+        self._readers = None
+
+    @property
+    def stderr_tail(self) -> str:
+        return self._stderr.decode(errors="replace").strip()
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE if self.stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._last_activity = time.time()
+        self._readers = asyncio.gather(self._read_stdout(), self._read_stderr())
+
+    async def wait(self) -> int:
+        """Waits for the process to exit and returns its exit code."""
+        watchdog = asyncio.ensure_future(self._watchdog())
+        try:
+            await self._readers
+            self.returncode = await self.process.wait()
+        except BaseException:
+            # Cancelled, or an output callback failed: don't leave ffmpeg running.
+            await self.kill()
+            raise
+        finally:
+            watchdog.cancel()
+        if self.returncode != 0:
+            LOGGER.warning(f"ffmpeg exited with {self.returncode}: {' '.join(self.command)}\n{self.stderr_tail}")
+        return self.returncode
+
+    async def run(self) -> int:
+        await self.start()
+        return await self.wait()
+
+    async def kill(self):
+        """Terminates the process, escalating to SIGKILL if it doesn't exit promptly."""
+        if self.process is None or self.process.returncode is not None:
+            return
+        try:
+            self.process.terminate()
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        except ProcessLookupError:
+            pass
+        self.returncode = self.process.returncode
+
+    async def _read_stdout(self):
+        if self.on_stdout is not None:
+            while True:
+                chunk = await self.process.stdout.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                self._last_activity = time.time()
+                await self.on_stdout(chunk)
+
+        block = {}
+        while True:
+            line_bytes = await self.process.stdout.readline()
+            if not line_bytes:
+                return
+            self._last_activity = time.time()
+            key, _, value = line_bytes.decode(errors="replace").strip().partition("=")
+            block[key] = value
+            if key == "progress":
+                await self._emit_progress(block)
+                block = {}
+
+    async def _emit_progress(self, block: dict):
+        if self.on_progress is None:
+            return
+        event = {"done": block.get("progress") == "end", "out_time": 0.0, "speed": block.get("speed")}
+        # out_time_ms is actually microseconds; it is "N/A" before the first frame.
+        value = block.get("out_time_us") or block.get("out_time_ms") or ""
+        if value.isdigit():
+            event["out_time"] = int(value) / 1000000
+        if self.duration:
+            event["percent"] = max(0, min(1, event["out_time"] / self.duration))
+        await self.on_progress(event)
+
+    async def _read_stderr(self):
+        while True:
+            chunk = await self.process.stderr.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            self._last_activity = time.time()
+            self._stderr += chunk
+            if len(self._stderr) > self.stderr_limit:
+                del self._stderr[: len(self._stderr) - self.stderr_limit]
+
+    async def _watchdog(self):
+        started = time.time()
+        while self.process.returncode is None:
+            await asyncio.sleep(1)
+            now = time.time()
+            if self.timeout and now - started > self.timeout:
+                self.timed_out = True
+                LOGGER.warning(f"ffmpeg timed out after {self.timeout}s, killing: {' '.join(self.command)}")
+                await self.kill()
+                return
+            if self.stall_timeout and now - self._last_activity > self.stall_timeout:
+                self.stalled = True
+                LOGGER.warning(f"ffmpeg stalled for {self.stall_timeout}s, killing: {' '.join(self.command)}")
+                await self.kill()
+                return
@@ -0,0 +1,80 @@
+# helpers/http_client.py
+
+import aiohttp
+from config import Config
+from __init__ import LOGGER
+
+
+class HTTPClient:
+    """
+    One aiohttp session shared by every HTTP call in the bot.
+
+    The pooled connector keeps connections alive between requests and caches DNS
+    lookups, so repeated calls to the same host skip the TCP and TLS handshakes.
+    A trace config counts new versus reused connections for /stats.
+    """
+
+    def __init__(self):
+        self._session = None
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def count(key):
+            async def on_event(session, context, params):
+                self.stats[key] += 1
+            return on_event
+
+        trace_config.on_request_start.append(count("requests"))
+        trace_config.on_connection_create_end.append(count("connections_created"))
+        trace_config.on_connection_reuseconn.append(count("connections_reused"))
+        trace_config.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace_config
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=Config.HTTP_POOL_LIMIT,
+                limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=Config.HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=Config.HTTP_CONNECT_TIMEOUT,
+                sock_read=Config.HTTP_READ_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout, trace_configs=[self._trace_config()]
+            )
+        return self._session
+
+    @property
+    def reuse_ratio(self) -> float:
+        connections = self.stats["connections_created"] + self.stats["connections_reused"]
+        return self.stats["connections_reused"] / connections if connections else 0.0
+
+    async def start(self):
+        self.session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            LOGGER.info(
+                f"HTTP client closed after {self.stats['requests']} requests "
+                f"({self.stats['connections_reused']} reused / {self.stats['connections_created']} new connections)"
+            )
+        self._session = None
+
+
+http_client = HTTPClient()
@@ -0,0 +1,104 @@
+# helpers/live_output.py
+
+import asyncio
+import os
+from __init__ import LOGGER
+
+TAIL_CHUNK_SIZE = 1024 * 1024
+TAIL_POLL_SECONDS = 0.5
+
+
+class OutputAborted(Exception):
+    """The ffmpeg pass being tailed failed, so what was read from it is not a usable file."""
+
+
+class OutputAttempt:
+    """
+    One ffmpeg pass writing a merge output, readable while it grows.
+
+    The writer must not seek back over bytes it already wrote (matroska with
+    `-live 1`), otherwise a tailing reader would upload stale data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ok = None
+        self._done = asyncio.Event()
+
+    def end(self, ok: bool):
+        self.ok = ok
+        self._done.set()
+
+    async def wait(self) -> bool:
+        """Waits for the ffmpeg pass to exit and returns whether it succeeded."""
+        await self._done.wait()
+        return self.ok
+
+    async def _wait_done(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def chunks(self, chunk_size: int = TAIL_CHUNK_SIZE):
+        """Yields the file's bytes as ffmpeg writes them, until the pass exits. Raises OutputAborted if it failed."""
+        while not os.path.exists(self.path):
+            if self._done.is_set():
+                raise OutputAborted(f"{self.path} was never written")
+            await self._wait_done(TAIL_POLL_SECONDS)
+
+        with open(self.path, "rb") as f:
+            while True:
+                # Checked before reading, so bytes written just before the exit are still picked up.
+                finished = self._done.is_set()
+                if finished and not self.ok:
+                    raise OutputAborted(f"ffmpeg failed while writing {self.path}")
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if chunk:
+                    yield chunk
+                elif finished:
+                    return
+                else:
+                    await self._wait_done(TAIL_POLL_SECONDS)
+
+
+class LiveOutput:
+    """
+    Hands a merge's output to an uploader while ffmpeg is still writing it.
+
+    The merge calls `begin(path)` whenever it starts a pass that writes the
+    final output and ends that attempt when ffmpeg exits. A merge can make
+    several attempts (fast copy falling back to robust mode), so `follow`
+    uploads them one at a time until one is uploaded completely.
+    """
+
+    def __init__(self):
+        self._attempts = asyncio.Queue()
+
+    def begin(self, path: str) -> OutputAttempt:
+        attempt = OutputAttempt(path)
+        self._attempts.put_nowait(attempt)
+        return attempt
+
+    def close(self):
+        """Called once the merge has returned: no more attempts will follow."""
+        self._attempts.put_nowait(None)
+
+    async def follow(self, upload):
+        """
+        Awaits `upload(attempt)` for each attempt until one succeeds.
+
+        returns: the result of `upload`, or None if the merge ended without a
+        complete upload. Upload errors on an attempt that ffmpeg finished
+        successfully are raised, so the caller can upload the file from disk.
+        """
+        while True:
+            attempt = await self._attempts.get()
+            if attempt is None:
+                return None
+            try:
+                return await upload(attempt)
+            except Exception as e:
+                if await attempt.wait():
+                    raise
+                LOGGER.info(f"Dropped live upload of {attempt.path}, the merge pass failed: {e}")
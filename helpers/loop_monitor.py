@@ -0,0 +1,50 @@
+# helpers/loop_monitor.py
+
+import asyncio
+from collections import deque
+from config import Config
+from __init__ import LOGGER
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop responsiveness.
+
+    A background task sleeps for `interval` seconds and records how much later
+    than requested it was woken up. Anything blocking the loop (a synchronous
+    subprocess call, file I/O, heavy CPU work) shows up directly as lag.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 120):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.samples = deque(maxlen=window)
+        self._task = None
+
+    @property
+    def recent_max_lag(self) -> float:
+        return max(self.samples, default=0.0)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        warn_after = Config.LOOP_LAG_WARN_MS / 1000
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.last_lag = lag
+            self.samples.append(lag)
+            if lag > warn_after:
+                LOGGER.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,204 @@
+# helpers/media_cache.py
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from config import Config
+from __init__ import LOGGER
+
+
+class MediaCache:
+    """
+    Content-addressed cache of downloaded media, shared across jobs and users.
+
+    Entries are keyed by Telegram's `file_unique_id` or by URL plus the server's
+    validators, and stored outside the per-user download folders so
+    `delete_all` doesn't touch them. Cached files are hard-linked into each
+    job's workspace, so a hit costs no extra disk space or copy time.
+
+    Least recently used entries are evicted once the cache grows past `quota`
+    bytes. Concurrent requests for the same key share one download.
+    """
+
+    def __init__(self, root: str, quota: int):
+        self.root = root
+        self.quota = quota
+        self.index_path = os.path.join(root, "index.json")
+        self._index = {}
+        self._inflight = {}
+        self._waiters = {}
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.quota > 0
+
+    @property
+    def size(self) -> int:
+        return sum(entry["size"] for entry in self._index.values())
+
+    @staticmethod
+    def telegram_key(media) -> str | None:
+        unique_id = getattr(media, "file_unique_id", None)
+        return f"tg:{unique_id}" if unique_id else None
+
+    @staticmethod
+    def url_key(url: str, etag: str = None, last_modified: str = None, size: int = 0) -> str | None:
+        # Without a validator there's no way to tell if the file behind the URL changed.
+        if not etag and not last_modified:
+            return None
+        return f"url:{url}|{etag or ''}|{last_modified or ''}|{size}"
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        self._index = {
+            digest: entry for digest, entry in index.items()
+            if os.path.exists(self._entry_path(digest))
+        }
+
+    def _save_index(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self.index_path)
+
+    @staticmethod
+    def _link(source: str, dest_path: str):
+        """Hard-links `source` to `dest_path`, copying if they're on different filesystems."""
+        if os.path.exists(dest_path):
+            if os.path.samefile(source, dest_path):
+                return
+            os.remove(dest_path)
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            shutil.copyfile(source, dest_path)
+
+    async def _link_into(self, digest: str, dest_path: str) -> str:
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        await asyncio.to_thread(self._link, self._entry_path(digest), dest_path)
+        self._index[digest]["last_used"] = time.time()
+        self._save_index()
+        return dest_path
+
+    async def _store(self, digest: str, key: str, file_path: str):
+        await asyncio.to_thread(self._link, file_path, self._entry_path(digest))
+        self._index[digest] = {
+            "key": key,
+            "size": os.path.getsize(file_path),
+            "last_used": time.time(),
+        }
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        total = self.size
+        for digest in sorted(self._index, key=lambda d: self._index[d]["last_used"]):
+            if total <= self.quota:
+                break
+            total -= self._remove(digest)
+
+    def _remove(self, digest: str) -> int:
+        entry = self._index.pop(digest)
+        try:
+            os.remove(self._entry_path(digest))
+        except OSError:
+            pass
+        LOGGER.info(f"Evicted {entry['key']} from media cache")
+        return entry["size"]
+
+    def _is_idle(self, digest: str) -> bool:
+        """True if no workspace holds a link to the entry, so removing it frees its space."""
+        try:
+            return os.stat(self._entry_path(digest)).st_nlink == 1
+        except OSError:
+            return False
+
+    @property
+    def reclaimable(self) -> int:
+        """Bytes that evicting every idle entry would give back to the disk."""
+        return sum(entry["size"] for digest, entry in self._index.items() if self._is_idle(digest))
+
+    def release(self, size: int) -> int:
+        """
+        Evicts idle entries, least recently used first, until `size` bytes are freed.
+
+        returns: Bytes actually freed.
+        """
+        freed = 0
+        for digest in sorted(self._index, key=lambda d: self._index[d]["last_used"]):
+            if freed >= size:
+                break
+            if self._is_idle(digest):
+                freed += self._remove(digest)
+        if freed:
+            self._save_index()
+        return freed
+
+    async def get_or_fetch(self, key: str | None, dest_path: str, fetch) -> str:
+        """
+        Places the file for `key` at `dest_path`, downloading it only if it isn't cached.
+
+        - `fetch`: async callable that downloads the file and returns its path, raising on failure.
+
+        returns: Path of the file in the caller's workspace.
+        """
+        if key is None or not self.enabled:
+            return await fetch()
+
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        if digest in self._index and os.path.exists(self._entry_path(digest)):
+            LOGGER.info(f"Media cache hit for {key}")
+            return await self._link_into(digest, dest_path)
+
+        task = self._inflight.get(digest)
+        if task is not None:
+            # Someone is already downloading this file; reuse their result.
+            await self._wait_shared(digest, task)
+            if digest not in self._index:
+                return await fetch()
+            return await self._link_into(digest, dest_path)
+
+        task = asyncio.ensure_future(self._fetch_and_store(digest, key, fetch))
+        self._inflight[digest] = task
+        task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+        return await self._wait_shared(digest, task)
+
+    async def _wait_shared(self, digest: str, task: asyncio.Future):
+        """
+        Awaits an in-flight fetch shared by several callers. A cancelled caller
+        only stops waiting; the fetch itself is cancelled when its last waiter leaves.
+        """
+        self._waiters[digest] = self._waiters.get(digest, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[digest] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[digest] -= 1
+            if not self._waiters[digest]:
+                del self._waiters[digest]
+
+    async def _fetch_and_store(self, digest: str, key: str, fetch) -> str:
+        file_path = await fetch()
+        try:
+            await self._store(digest, key, file_path)
+        except Exception as e:
+            LOGGER.warning(f"Could not add {file_path} to media cache: {e}")
+        return file_path
+
+media_cache = MediaCache(Config.MEDIA_CACHE_DIR, Config.MEDIA_CACHE_QUOTA)
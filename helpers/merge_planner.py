@@ -0,0 +1,123 @@
+# helpers/merge_planner.py
+
+import asyncio
+from collections import Counter
+from typing import List
+from __init__ import LOGGER
+from helpers.utils import get_video_properties
+
+STRATEGY_COPY = "copy"
+STRATEGY_NORMALIZE = "normalize"
+STRATEGY_REENCODE = "reencode"
+
+# Stream parameters that must match for the concat demuxer to stream-copy cleanly.
+VIDEO_KEYS = ("codec_name", "profile", "width", "height", "pix_fmt", "time_base", "r_frame_rate")
+AUDIO_KEYS = ("codec_name", "sample_rate", "channel_layout")
+
+# Codecs we know how to re-create when conforming outliers to the majority profile.
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "mp3": "libmp3lame",
+    "ac3": "ac3",
+    "eac3": "eac3",
+    "opus": "libopus",
+    "flac": "flac",
+}
+
+
+def stream_signature(properties: dict) -> dict:
+    """Returns the concat-relevant parameters of the first video and audio stream."""
+    streams = properties.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    signature = {f"video_{key}": video.get(key) for key in VIDEO_KEYS}
+    for key in AUDIO_KEYS:
+        if audio is None:
+            signature[f"audio_{key}"] = None
+        elif key == "channel_layout":
+            # Some demuxers only report the channel count.
+            signature["audio_channel_layout"] = audio.get("channel_layout") or f"{audio.get('channels')}ch"
+        else:
+            signature[f"audio_{key}"] = audio.get(key)
+    return signature
+
+
+def signature_key(signature: dict) -> tuple:
+    """Hashable form of a signature, used to group inputs with the same profile."""
+    return tuple(signature[key] for key in sorted(signature))
+
+
+def is_encodable(signature: dict) -> bool:
+    """True if we have encoders for the video and (optional) audio codec of `signature`."""
+    if signature.get("video_codec_name") not in VIDEO_ENCODERS:
+        return False
+    audio_codec = signature.get("audio_codec_name")
+    return audio_codec is None or audio_codec in AUDIO_ENCODERS
+
+
+def _describe_mismatch(reference: dict, other: dict) -> str:
+    diffs = [
+        f"{key} ({other[key]} vs {reference[key]})"
+        for key in reference
+        if reference[key] != other.get(key)
+    ]
+    return ", ".join(diffs)
+
+
+async def plan_merge(video_files: List[str]) -> dict:
+    """
+    Probes all inputs concurrently and picks the cheapest merge strategy up front.
+
+    returns: dict with `strategy`, a human readable `reason`, plus the probed
+    `properties` and `signatures` (one per input, in queue order). For the
+    normalize strategy `target` holds the majority signature and `outliers`
+    the indexes of inputs that must be transcoded to it.
+    """
+    all_properties = await asyncio.gather(*[get_video_properties(f) for f in video_files])
+    plan = {
+        "strategy": STRATEGY_COPY,
+        "reason": "",
+        "properties": list(all_properties),
+        "signatures": [],
+        "target": None,
+        "outliers": [],
+    }
+
+    unreadable = [path for path, p in zip(video_files, all_properties) if not p]
+    if unreadable:
+        # Without metadata we can't compare anything, so keep the old behaviour:
+        # try a stream copy and let the merger fall back if it fails.
+        plan["reason"] = f"Could not read metadata from {len(unreadable)} input(s), trying stream copy first"
+        LOGGER.info(f"Merge plan: {plan['strategy']} - {plan['reason']}")
+        return plan
+
+    signatures = [stream_signature(p) for p in all_properties]
+    plan["signatures"] = signatures
+
+    keys = [signature_key(sig) for sig in signatures]
+    majority_key, majority_count = Counter(keys).most_common(1)[0]
+
+    if majority_count == len(signatures):
+        plan["reason"] = "All inputs share codec, resolution, pixel format, frame rate and audio layout"
+        LOGGER.info(f"Merge plan: {plan['strategy']} - {plan['reason']}")
+        return plan
+
+    target = signatures[keys.index(majority_key)]
+    outliers = [i for i, key in enumerate(keys) if key != majority_key]
+    mismatches = "; ".join(
+        f"input {i + 1} differs in {_describe_mismatch(target, signatures[i])}" for i in outliers
+    )
+
+    if majority_count > 1 and is_encodable(target):
+        plan["strategy"] = STRATEGY_NORMALIZE
+        plan["target"] = target
+        plan["outliers"] = outliers
+        plan["reason"] = f"{len(outliers)} of {len(signatures)} input(s) will be conformed to the majority format: {mismatches}"
+    else:
+        plan["strategy"] = STRATEGY_REENCODE
+        plan["reason"] = mismatches
+
+    LOGGER.info(f"Merge plan: {plan['strategy']} - {plan['reason']}")
+    return plan
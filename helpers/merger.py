@@ -3,14 +3,33 @@
 import asyncio
 import os
 import time
+from fractions import Fraction
 from typing import List
 from config import Config
+from __init__ import LOGGER
+from helpers.admission import disk_admission, estimate_merge_footprint
+from helpers.ffmpeg_job import FFmpegJob
 from helpers.utils import get_video_properties, get_progress_bar, get_time_left
+from helpers.merge_planner import (
+    plan_merge,
+    stream_signature,
+    STRATEGY_NORMALIZE,
+    STRATEGY_REENCODE,
+    VIDEO_ENCODERS,
+    AUDIO_ENCODERS,
+)
 
 # --- Throttling Logic for Progress Bar ---
 last_edit_time = {}
 EDIT_THROTTLE_SECONDS = 4.0
 
+# Encoder options that repeat SPS/PPS (VPS) before every keyframe.
+IN_BAND_HEADERS = {"libx264": ["-x264-params", "repeat-headers=1"], "libx265": ["-x265-params", "repeat-headers=1"]}
+
+# Frame rate bounds for the robust intermediate.
+MIN_FPS = 1
+MAX_FPS = 120
+
 async def smart_progress_editor(status_message, text: str):
     """A throttled editor to prevent FloodWait errors during progress updates."""
     if not status_message or not hasattr(status_message, 'chat'):
@@ -27,9 +46,65 @@ async def smart_progress_editor(status_message, text: str):
         except Exception:
             pass
 
-async def merge_videos(video_files: List[str], user_id: int, status_message) -> str | None:
+async def merge_videos(video_files: List[str], user_id: int, status_message, live_output=None) -> str | None:
+    """
+    Probes the inputs first, then runs the cheapest merge that will work.
+
+    - `live_output`: Optional LiveOutput that is handed every pass writing the final file, for upload-while-merging.
     """
-    Asynchronously tries a fast merge, then falls back to a robust merge.
+    await status_message.edit_text("🔍 **Analyzing videos...**\nChecking whether they can be merged without re-encoding.")
+    plan = await plan_merge(video_files)
+
+    if plan["strategy"] == STRATEGY_REENCODE:
+        await status_message.edit_text(
+            "🧭 **Merge Plan: Robust Mode**\n"
+            f"➢ `{plan['reason']}`\n\n"
+            "Videos have different formats and will be re-encoded."
+        )
+        await asyncio.sleep(2)
+        return await _merge_videos_robust(video_files, user_id, status_message, plan, live_output)
+
+    if plan["strategy"] == STRATEGY_NORMALIZE:
+        await status_message.edit_text(
+            "🧭 **Merge Plan: Selective Normalization**\n"
+            f"➢ `{plan['reason']}`"
+        )
+        input_sizes = [os.path.getsize(f) for f in video_files]
+        await disk_admission.grow(
+            os.path.join(Config.DOWNLOAD_DIR, str(user_id)),
+            estimate_merge_footprint(input_sizes, STRATEGY_NORMALIZE, [input_sizes[i] for i in plan["outliers"]]),
+        )
+        await asyncio.sleep(2)
+        conformed_files = await _normalize_outliers(video_files, user_id, status_message, plan)
+        if conformed_files:
+            output_path = await _merge_videos_copy(conformed_files, user_id, status_message, live_output=live_output, verify=True)
+            if output_path:
+                return output_path
+        await status_message.edit_text(
+            "⚠️ Selective normalization failed.\n"
+            "🔄 **Switching to Robust Mode...** This will re-encode all videos and may take longer."
+        )
+        await asyncio.sleep(2)
+        return await _merge_videos_robust(video_files, user_id, status_message, plan, live_output)
+
+    output_path = await _merge_videos_copy(video_files, user_id, status_message, live_output=live_output)
+    if output_path:
+        return output_path
+
+    await status_message.edit_text(
+        "⚠️ Fast merge failed. Videos might have different formats.\n"
+        "🔄 **Switching to Robust Mode...** This will re-encode videos and may take longer."
+    )
+    await asyncio.sleep(2)
+    return await _merge_videos_robust(video_files, user_id, status_message, plan, live_output)
+
+async def _merge_videos_copy(video_files: List[str], user_id: int, status_message, mode_label: str = "Fast Mode", live_output=None, verify: bool = False) -> str | None:
+    """
+    Merges already compatible files using the concat demuxer with stream copy.
+    With `live_output` the matroska is written in live mode, which never seeks
+    back, so it can be uploaded while it is being written.
+
+    - `verify`: Decode the merged video before accepting it, for inputs from different encoders.
     """
     user_download_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
     output_path = os.path.join(user_download_dir, f"merged_{int(time.time())}.mkv")
@@ -43,42 +118,265 @@ async def merge_videos(video_files: List[str], user_id: int, status_message) ->
             formatted_path = abs_path.replace("'", "'\\''")
             f.write(f"file '{formatted_path}'\n")
 
-    await status_message.edit_text("🚀 **Starting Merge (Fast Mode)...**\nThis should be quick if videos are compatible.")
+    await status_message.edit_text(f"🚀 **Starting Merge ({mode_label})...**\nThis should be quick if videos are compatible.")
 
     command = [
         'ffmpeg', '-hide_banner', '-loglevel', 'error',
         '-f', 'concat', '-safe', '0', '-i', inputs_file,
-        '-c', 'copy', '-y', output_path
+        '-c', 'copy', *(['-live', '1'] if live_output else []), '-y', output_path
     ]
 
-    process = await asyncio.create_subprocess_exec(
-        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
+    attempt = live_output.begin(output_path) if live_output else None
+    job = FFmpegJob(command)
+    merged = False
+    try:
+        await job.run()
+        merged = job.ok and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        if merged and verify:
+            # Checked before the live upload is released, so a broken file is never shipped.
+            await status_message.edit_text(f"🔍 **Verifying merged video ({mode_label})...**")
+            merged = await _decodes_cleanly(output_path)
+    finally:
+        if attempt:
+            attempt.end(merged)
+    os.remove(inputs_file)
 
-    stdout, stderr = await process.communicate()
-
-    if process.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-        await status_message.edit_text("✅ **Merge Complete! (Fast Mode)**")
-        os.remove(inputs_file)
+    if merged:
+        await status_message.edit_text(f"✅ **Merge Complete! ({mode_label})**")
         return output_path
+
+    LOGGER.warning(f"Fast merge failed. FFmpeg stderr: {job.stderr_tail}")
+    return None
+
+async def _decodes_cleanly(path: str) -> bool:
+    """
+    Decodes the video of `path` to nowhere. A copy concat keeps only the first
+    input's extradata, so segments that carry no parameter sets of their own
+    decode with the wrong ones; the decoder reports that as errors.
+    """
+    job = FFmpegJob(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path, '-map', '0:v:0', '-f', 'null', '-'])
+    await job.run()
+    # The null muxer complains about timestamps that merely touch at the joins; only decoder errors count.
+    errors = [
+        line for line in job.stderr_tail.splitlines()
+        if line.strip() and not line.startswith("[null @") and "Last message repeated" not in line
+    ]
+    if not job.ok or errors:
+        LOGGER.warning(f"Merged file {path} does not decode cleanly: {job.stderr_tail}")
+        return False
+    return True
+
+def _conform_command(input_file: str, output_file: str, target: dict, has_audio: bool, threads: int = 0) -> List[str]:
+    """Builds an ffmpeg command that re-encodes `input_file` to the `target` signature."""
+    width, height = target["video_width"], target["video_height"]
+    video_filter = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+        f"fps={target['video_r_frame_rate']},format={target['video_pix_fmt']}"
+    )
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', input_file]
+
+    audio_codec = target.get("audio_codec_name")
+    if audio_codec:
+        layout = target["audio_channel_layout"]
+        if layout.endswith("ch"):
+            # Count-only layout from stream_signature, e.g. "6ch" -> ffmpeg's "6c".
+            layout = layout[:-2] + "c"
+        if not has_audio:
+            # Majority has audio, this clip doesn't: pad it with silence so the copy concat lines up.
+            command += ['-f', 'lavfi', '-i', f"anullsrc=r={target['audio_sample_rate']}:cl={layout}"]
+        # The audio is padded with silence to the video's length below, so -shortest only trims overlong audio.
+        command += ['-map', '0:v:0', '-map', '0:a:0' if has_audio else '1:a:0', '-shortest']
     else:
-        error_log = stderr.decode().strip()
-        print(f"Fast merge failed. FFmpeg stderr: {error_log}")
-        await status_message.edit_text(
-            "⚠️ Fast merge failed. Videos might have different formats.\n"
-            "🔄 **Switching to Robust Mode...** This will re-encode videos and may take longer."
-        )
-        await asyncio.sleep(2)
-        os.remove(inputs_file)
-        return await _merge_videos_filter(video_files, user_id, status_message)
+        command += ['-map', '0:v:0', '-an']
+
+    encoder = VIDEO_ENCODERS[target["video_codec_name"]]
+    command += ['-vf', video_filter, '-c:v', encoder, '-preset', 'fast', '-crf', '23']
+    # In-band parameter sets, so this clip still decodes after a copy concat behind another encoder's output.
+    command += IN_BAND_HEADERS.get(encoder, [])
+    if threads:
+        command += ['-threads', str(threads)]
+    profile = (target.get("video_profile") or "").lower().replace(" ", "").replace("constrained", "")
+    if profile in ("baseline", "main", "high", "high10", "main10"):
+        command += ['-profile:v', profile]
+
+    if output_file.lower().endswith((".mp4", ".m4v", ".mov")) and target.get("video_time_base"):
+        command += ['-video_track_timescale', target["video_time_base"].split("/")[-1]]
+
+    if audio_codec:
+        command += [
+            '-c:a', AUDIO_ENCODERS[audio_codec],
+            '-af', f"aformat=sample_rates={target['audio_sample_rate']}:channel_layouts={layout},apad",
+        ]
+        if target.get("audio_bit_rate"):
+            command += ['-b:a', target["audio_bit_rate"]]
+
+    command += ['-y', output_file]
+    return command
+
+async def _run_encode(command: List[str], on_progress) -> bool:
+    """Runs one encode, forwarding its output position (in seconds) to `on_progress`."""
+    async def forward(event: dict):
+        await on_progress(event["out_time"])
 
-async def _merge_videos_filter(video_files: List[str], user_id: int, status_message) -> str | None:
-    """Fallback async merge function using the robust but slower 'concat' filter."""
+    job = FFmpegJob(command, on_progress=forward)
+    await job.run()
+    if not job.ok:
+        LOGGER.error(f"Encode failed: {' '.join(command)}\nFFmpeg stderr: {job.stderr_tail}")
+    return job.ok
+
+def encode_budget(jobs: int) -> tuple:
+    """
+    Splits the host's cores between parallel encodes.
+
+    returns: (parallel workers, ffmpeg threads per worker)
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(jobs, Config.MAX_CONCURRENT_ENCODES, cores))
+    return workers, max(1, cores // workers)
+
+async def _transcode_inputs(
+    video_files: List[str],
+    indexes: List[int],
+    target: dict,
+    extension: str,
+    user_id: int,
+    status_message,
+    plan: dict,
+    title: str,
+) -> List[str] | None:
+    """
+    Re-encodes the inputs at `indexes` to `target` concurrently, within the core budget,
+    reporting one progress bar aggregated over all running encodes.
+
+    returns: The input list with those inputs swapped for their encoded copies, or None on failure.
+    """
     user_download_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
-    output_path = os.path.join(user_download_dir, f"merged_fallback_{int(time.time())}.mkv")
+    durations = {i: plan["properties"][i].get("duration") or 0 for i in indexes}
+    total_duration = sum(durations.values())
+    done = {i: 0.0 for i in indexes}
+    workers, threads = encode_budget(len(indexes))
+    semaphore = asyncio.Semaphore(workers)
+    start_time = time.time()
+    LOGGER.info(f"Encoding {len(indexes)} input(s) with {workers} worker(s) x {threads} thread(s)")
+
+    encoded = list(video_files)
+
+    async def encode(i: int) -> bool:
+        output_file = os.path.join(user_download_dir, f"encoded_{i}_{int(time.time())}{extension}")
+        has_audio = plan["signatures"][i].get("audio_codec_name") is not None
+
+        async def on_progress(seconds: float):
+            done[i] = min(seconds, durations[i])
+            if total_duration > 0:
+                progress_percent = max(0, min(1, sum(done.values()) / total_duration))
+                progress_text = (
+                    f"⚙️ **{title}**\n"
+                    f"➢ {get_progress_bar(progress_percent)} `{progress_percent:.1%}`\n"
+                    f"➢ **Parallel Encodes:** `{workers}`\n"
+                    f"➢ **Time Left:** `{get_time_left(time.time() - start_time, progress_percent)}`"
+                )
+                await smart_progress_editor(status_message, progress_text)
+
+        async with semaphore:
+            command = _conform_command(video_files[i], output_file, target, has_audio, threads)
+            ok = await _run_encode(command, on_progress)
+        if ok and os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+            encoded[i] = output_file
+            return True
+        return False
+
+    results = await asyncio.gather(*[encode(i) for i in indexes])
+    if not all(results):
+        return None
+    return encoded
+
+async def _normalize_outliers(video_files: List[str], user_id: int, status_message, plan: dict) -> List[str] | None:
+    """Re-encodes only the inputs that don't match the majority profile."""
+    majority = plan["signatures"].index(plan["target"])
+    # The majority's raw r_frame_rate can be a VFR timebase like 90000/1, so fps= gets its clamped average rate.
+    target = dict(plan["target"], video_r_frame_rate=_target_frame_rate(plan["properties"][majority]))
+    outliers = plan["outliers"]
+    majority_ext = os.path.splitext(video_files[majority])[1] or ".mkv"
+    return await _transcode_inputs(
+        video_files, outliers, target, majority_ext, user_id, status_message, plan,
+        f"Normalizing {len(outliers)} of {len(video_files)} Videos...",
+    )
+
+def _parse_rate(rate: str) -> Fraction:
+    try:
+        return Fraction(rate or "0")
+    except (ValueError, ZeroDivisionError):
+        return Fraction(0)
+
+def _target_frame_rate(properties: dict) -> str:
+    """
+    The first video stream's average frame rate, clamped to MIN_FPS..MAX_FPS.
+    r_frame_rate is only trusted when it's already in range: for VFR phone
+    footage it is often a timebase like 90000/1.
+    """
+    video = next((s for s in properties.get("streams", []) if s.get("codec_type") == "video"), {})
+    fps = _parse_rate(video.get("avg_frame_rate"))
+    if fps > 0:
+        fps = min(max(fps, MIN_FPS), MAX_FPS)
+    else:
+        fps = _parse_rate(video.get("r_frame_rate"))
+        if not MIN_FPS <= fps <= MAX_FPS:
+            return "30/1"
+    return f"{fps.numerator}/{fps.denominator}"
+
+def _robust_target(properties: List[dict]) -> dict:
+    """Common intermediate for robust mode: H.264/AAC at the first input's size and frame rate."""
+    signatures = [stream_signature(p) for p in properties]
+    first = signatures[0]
+    has_audio = any(sig.get("audio_codec_name") for sig in signatures)
+    return {
+        "video_codec_name": "h264",
+        "video_profile": "High",
+        # libx264 with yuv420p needs even dimensions.
+        "video_width": (first.get("video_width") or 1280) // 2 * 2,
+        "video_height": (first.get("video_height") or 720) // 2 * 2,
+        "video_pix_fmt": "yuv420p",
+        "video_r_frame_rate": _target_frame_rate(properties[0]),
+        "video_time_base": None,
+        "audio_codec_name": "aac" if has_audio else None,
+        "audio_sample_rate": "48000",
+        "audio_channel_layout": "stereo",
+        "audio_bit_rate": "192k",
+    }
+
+async def add_seek_index(path: str) -> bool:
+    """
+    Re-muxes a live-mode matroska (no Cues, no Duration) with stream copy so
+    players can seek in it again. Replaces `path` in place; returns False and
+    leaves the file untouched if the re-mux fails.
+    """
+    indexed_path = os.path.splitext(path)[0] + ".indexed.mkv"
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path, '-map', '0', '-c', 'copy', '-y', indexed_path]
+    job = FFmpegJob(command)
+    await job.run()
+    if not job.ok:
+        LOGGER.warning(f"Could not add a seek index to {path}: {job.stderr_tail}")
+        if os.path.exists(indexed_path):
+            os.remove(indexed_path)
+        return False
+    os.replace(indexed_path, path)
+    return True
 
-    tasks = [get_video_properties(f) for f in video_files]
-    all_properties = await asyncio.gather(*tasks)
+async def _merge_videos_robust(video_files: List[str], user_id: int, status_message, plan: dict = None, live_output=None) -> str | None:
+    """
+    Robust merge: encodes every input to a common intermediate in parallel,
+    then joins the intermediates with a stream-copy concat.
+    """
+    await disk_admission.grow(
+        os.path.join(Config.DOWNLOAD_DIR, str(user_id)),
+        estimate_merge_footprint([os.path.getsize(f) for f in video_files], STRATEGY_REENCODE),
+    )
+    if plan and plan.get("signatures"):
+        all_properties = plan["properties"]
+    else:
+        tasks = [get_video_properties(f) for f in video_files]
+        all_properties = await asyncio.gather(*tasks)
 
     valid_properties = [p for p in all_properties if p and p.get('duration') is not None]
 
@@ -92,60 +390,17 @@ async def _merge_videos_filter(video_files: List[str], user_id: int, status_mess
         await status_message.edit_text("❌ **Merge Failed!** Total video duration is zero.")
         return None
 
-    input_args = []
-    filter_complex = []
-
-    for i, file in enumerate(video_files):
-        input_args.extend(['-i', file])
-        filter_complex.append(f"[{i}:v:0][{i}:a:0]")
-
-    filter_complex_str = "".join(filter_complex) + f"concat=n={len(video_files)}:v=1:a=1[v][a]"
-
-    command = [
-        'ffmpeg', '-hide_banner', *input_args, '-filter_complex', filter_complex_str,
-        '-map', '[v]', '-map', '[a]', '-c:v', 'libx264', '-preset', 'fast',
-        '-crf', '23', '-c:a', 'aac', '-b:a', '192k', '-y',
-        '-progress', 'pipe:1', output_path
-    ]
-
-    process = await asyncio.create_subprocess_exec(
-        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    signatures = [stream_signature(p) for p in valid_properties]
+    robust_plan = {"properties": valid_properties, "signatures": signatures}
+    encoded_files = await _transcode_inputs(
+        video_files, list(range(len(video_files))), _robust_target(valid_properties), ".mkv",
+        user_id, status_message, robust_plan, "Merging Videos (Robust Mode)...",
     )
 
-    start_time = time.time()
+    if encoded_files:
+        output_path = await _merge_videos_copy(encoded_files, user_id, status_message, "Robust Mode", live_output)
+        if output_path:
+            return output_path
 
-    while process.returncode is None:
-        line_bytes = await process.stdout.readline()
-        if not line_bytes:
-            break
-
-        line = line_bytes.decode('utf-8').strip()
-
-        # --- FIX 2: Handle "N/A" from FFmpeg progress to prevent ValueError ---
-        if 'out_time_ms' in line:
-            parts = line.split('=')
-            # Check if the value is a valid number before trying to convert it
-            if len(parts) > 1 and parts[1].strip().isdigit():
-                current_time_ms = int(parts[1])
-                # Ensure total_duration is not zero to avoid division by zero
-                if total_duration > 0:
-                    progress_percent = max(0, min(1, (current_time_ms / 1000000) / total_duration))
-                    elapsed_time = time.time() - start_time
-                    progress_text = (
-                        f"⚙️ **Merging Videos (Robust Mode)...**\n"
-                        f"➢ {get_progress_bar(progress_percent)} `{progress_percent:.1%}`\n"
-                        f"➢ **Time Left:** `{get_time_left(elapsed_time, progress_percent)}`"
-                    )
-                    await smart_progress_editor(status_message, progress_text)
-
-    await process.wait()
-
-    if process.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-        await status_message.edit_text("✅ **Merge Complete! (Robust Mode)**")
-        return output_path
-    else:
-        stderr = await process.stderr.read()
-        error_output = stderr.decode().strip()
-        print(f"Robust merge failed. FFmpeg stderr: {error_output}")
-        await status_message.edit_text(f"❌ **Merge Failed!**\nRobust method also failed. See logs for details.")
-        return None
+    await status_message.edit_text(f"❌ **Merge Failed!**\nRobust method also failed. See logs for details.")
+    return None
@@ -0,0 +1,136 @@
+# helpers/preflight.py
+
+import asyncio
+import os
+from collections import Counter
+from urllib.parse import unquote, urlparse
+from config import Config
+from __init__ import LOGGER
+from helpers.http_client import http_client
+from helpers.downloader import fetch_url_info
+from helpers.probe import probe_remote
+from helpers.utils import get_readable_file_size, video_properties_from_probe
+from helpers.merge_planner import stream_signature, signature_key
+
+SNIFF_BYTES = 64 * 1024
+
+
+def sniff_container(head: bytes) -> str:
+    """Guesses the container from the first bytes of a file."""
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "matroska"
+    if len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        return "mpegts"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head[:3] == b"FLV":
+        return "flv"
+    if head.lstrip()[:1] == b"<":
+        return "html"
+    return "unknown"
+
+
+def has_moov_atom(head: bytes) -> bool:
+    """True if an MP4's `moov` index sits within `head`, i.e. it can be probed without seeking."""
+    position = 0
+    while position + 8 <= len(head):
+        size = int.from_bytes(head[position:position + 4], "big")
+        if head[position + 4:position + 8] == b"moov":
+            return True
+        if size == 1 and position + 16 <= len(head):
+            size = int.from_bytes(head[position + 8:position + 16], "big")
+        if size < 8:
+            return False
+        position += size
+    return False
+
+
+async def _read_head(url: str) -> bytes:
+    """Fetches the first `SNIFF_BYTES` of `url` with a range request."""
+    headers = {"Range": f"bytes=0-{SNIFF_BYTES - 1}"}
+    async with http_client.session.get(url, headers=headers) as resp:
+        if resp.status not in (200, 206):
+            raise Exception(f"Status {resp.status}")
+        head = b""
+        # A server without range support sends the whole file; stop after the header.
+        while len(head) < SNIFF_BYTES:
+            chunk = await resp.content.readany()
+            if not chunk:
+                break
+            head += chunk
+        return head[:SNIFF_BYTES]
+
+
+async def preflight_url(url: str) -> dict:
+    """
+    Checks a URL before it's downloaded: size from HEAD, container from the
+    first bytes, and streams from a remote ffprobe of the container header.
+
+    returns: dict with `url`, `name`, `size` (0 if unknown), `container`,
+    `duration`, the planner `signature` (None if the streams couldn't be read)
+    and `error`, which is set if the URL must not be queued.
+    """
+    result = {
+        "url": url,
+        "name": os.path.basename(unquote(urlparse(url).path)) or url,
+        "size": 0,
+        "container": None,
+        "duration": 0.0,
+        "signature": None,
+        "error": None,
+    }
+    try:
+        info = await asyncio.wait_for(fetch_url_info(http_client.session, url), Config.PREFLIGHT_TIMEOUT)
+        result["size"] = info["size"]
+        if info["size"] > Config.MAX_FILE_SIZE:
+            result["error"] = (
+                f"File is {get_readable_file_size(info['size'])}, "
+                f"the limit is {get_readable_file_size(Config.MAX_FILE_SIZE)}"
+            )
+            return result
+
+        head = await asyncio.wait_for(_read_head(info["url"]), Config.PREFLIGHT_TIMEOUT)
+        result["container"] = sniff_container(head)
+        if result["container"] == "html":
+            result["error"] = "Link points to a web page, not a media file"
+            return result
+        if result["container"] == "mp4" and not has_moov_atom(head) and not info["ranges"]:
+            # The index is at the end and the server can't seek there; only a full download can tell.
+            return result
+
+        properties = video_properties_from_probe(await probe_remote(info["url"], Config.PREFLIGHT_TIMEOUT))
+        result["duration"] = properties["duration"]
+        result["signature"] = stream_signature(properties)
+    except StopIteration:
+        result["error"] = "No video stream found"
+    except Exception as e:
+        # Unknown streams don't block the download, the merge planner checks them again later.
+        LOGGER.info(f"Pre-flight could not fully inspect {url}: {e!r}")
+    return result
+
+
+def queue_mismatches(results: list) -> set:
+    """URLs whose streams differ from the queue's most common profile, i.e. that will force a re-encode."""
+    keys = {r["url"]: signature_key(r["signature"]) for r in results if r.get("signature")}
+    if len(set(keys.values())) < 2:
+        return set()
+    majority, _ = Counter(keys.values()).most_common(1)[0]
+    return {url for url, key in keys.items() if key != majority}
+
+
+def format_preflight(result: dict, mismatched: bool = False) -> str:
+    """One queue line: name, size, duration and codec, with a warning if it will need re-encoding."""
+    parts = [get_readable_file_size(result["size"]) if result["size"] else "size unknown"]
+    if result["duration"]:
+        minutes, seconds = divmod(int(result["duration"]), 60)
+        parts.append(f"{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}")
+    signature = result.get("signature")
+    if signature:
+        parts.append(f"{signature['video_codec_name']} {signature['video_width']}x{signature['video_height']}")
+    name = result["name"] if len(result["name"]) <= 40 else result["name"][:37] + "..."
+    line = f"`{name}` | {' | '.join(parts)}"
+    if mismatched:
+        line += " | ⚠️ re-encode"
+    return line
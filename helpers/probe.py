@@ -0,0 +1,97 @@
+# helpers/probe.py
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from config import Config
+from __init__ import LOGGER
+
+
+async def _run_ffprobe(path: str, options: tuple = ()) -> dict:
+    """Runs ffprobe without blocking the event loop and returns its parsed JSON output."""
+    command = [
+        "ffprobe", "-v", "error", *options, "-print_format", "json",
+        "-show_format", "-show_streams", path,
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {stderr.decode().strip()}")
+    return json.loads(stdout.decode())
+
+
+class ProbeCache:
+    """
+    Bounded LRU cache of ffprobe results.
+
+    Entries are keyed by (absolute path, size, mtime) so a file that changes on
+    disk is probed again, and concurrent requests for the same file share one
+    ffprobe process.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    @staticmethod
+    def _key(path: str) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    async def probe(self, path: str) -> dict:
+        key = self._key(path)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._probe_and_store(key, path))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller doesn't kill the probe for everyone else.
+        return await asyncio.shield(task)
+
+    async def _probe_and_store(self, key: tuple, path: str) -> dict:
+        result = await _run_ffprobe(path)
+        self.invalidate(key[0])
+        self._entries[key] = result
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, path: str):
+        """Drops every cached result for `path`."""
+        abs_path = os.path.abspath(path)
+        for key in [k for k in self._entries if k[0] == abs_path]:
+            del self._entries[key]
+
+
+probe_cache = ProbeCache(Config.PROBE_CACHE_SIZE)
+
+
+async def probe(path: str) -> dict:
+    """Drop-in async replacement for `ffmpeg.probe`, served from the shared cache."""
+    try:
+        return await probe_cache.probe(path)
+    except Exception as e:
+        LOGGER.warning(f"Probe failed: {e}")
+        raise
+
+
+async def probe_remote(url: str, timeout: float) -> dict:
+    """
+    Probes a media URL without downloading it. ffprobe only reads the container
+    header, seeking with range requests if the index is at the end of the file.
+    Not cached, since the remote file can change.
+    """
+    options = ("-rw_timeout", str(int(timeout * 1000000)))
+    return await asyncio.wait_for(_run_ffprobe(url, options), timeout=timeout)
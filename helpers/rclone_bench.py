@@ -0,0 +1,111 @@
+# helpers/rclone_bench.py
+
+"""
+Benchmarks the rclone transfer profiles against a local backend.
+
+    python -m helpers.rclone_bench --sizes 16 256 1024 --type local
+
+Random test files are copied with `operations/copyfile` through a throwaway
+`rclone rcd` whose only remote is a local directory, once per profile, and the
+best throughput of `--rounds` runs is reported. `--type` selects which
+backend's tiers are compared; on the local backend only their `_config` part
+(buffer size, multi-thread streams) takes effect, since backend options such
+as chunk_size belong to the remote they were written for.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from helpers.http_client import http_client
+from helpers.rclone_rc import RcloneDaemon
+from helpers.rclone_profiles import TRANSFER_PROFILES, DEFAULT_PROFILES, profile_for, remote_fs
+from helpers.utils import get_readable_file_size
+
+MB = 1024 ** 2
+WRITE_CHUNK_SIZE = 4 * MB
+COPY_TIMEOUT = 3600
+
+# What rclone_upload used before profiles existed.
+BASELINE_PROFILE = {"name": "baseline", "backend": {}, "config": {"BufferSize": "1M"}}
+
+
+def _make_file(path: str, size: int):
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = os.urandom(min(WRITE_CHUNK_SIZE, remaining))
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+async def _copy(daemon: RcloneDaemon, src_dir: str, dst_dir: str, name: str, profile: dict, backend_options: bool) -> float:
+    dst_path = os.path.join(dst_dir, name)
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    started = time.monotonic()
+    await daemon.call(
+        "operations/copyfile",
+        timeout=COPY_TIMEOUT,
+        srcFs=src_dir,
+        srcRemote=name,
+        dstFs=remote_fs("bench", dst_dir, profile if backend_options else {"backend": {}}),
+        dstRemote=name,
+        _config=profile["config"],
+    )
+    return time.monotonic() - started
+
+
+async def run(sizes_mb: list, backend_type: str, rounds: int, work_dir: str = None):
+    root = tempfile.mkdtemp(prefix="rclone-bench-", dir=work_dir)
+    src_dir, dst_dir = os.path.join(root, "src"), os.path.join(root, "dst")
+    os.makedirs(src_dir)
+    os.makedirs(dst_dir)
+    conf_path = os.path.join(root, "rclone.conf")
+    with open(conf_path, "w") as f:
+        f.write("[bench]\ntype = local\n")
+
+    tiers = TRANSFER_PROFILES.get(backend_type, DEFAULT_PROFILES)
+    profiles = [BASELINE_PROFILE] + [profile for _, profile in tiers]
+    backend_options = backend_type == "local"
+    daemon = RcloneDaemon(conf_path)
+    try:
+        await daemon.start()
+        print(f"{'size':>10}  {'profile':<16} {'time':>8}  {'throughput':>12}")
+        for size_mb in sizes_mb:
+            size = size_mb * MB
+            name = f"bench_{size_mb}M.bin"
+            await asyncio.to_thread(_make_file, os.path.join(src_dir, name), size)
+            chosen = profile_for(backend_type, size)["name"]
+            for profile in profiles:
+                best = min([
+                    await _copy(daemon, src_dir, dst_dir, name, profile, backend_options)
+                    for _ in range(rounds)
+                ])
+                marker = " *" if profile["name"] == chosen else ""
+                print(
+                    f"{get_readable_file_size(size):>10}  {profile['name'] + marker:<16} {best:>7.2f}s"
+                    f"  {get_readable_file_size(size / best):>10}/s"
+                )
+            os.remove(os.path.join(src_dir, name))
+        print("* profile picked for this size")
+    finally:
+        await daemon.stop()
+        await http_client.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rclone transfer profiles against a local backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 256, 1024], help="File sizes in MB")
+    parser.add_argument("--type", default="local", choices=sorted(TRANSFER_PROFILES), help="Backend type whose profiles are compared")
+    parser.add_argument("--rounds", type=int, default=3, help="Copies per profile; the fastest is reported")
+    parser.add_argument("--dir", default=None, help="Where to put the test files (default: system temp dir)")
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.type, args.rounds, args.dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# helpers/rclone_profiles.py
+
+import configparser
+
+MB = 1024 ** 2
+GB = 1024 ** 3
+
+# Transfer tiers per backend type, as (largest file size the tier is for, profile);
+# the last tier has no limit and is also used when the size isn't known yet.
+# "backend" options go into the remote's connection string (`remote,chunk_size=32M:path`),
+# "config" options into the rc call's `_config`.
+# Drive, OneDrive and Dropbox buffer a whole chunk in memory, so chunks stay modest.
+TRANSFER_PROFILES = {
+    "drive": [
+        (64 * MB, {"name": "drive-small", "backend": {"chunk_size": "8M"}, "config": {"BufferSize": "8M"}}),
+        (1 * GB, {"name": "drive-medium", "backend": {"chunk_size": "32M"}, "config": {"BufferSize": "32M"}}),
+        (None, {"name": "drive-large", "backend": {"chunk_size": "64M"}, "config": {"BufferSize": "64M"}}),
+    ],
+    "onedrive": [
+        # OneDrive chunks must be a multiple of 320k.
+        (256 * MB, {"name": "onedrive-small", "backend": {"chunk_size": "10M"}, "config": {"BufferSize": "16M"}}),
+        (None, {"name": "onedrive-large", "backend": {"chunk_size": "60M"}, "config": {"BufferSize": "64M"}}),
+    ],
+    "dropbox": [
+        (256 * MB, {"name": "dropbox-small", "backend": {"chunk_size": "16M"}, "config": {"BufferSize": "16M"}}),
+        (None, {"name": "dropbox-large", "backend": {"chunk_size": "64M"}, "config": {"BufferSize": "64M"}}),
+    ],
+    "s3": [
+        (256 * MB, {
+            "name": "s3-small",
+            "backend": {"chunk_size": "16M", "upload_concurrency": 4},
+            "config": {"BufferSize": "16M", "MultiThreadStreams": 0},
+        }),
+        (None, {
+            "name": "s3-large",
+            "backend": {"chunk_size": "64M", "upload_concurrency": 8},
+            "config": {"BufferSize": "64M", "MultiThreadStreams": 8, "MultiThreadCutoff": "256M"},
+        }),
+    ],
+    "b2": [
+        (256 * MB, {
+            "name": "b2-small",
+            "backend": {"chunk_size": "32M", "upload_concurrency": 4},
+            "config": {"BufferSize": "16M", "MultiThreadStreams": 0},
+        }),
+        (None, {
+            "name": "b2-large",
+            "backend": {"chunk_size": "96M", "upload_concurrency": 8},
+            "config": {"BufferSize": "64M", "MultiThreadStreams": 8, "MultiThreadCutoff": "256M"},
+        }),
+    ],
+    "local": [
+        (256 * MB, {"name": "local-small", "backend": {}, "config": {"BufferSize": "16M", "MultiThreadStreams": 0}}),
+        (None, {
+            "name": "local-large",
+            "backend": {},
+            "config": {"BufferSize": "64M", "MultiThreadStreams": 4, "MultiThreadCutoff": "256M"},
+        }),
+    ],
+}
+
+# Unknown types and wrappers (crypt, alias, union) whose options belong to another remote.
+DEFAULT_PROFILES = [
+    (None, {"name": "default", "backend": {}, "config": {"BufferSize": "16M"}}),
+]
+
+
+def remote_type(conf_path: str, remote_name: str) -> str | None:
+    """The `type` of `remote_name` in an rclone.conf, or None if it isn't there."""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(conf_path)
+    return parser.get(remote_name, "type", fallback=None)
+
+
+def profile_for(backend_type: str | None, size: int | None) -> dict:
+    """Picks the first tier of `backend_type` that fits `size` bytes (None: size not known yet)."""
+    tiers = TRANSFER_PROFILES.get(backend_type, DEFAULT_PROFILES)
+    for limit, profile in tiers:
+        if limit is not None and size is not None and size <= limit:
+            return profile
+    return tiers[-1][1]
+
+
+def transfer_profile(conf_path: str, remote_name: str, size: int | None) -> dict:
+    return profile_for(remote_type(conf_path, remote_name), size)
+
+
+def remote_fs(remote_name: str, path: str, profile: dict) -> str:
+    """`remote:path` with the profile's backend options added as a connection string."""
+    options = "".join(f",{key}={value}" for key, value in profile["backend"].items())
+    return f"{remote_name}{options}:{path}"
@@ -0,0 +1,220 @@
+# helpers/rclone_rc.py
+
+import asyncio
+import json
+import os
+import secrets
+import socket
+import time
+from aiohttp import BasicAuth, ClientTimeout
+from config import Config
+from __init__ import LOGGER
+from helpers.http_client import http_client
+
+# Upper bound on how long past RCLONE_DAEMON_IDLE an unused daemon keeps running.
+REAP_INTERVAL = 60
+
+
+class RcloneError(Exception):
+    """An rclone remote-control call or job failed."""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RcloneDaemon:
+    """
+    A managed `rclone rcd` for one rclone.conf, driven over its JSON API.
+
+    The daemon listens on a random loopback port behind a random password, so
+    only this process can talk to it. Every call is an aiohttp request on the
+    shared session; nothing blocks the event loop. Long operations run as rc
+    jobs (`_async`) which are polled with `job/status` and `core/stats` and
+    stopped with `job/stop` when the awaiting task is cancelled.
+    """
+
+    STARTUP_TIMEOUT = 15
+
+    def __init__(self, conf_path: str):
+        self.conf_path = conf_path
+        self.process = None
+        self.url = None
+        self.active_jobs = 0
+        self.last_used = time.monotonic()
+        self._auth = None
+        self._stderr_task = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        async with self._lock:
+            if self.running:
+                return
+            port = _free_port()
+            user, password = secrets.token_hex(8), secrets.token_hex(16)
+            self.process = await asyncio.create_subprocess_exec(
+                "rclone", "rcd", f"--config={self.conf_path}",
+                f"--rc-addr=127.0.0.1:{port}", f"--rc-user={user}", f"--rc-pass={password}",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            self.url = f"http://127.0.0.1:{port}/"
+            self._auth = BasicAuth(user, password)
+            self._stderr_task = asyncio.ensure_future(self._log_stderr())
+
+            deadline = time.monotonic() + self.STARTUP_TIMEOUT
+            while True:
+                try:
+                    await self.call("rc/noop")
+                    break
+                except Exception as e:
+                    if not self.running or time.monotonic() > deadline:
+                        await self.stop()
+                        raise RcloneError(f"rclone rcd did not start for {self.conf_path}: {e}")
+                    await asyncio.sleep(0.2)
+            LOGGER.info(f"rclone rcd started on port {port} for {self.conf_path}")
+
+    async def stop(self):
+        if self.running:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self._stderr_task:
+            self._stderr_task.cancel()
+            self._stderr_task = None
+
+    async def _log_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            LOGGER.info(f"rclone: {line.decode(errors='replace').rstrip()}")
+
+    async def call(self, command: str, timeout: float = None, **params) -> dict:
+        """Runs one rc command and returns its JSON result. Raises RcloneError on failure."""
+        self.last_used = time.monotonic()
+        async with http_client.session.post(
+            f"{self.url}{command}", json=params, auth=self._auth,
+            timeout=ClientTimeout(total=timeout or Config.HTTP_READ_TIMEOUT),
+        ) as resp:
+            result = await resp.json(content_type=None)
+        if resp.status != 200:
+            raise RcloneError(f"{command} failed: {result.get('error', resp.status)}")
+        return result
+
+    async def run_job(self, command: str, on_stats=None, **params) -> dict:
+        """
+        Starts `command` as an rc job and waits for it to finish.
+
+        - `on_stats`: async callable receiving the job's `core/stats` every `RCLONE_STATS_INTERVAL` seconds.
+
+        returns: the job's output. Cancelling the awaiting task stops the job.
+        """
+        job_id = (await self.call(command, _async=True, **params))["jobid"]
+        self.active_jobs += 1
+        delay = 0.5  # short jobs finish before the first stats interval
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                delay = Config.RCLONE_STATS_INTERVAL
+                status = await self.call("job/status", jobid=job_id)
+                if status["finished"]:
+                    break
+                if on_stats:
+                    await on_stats(await self.call("core/stats", group=f"job/{job_id}"))
+        except asyncio.CancelledError:
+            try:
+                await self.call("job/stop", jobid=job_id)
+            except Exception as e:
+                LOGGER.warning(f"Could not stop rclone job {job_id}: {e}")
+            raise
+        finally:
+            self.active_jobs -= 1
+            self.last_used = time.monotonic()
+
+        if not status["success"]:
+            raise RcloneError(f"{command} failed: {status.get('error')}")
+        return status.get("output") or {}
+
+    async def upload_stream(self, fs: str, remote_dir: str, body, config: dict = None) -> dict:
+        """
+        Streams a multipart `body` into `operations/uploadfile`, which rcats
+        every file part to `remote_dir` on `fs` as it arrives. `config` is
+        passed as the call's `_config`.
+        """
+        params = {"fs": fs, "remote": remote_dir}
+        if config:
+            params["_config"] = json.dumps(config)
+        self.active_jobs += 1
+        try:
+            async with http_client.session.post(
+                f"{self.url}operations/uploadfile", params=params,
+                data=body.stream(), headers={"Content-Type": body.content_type},
+                auth=self._auth, timeout=ClientTimeout(total=None),
+            ) as resp:
+                result = await resp.json(content_type=None)
+        finally:
+            self.active_jobs -= 1
+            self.last_used = time.monotonic()
+        if resp.status != 200:
+            raise RcloneError(f"operations/uploadfile failed: {result.get('error', resp.status)}")
+        return result
+
+
+class RcloneDaemons:
+    """
+    One `RcloneDaemon` per rclone.conf, started on first use and kept running
+    between uploads. Daemons without jobs are stopped after
+    `RCLONE_DAEMON_IDLE` seconds by a reaper task that runs while any daemon does.
+    """
+
+    def __init__(self):
+        self._daemons = {}
+        self._reaper = None
+
+    async def get(self, conf_path: str) -> RcloneDaemon:
+        await self._stop_idle()
+        conf_path = os.path.abspath(conf_path)
+        daemon = self._daemons.get(conf_path)
+        if daemon is None:
+            daemon = self._daemons[conf_path] = RcloneDaemon(conf_path)
+        await daemon.start()
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap())
+        return daemon
+
+    async def _reap(self):
+        while self._daemons:
+            await asyncio.sleep(max(1, min(REAP_INTERVAL, Config.RCLONE_DAEMON_IDLE)))
+            try:
+                await self._stop_idle()
+            except Exception as e:
+                LOGGER.warning(f"Could not stop idle rclone daemons: {e}")
+
+    async def _stop_idle(self):
+        now = time.monotonic()
+        for conf_path, daemon in list(self._daemons.items()):
+            if daemon.active_jobs == 0 and now - daemon.last_used > Config.RCLONE_DAEMON_IDLE:
+                del self._daemons[conf_path]
+                LOGGER.info(f"Stopping idle rclone rcd for {conf_path}")
+                await daemon.stop()
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        daemons, self._daemons = list(self._daemons.values()), {}
+        for daemon in daemons:
+            await daemon.stop()
+
+
+rclone_daemons = RcloneDaemons()
@@ -1,17 +1,22 @@
 import os
-import re
-import subprocess
-import time
+import posixpath
 import asyncio
-import json
-import traceback
+from collections import OrderedDict
 from pyrogram.client import Client
 from pyrogram.errors import FloodWait, MessageNotModified
-from pyrogram.types import CallbackQuery, Message
+from pyrogram.types import Message
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from helpers import database
+from helpers.rclone_rc import RcloneError, rclone_daemons
+from helpers.rclone_profiles import transfer_profile, remote_fs
+from helpers.uploader import TailingMultipartBody
+from helpers.utils import get_readable_file_size
 from __init__ import LOGGER
 
+DRIVE_ID_CACHE_SIZE = 512
+
+# (rclone.conf, "remote:path") -> (ID, Name) of uploaded objects
+drive_ids = OrderedDict()
+
 
 class Status:
     # Shared List
@@ -34,43 +39,40 @@ class Status:
 
 
 class RCUploadTask(Status):
-    def __init__(self, task):
+    def __init__(self, user_id: int):
         super().__init__()
         self.Tasks.append(self)
-        self._dl_task = task
+        self.user_id = user_id
+        self._job = None
         self._active = True
-        self._upmsg = ""
+        self._stats = {}
         self._prev_cont = ""
         self._message = None
         self._error = ""
-        self._omess = None
         self.cancel = False
 
-    async def set_original_message(self, omess):
-        self._omess = omess
-
-    async def get_original_message(self):
-        return self._omess
-
-    async def get_sender_id(self):
-        return self._omess.sender_id
-
     async def set_message(self, message):
         self._message = message
 
-    async def refresh_info(self, msg):
-        # The rclone is process dependent so cant be updated here.
-        self._upmsg = msg
+    async def set_job(self, job: asyncio.Future):
+        self._job = job
+
+    async def refresh_info(self, stats: dict):
+        self._stats = stats
 
     async def create_message(self):
-        mat = re.findall("Transferred:.*ETA.*", self._upmsg)
-        nstr = mat[0].replace("Transferred:", "")
-        nstr = nstr.strip()
-        nstr = nstr.split(",")
-        prg = nstr[1].strip("% ")
-        prg = "Progress:- {} - {}%".format(self.progress_bar(prg), prg)
-        progress = "<b>Uploaded:- {} \n{} \nSpeed:- {} \nETA:- {}</b> \n<b>Using Engine:- </b><code>RCLONE</code>".format(
-            nstr[0], prg, nstr[2], nstr[3].replace("ETA", "")
+        done = self._stats.get("bytes", 0)
+        total = self._stats.get("totalBytes", 0)
+        prg = int(done * 100 / total) if total else 0
+        eta = self._stats.get("eta")
+        eta = f"{int(eta // 60)}m{int(eta % 60)}s" if eta is not None else "-"
+        progress = "<b>Uploaded:- {} of {} \nProgress:- {} - {}% \nSpeed:- {}/s \nETA:- {}</b> \n<b>Using Engine:- </b><code>RCLONE</code>".format(
+            get_readable_file_size(done),
+            get_readable_file_size(total),
+            self.progress_bar(prg),
+            prg,
+            get_readable_file_size(self._stats.get("speed", 0)),
+            eta,
         )
         return progress
 
@@ -112,56 +114,65 @@ class RCUploadTask(Status):
             except Exception as e:
                 LOGGER.info("Not expected {}".format(e))
 
+    async def stop(self):
+        """Cancels the upload; the rc job is stopped with job/stop."""
+        self.cancel = True
+        if self._job is not None:
+            self._job.cancel()
+
     async def is_active(self):
         return self._active
 
     async def set_inactive(self, error=None):
         self._active = False
+        if self in self.Tasks:
+            self.Tasks.remove(self)
         if error is not None:
             self._error = error
 
 
-async def rclone_driver(userMess: Message, cb: CallbackQuery, merged_video_path):
-    conf_path = f"./userdata/{cb.from_user.id}/rclone.conf"
-    dl_task = None
-    ul_task = RCUploadTask(dl_task)
-    DRIVE_NAME = (
-        open(conf_path, "r").readlines()[0].removesuffix("]\n").removeprefix("[")
-    )
+async def cancel_rclone_uploads(user_id: int):
+    for task in list(Status.Tasks):
+        if isinstance(task, RCUploadTask) and task.user_id == user_id:
+            await task.stop()
+
+
+def _drive_name(conf_path: str) -> str:
+    return open(conf_path, "r").readlines()[0].removesuffix("]\n").removeprefix("[")
+
+
+async def rclone_driver(merged_video_path: str, new_file_name: str, user_id: int, c: Client, mess: Message):
+    conf_path = f"./userdata/{user_id}/rclone.conf"
+    ul_task = RCUploadTask(user_id)
     BASE_DIR = "/"
-    edtime = 5
     try:
+        DRIVE_NAME = _drive_name(conf_path)
         return await rclone_upload(
             merged_video_path,
-            userMess,
-            cb,
-            cb.message,
+            os.path.basename(new_file_name),
+            mess,
             DRIVE_NAME,
             BASE_DIR,
-            edtime,
             conf_path,
             ul_task,
         )
     except Exception as er:
-        await ul_task.set_inactive()
         LOGGER.info("Stuff gone wrong in here: " + str(er))
+        await mess.edit(f"❌ **Drive upload failed!**\nError: `{er}`")
         return
+    finally:
+        await ul_task.set_inactive()
 
 
 async def rclone_upload(
     merged_video_path: str,
-    userMess: Message,
-    cb: CallbackQuery,
+    file_name: str,
     mess: Message,
     DRIVE_NAME,
     BASE_DIR,
-    edTime,
     conf_path: str,
     task: RCUploadTask,
 ):
-    a = 1
-    await task.set_original_message(userMess)
-    data = "upcancel {}".format(cb.from_user.id)
     msg: Message = await mess.reply_text(
         "**Uploading to configured drive.... will be updated soon.**",
         reply_markup=InlineKeyboardMarkup(
@@ -169,117 +180,115 @@ async def rclone_upload(
         ),
     )
     await task.set_message(msg)
-    rclone_copy_cmd = [
-        "rclone",
-        "copy",
-        f"--config={conf_path}",
-        str(merged_video_path),
-        f"{DRIVE_NAME}:{BASE_DIR}",
-        "-f",
-        "- *.!qB",
-        "--buffer-size=1M",
-        "-P",
-    ]
-    rclonePr = subprocess.Popen(rclone_copy_cmd, stdout=subprocess.PIPE)
-    rcloneResult = await rclone_process_display(
-        rclonePr, edTime, msg, mess, userMess, task
+    daemon = await rclone_daemons.get(conf_path)
+
+    async def on_stats(stats: dict):
+        await task.refresh_info(stats)
+        await task.update_message()
+
+    abs_path = os.path.abspath(merged_video_path)
+    profile = transfer_profile(conf_path, DRIVE_NAME, os.path.getsize(abs_path))
+    LOGGER.info(f"Uploading {file_name} with rclone profile {profile['name']}")
+    job = asyncio.ensure_future(
+        daemon.run_job(
+            "operations/copyfile",
+            on_stats,
+            srcFs=os.path.dirname(abs_path),
+            srcRemote=os.path.basename(abs_path),
+            dstFs=remote_fs(DRIVE_NAME, BASE_DIR, profile),
+            dstRemote=file_name,
+            _config=profile["config"],
+        )
     )
-    if rcloneResult is False:
+    await task.set_job(job)
+    try:
+        await job
+    except asyncio.CancelledError:
+        if not task.cancel:
+            raise
         await mess.edit(f"{mess.text} \n Canceled Rclone Upload")
         await msg.delete()
-        rclonePr.kill()
-        task.cancel = True
         return task
 
     LOGGER.info("Upload Complete")
     gid = await getGdriveLink(
         driveName=DRIVE_NAME,
         baseDir=BASE_DIR,
-        entName=os.path.basename(merged_video_path),
+        entName=file_name,
         conf_path=conf_path,
         isdir=False,
     )
     file_link = f"https://drive.google.com/file/d/{gid[0]}/view"
-    button = [InlineKeyboardButton("Drive url", url=file_link)]
-    await cb.message.reply_text(
-        text=f"**UPLOADED FILE :-**\n<code>{os.path.basename(merged_video_path)}</code>\nTo Drive.",
-        reply_markup=InlineKeyboardMarkup([button]),
-    )
+    await send_drive_link(mess, file_name, file_link)
 
     LOGGER.info(f"Uploaded folder id: {gid}")
     await msg.delete()
     return task
 
 
-async def rclone_process_display(
-    process: subprocess.Popen,
-    edit_time,
-    msg: Message,
-    mess: Message,
-    userMess: Message,
-    task: RCUploadTask,
-):
-    blank = 0  #
-    sleeps = False  #
-    start = time.time()  # Get current time
-    while True:
-        data: str = process.stdout.readline().decode()
-        data = data.strip()
-        mat = re.findall("Transferred:.*ETA.*", data)
-        if mat is not None:
-            if len(mat) > 0:
-                sleeps = True
-                if time.time() - start > edit_time:
-                    start = time.time()
-                    await task.refresh_info(data)
-                    await task.update_message()
-
-        if data == "":
-            blank += 1
-            if blank == 20:
-                break
-        else:
-            blank = 0
-
-        if sleeps:
-            sleeps = False
-            await asyncio.sleep(2)
-            process.stdout.flush()
+async def send_drive_link(mess: Message, file_name: str, file_link: str):
+    button = [InlineKeyboardButton("Drive url", url=file_link)]
+    await mess.reply_text(
+        text=f"**UPLOADED FILE :-**\n<code>{file_name}</code>\nTo Drive.",
+        reply_markup=InlineKeyboardMarkup([button]),
+    )
 
 
-async def getGdriveLink(driveName, baseDir, entName: str, conf_path: str, isdir=True):
-    LOGGER.info("Ent - ", entName)
-    entName = re.escape(entName)
-    filter_path = os.path.join(os.getcwd(), str(time.time()).replace(".", "") + ".txt")
-    # with open(filter_path,'w',encoding="UTF-8") as file:
-    # 	file.write(f"+ {entName}\n")
-    # 	file.write(f"- *")
-    get_id_cmd = [
-        "rclone",
-        "lsjson",
-        f"--config={conf_path}",
-        f"{driveName}:{baseDir}",
-        "--files-only",
-        "-f",
-        f"+ {entName}",
-        "-f",
-        "- *",
-    ]
-    # piping only stdout
-    process = await asyncio.create_subprocess_exec(
-        *get_id_cmd, stdout=asyncio.subprocess.PIPE
-    )
+async def rclone_stream_driver(attempt, file_name: str, user_id: int):
+    """
+    Uploads a merge output to the user's drive while ffmpeg is still writing it,
+    streaming the growing file into the rclone daemon's `operations/uploadfile`.
 
-    stdout, _ = await process.communicate()
-    stdout = stdout.decode().strip()
+    returns: the Drive link. Raises on failure, so the caller can upload the finished file instead.
+    """
+    conf_path = f"./userdata/{user_id}/rclone.conf"
+    DRIVE_NAME = _drive_name(conf_path)
+    BASE_DIR = "/"
+    daemon = await rclone_daemons.get(conf_path)
+    # The final size isn't known while ffmpeg is writing, so this gets the largest tier.
+    profile = transfer_profile(conf_path, DRIVE_NAME, None)
+    await daemon.upload_stream(
+        remote_fs(DRIVE_NAME, BASE_DIR, profile),
+        "",
+        TailingMultipartBody(attempt, file_name=file_name),
+        profile["config"],
+    )
+    gid = await getGdriveLink(
+        driveName=DRIVE_NAME,
+        baseDir=BASE_DIR,
+        entName=file_name,
+        conf_path=conf_path,
+        isdir=False,
+    )
+    return f"https://drive.google.com/file/d/{gid[0]}/view"
 
-    if os.path.exists(filter_path):
-        os.remove(filter_path)
 
-    try:
-        data = json.loads(stdout)
-        id = data[0]["ID"]
-        name = data[0]["Name"]
-        return (id, name)
-    except Exception:
-        LOGGER.info(f"Error occured: {traceback.format_exc()} {stdout} ")
+async def getGdriveLink(driveName, baseDir, entName: str, conf_path: str, isdir=True):
+    """
+    Returns (ID, Name) of one object on the drive.
+
+    A single-object `operations/stat` is used instead of listing the folder,
+    so the lookup costs the same however many files the folder holds. IDs are
+    cached per remote path; Drive keeps an object's ID when it is overwritten.
+    """
+    remote = f"{driveName}:{posixpath.join(baseDir, entName)}"
+    key = (os.path.abspath(conf_path), remote)
+    if key in drive_ids:
+        drive_ids.move_to_end(key)
+        return drive_ids[key]
+
+    daemon = await rclone_daemons.get(conf_path)
+    result = await daemon.call(
+        "operations/stat",
+        fs=f"{driveName}:{baseDir}",
+        remote=entName,
+        opt={"noModTime": True, "noMimeType": True, "dirsOnly": isdir, "filesOnly": not isdir},
+    )
+    item = result.get("item")
+    if not item or not item.get("ID"):
+        raise RcloneError(f"No ID found for {remote}")
+
+    drive_ids[key] = (item["ID"], item["Name"])
+    while len(drive_ids) > DRIVE_ID_CACHE_SIZE:
+        drive_ids.popitem(last=False)
+    return drive_ids[key]
@@ -0,0 +1,184 @@
+# helpers/streaming_merge.py
+
+import asyncio
+import os
+import time
+from typing import List
+from config import Config
+from __init__ import LOGGER
+from helpers.utils import get_video_properties
+from helpers.ffmpeg_job import FFmpegJob
+from helpers.merger import merge_videos, smart_progress_editor
+from helpers.merge_planner import stream_signature, signature_key
+
+# Codecs that survive a lossless remux into MPEG-TS, which is what lets us append inputs to a running ffmpeg.
+STREAMABLE_VIDEO_CODECS = ("h264", "hevc", "mpeg2video")
+STREAMABLE_AUDIO_CODECS = ("aac", "mp3", "ac3", "eac3", None)
+
+
+class StreamingMerger:
+    """
+    Stream-copy concat that accepts inputs one at a time.
+
+    A single ffmpeg reads MPEG-TS from stdin and copies it into the output file.
+    Every input is remuxed to TS with its timestamps shifted past the previous
+    inputs and piped in as soon as it is available, so merging can overlap
+    with the downloads of later inputs. With a `live_output` the output is
+    also uploaded as it grows.
+    """
+
+    def __init__(self, output_path: str, live_output=None):
+        self.output_path = output_path
+        self.live_output = live_output
+        self.attempt = None
+        self.offset = 0.0
+        self.job = None
+
+    async def start(self):
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'mpegts', '-i', 'pipe:0',
+            '-map', '0', '-c', 'copy', *(['-live', '1'] if self.live_output else []), '-y', self.output_path
+        ]
+        if self.live_output:
+            self.attempt = self.live_output.begin(self.output_path)
+        # No stall watchdog: this process legitimately idles while the next input downloads.
+        self.job = FFmpegJob(command, stdin=True, stall_timeout=0)
+        await self.job.start()
+
+    async def feed(self, path: str, duration: float) -> bool:
+        """Remuxes `path` to TS at the current offset and pipes it into the running merge."""
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+            '-output_ts_offset', str(self.offset), '-f', 'mpegts', 'pipe:1'
+        ]
+        stdin = self.job.process.stdin
+
+        async def forward(chunk: bytes):
+            stdin.write(chunk)
+            await stdin.drain()
+
+        remux = FFmpegJob(command, on_stdout=forward)
+        try:
+            await remux.run()
+        except (BrokenPipeError, ConnectionResetError):
+            LOGGER.warning(f"Streaming merge stopped accepting input while feeding {path}")
+            return False
+
+        if not remux.ok:
+            LOGGER.warning(f"Streaming remux failed for {path}. FFmpeg stderr: {remux.stderr_tail}")
+            return False
+        self.offset += duration
+        return True
+
+    async def finish(self) -> bool:
+        self.job.process.stdin.close()
+        await self.job.wait()
+        if not self.job.ok:
+            LOGGER.error(f"Streaming merge failed. FFmpeg stderr: {self.job.stderr_tail}")
+        merged = self.job.ok and os.path.exists(self.output_path) and os.path.getsize(self.output_path) > 0
+        if self.attempt:
+            self.attempt.end(merged)
+        return merged
+
+    async def abort(self):
+        if self.attempt and self.attempt.ok is None:
+            self.attempt.end(False)
+        if self.job:
+            await self.job.kill()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+
+def _streaming_blocker(signature: dict, reference: dict | None, duration: float) -> str | None:
+    """Returns why an input with `signature` and `duration` can't join a streaming merge, or None if it can."""
+    if not duration or duration <= 0:
+        # The next input is placed at the running offset, so an unknown duration would overlap it.
+        return "input duration is unknown"
+    if signature["video_codec_name"] not in STREAMABLE_VIDEO_CODECS:
+        return f"video codec {signature['video_codec_name']} can't be streamed"
+    if signature["audio_codec_name"] not in STREAMABLE_AUDIO_CODECS:
+        return f"audio codec {signature['audio_codec_name']} can't be streamed"
+    if reference is not None and signature_key(signature) != signature_key(reference):
+        return "inputs are not copy-compatible"
+    return None
+
+
+async def merge_while_downloading(downloads: List[asyncio.Future], user_id: int, status_message, live_output=None) -> tuple:
+    """
+    Merges inputs as their downloads finish, in queue order.
+
+    Copy-compatible inputs are piped into a running ffmpeg while later inputs
+    are still downloading. As soon as an input can't be streamed, the partial
+    merge is dropped, the remaining downloads are awaited and the regular
+    planner-driven `merge_videos` takes over.
+
+    - `downloads`: Futures resolving to downloaded file paths (or None on failure), in queue order.
+    - `live_output`: Optional LiveOutput receiving every pass that writes the merged file.
+
+    returns: (merged file path or None, list of downloaded file paths)
+    """
+    user_download_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
+    output_path = os.path.join(user_download_dir, f"merged_{int(time.time())}.mkv")
+    video_files = []
+    merger = None
+    streaming = True
+    reference = None
+    joined = 0
+
+    try:
+        for download in downloads:
+            file_path = await download
+            if not file_path:
+                continue
+            video_files.append(file_path)
+            if not streaming:
+                continue
+
+            properties = await get_video_properties(file_path)
+            if not properties:
+                blocker = f"could not read metadata from {os.path.basename(file_path)}"
+            else:
+                signature = stream_signature(properties)
+                blocker = _streaming_blocker(signature, reference, properties["duration"])
+            if blocker:
+                LOGGER.info(f"Streaming merge disabled for user {user_id}: {blocker}")
+                streaming = False
+                if merger:
+                    await merger.abort()
+                continue
+
+            if merger is None:
+                reference = signature
+                merger = StreamingMerger(output_path, live_output)
+                await merger.start()
+
+            await smart_progress_editor(
+                status_message,
+                f"🔗 **Merging While Downloading...**\n"
+                f"➢ **Joining:** `{joined + 1}` of `{len(downloads)}` videos"
+            )
+            if not await merger.feed(file_path, properties["duration"]):
+                streaming = False
+                await merger.abort()
+                continue
+            joined += 1
+
+        if streaming and merger and joined >= 2:
+            if await merger.finish():
+                await status_message.edit_text("✅ **Merge Complete! (Streaming Mode)**")
+                return output_path, video_files
+            await merger.abort()
+        elif merger and streaming:
+            await merger.abort()
+    except BaseException:
+        for download in downloads:
+            download.cancel()
+        if merger:
+            await merger.abort()
+        raise
+
+    if len(video_files) < 2:
+        return None, video_files
+    return await merge_videos(video_files, user_id, status_message, live_output), video_files
@@ -0,0 +1,98 @@
+# helpers/tg_download_bench.py
+
+"""
+Compares Telegram download throughput: pyrogram's single-stream download
+against the parallel-part path used for large files.
+
+    python -m helpers.tg_download_bench <chat id> <message id> --workers 1 4 8
+
+The bot credentials from the environment (API_HASH, TELEGRAM_API, BOT_TOKEN)
+are used, so the bot must be able to read the message. Each run downloads the
+same file into a temporary folder; the outputs are checked to be byte
+identical before the throughput table is printed.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pyrogram import Client
+from config import Config
+from helpers.downloader import _download_tg_parallel, _tg_media
+from helpers.utils import get_readable_file_size
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def _no_progress(current, total):
+    pass
+
+
+async def run(chat_id: int, message_id: int, worker_counts: list, work_dir: str = None):
+    root = tempfile.mkdtemp(prefix="tg-bench-", dir=work_dir)
+    app = Client(
+        "tg-download-bench",
+        api_id=Config.TELEGRAM_API,
+        api_hash=Config.API_HASH,
+        bot_token=Config.BOT_TOKEN,
+        in_memory=True,
+        no_updates=True,
+        max_concurrent_transmissions=max(worker_counts),
+    )
+    results = []
+    try:
+        await app.start()
+        message = await app.get_messages(chat_id, message_id)
+        total_size = getattr(_tg_media(message), "file_size", 0) or 0
+        if not total_size:
+            raise SystemExit("That message has no downloadable media")
+
+        started = time.monotonic()
+        single_path = await message.download(file_name=os.path.join(root, "single", "file"))
+        results.append(("single stream", time.monotonic() - started, single_path))
+
+        for workers in worker_counts:
+            Config.TG_DOWNLOAD_WORKERS = workers
+            path = os.path.join(root, f"parallel_{workers}", "file")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.monotonic()
+            await _download_tg_parallel(message, path, total_size, _no_progress)
+            results.append((f"{workers} parts", time.monotonic() - started, path))
+
+        reference = _sha256(single_path)
+        print(f"File: {get_readable_file_size(total_size)}")
+        print(f"{'mode':<14} {'time':>8}  {'throughput':>12}  identical")
+        for label, elapsed, path in results:
+            print(
+                f"{label:<14} {elapsed:>7.2f}s  {get_readable_file_size(total_size / elapsed):>10}/s"
+                f"  {'yes' if _sha256(path) == reference else 'NO'}"
+            )
+    finally:
+        if app.is_connected:
+            await app.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-stream and parallel-part Telegram downloads.")
+    parser.add_argument("chat_id", type=int)
+    parser.add_argument("message_id", type=int)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8], help="Part counts to try")
+    parser.add_argument("--dir", default=None, help="Where to put the downloads (default: system temp dir)")
+    args = parser.parse_args()
+    asyncio.run(run(args.chat_id, args.message_id, args.workers, args.dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# helpers/thumbnail.py
+
+import asyncio
+import os
+from collections import OrderedDict
+from PIL import Image
+from __init__ import LOGGER
+from helpers.ffmpeg_job import FFmpegJob
+from helpers.utils import get_video_properties
+
+# Telegram's limits for a video thumbnail: JPEG, at most 320px per side and 200KB.
+THUMB_MAX_SIDE = 320
+THUMB_MAX_BYTES = 200 * 1024
+# Source thumbs smaller than this look blurry once Telegram scales them up.
+THUMB_MIN_SIDE = 240
+
+# Recently made thumbnails, so every job makes exactly one; bounded since every merged file adds one.
+THUMB_CACHE_SIZE = 64
+
+# output file -> (output mtime, thumbnail path), least recently used first.
+_thumbnails = OrderedDict()
+
+
+def forget_thumbnails(root: str):
+    """Drops the cached thumbnails of every output file under `root`, e.g. before it is deleted."""
+    prefix = os.path.join(os.path.abspath(root), "")
+    for key in [k for k in _thumbnails if k.startswith(prefix)]:
+        del _thumbnails[key]
+
+
+def _fit_thumbnail(source: str, dest: str) -> str:
+    """Converts `source` to a JPEG within Telegram's thumbnail limits."""
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        image.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+        for quality in (90, 80, 70, 60, 50):
+            image.save(dest, "JPEG", quality=quality, optimize=True)
+            if os.path.getsize(dest) <= THUMB_MAX_BYTES:
+                break
+    return dest
+
+
+async def _grab_frame(video_path: str, dest: str) -> str | None:
+    """Grabs the frame nearest the middle of the video."""
+    metadata = await get_video_properties(video_path)
+    position = metadata["duration"] / 2 if metadata and metadata.get("duration") else 0
+    # -ss before -i seeks the input to the nearest keyframe instead of decoding up to `position`.
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-ss", f"{position:.3f}", "-i", video_path,
+        "-frames:v", "1", "-q:v", "2", "-y", dest,
+    ]
+    job = FFmpegJob(command, timeout=60)
+    await job.run()
+    if not job.ok or not os.path.exists(dest):
+        LOGGER.warning(f"Could not grab a thumbnail frame from {video_path}: {job.stderr_tail}")
+        return None
+    return dest
+
+
+async def _telegram_thumb(messages, dest: str) -> str | None:
+    """Downloads the best Telegram-provided thumb of the source media, if one is big enough."""
+    for message in messages or []:
+        media = message.video or message.document
+        thumbs = [thumb for thumb in (getattr(media, "thumbs", None) or []) if thumb.width and thumb.height]
+        if not thumbs:
+            continue
+        best = max(thumbs, key=lambda thumb: thumb.width * thumb.height)
+        if max(best.width, best.height) < THUMB_MIN_SIDE:
+            continue
+        try:
+            return await message._client.download_media(best.file_id, file_name=dest)
+        except Exception as e:
+            LOGGER.info(f"Could not download Telegram thumb of message {message.id}: {e}")
+    return None
+
+
+async def get_thumbnail(video_path: str, source_messages=None, custom_thumbnail: str = None) -> str | None:
+    """
+    Returns a Telegram-ready thumbnail for `video_path`, made at most once per output file.
+
+    In order of preference: the user's `custom_thumbnail`, a good enough
+    Telegram thumb of the first `source_messages`, or a keyframe from the
+    middle of the video. The image is resized off the event loop and saved
+    next to the video, so workspace cleanup removes it.
+    """
+    key = os.path.abspath(video_path)
+    mtime = os.path.getmtime(video_path)
+    cached = _thumbnails.pop(key, None)
+    if cached and cached[0] == mtime and os.path.exists(cached[1]):
+        _thumbnails[key] = cached
+        return cached[1]
+
+    base = os.path.splitext(video_path)[0]
+    raw_path = f"{base}.thumb_src.jpg"
+    thumb_path = f"{base}.thumb.jpg"
+    source = None
+    if custom_thumbnail and os.path.exists(custom_thumbnail):
+        source = custom_thumbnail
+    if source is None:
+        source = await _telegram_thumb(source_messages, raw_path)
+    if source is None:
+        source = await _grab_frame(video_path, raw_path)
+    if source is None:
+        return None
+
+    try:
+        await asyncio.to_thread(_fit_thumbnail, source, thumb_path)
+    except Exception as e:
+        LOGGER.warning(f"Could not prepare thumbnail for {video_path}: {e}")
+        return None
+    finally:
+        if source == raw_path and os.path.exists(raw_path):
+            os.remove(raw_path)
+
+    _thumbnails[key] = (mtime, thumb_path)
+    while len(_thumbnails) > THUMB_CACHE_SIZE:
+        _thumbnails.popitem(last=False)
+    return thumb_path
@@ -3,13 +3,18 @@
 import os
 import time
 import asyncio
-from aiohttp import ClientSession, FormData
-from random import choice
+import uuid
+from aiohttp import ClientTimeout
 from config import Config
+from __init__ import LOGGER
 from helpers.utils import get_readable_file_size, get_progress_bar, get_video_properties
+from helpers.http_client import http_client
+from helpers.thumbnail import get_thumbnail
 
 last_edit_time = {}
 EDIT_THROTTLE_SECONDS = 4.0
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_READ_AHEAD = 4
 
 async def smart_progress_editor(status_message, text: str):
     if not status_message or not hasattr(status_message, 'chat'): 
@@ -26,78 +31,227 @@ async def smart_progress_editor(status_message, text: str):
         except Exception:
             pass
 
-async def create_default_thumbnail(video_path: str) -> str | None:
-    thumbnail_path = f"{os.path.splitext(video_path)[0]}.jpg"
-    metadata = await get_video_properties(video_path)
+class MultipartFileBody:
+    """
+    multipart/form-data body for one file upload, streamed in constant memory.
 
-    if not metadata or not metadata.get("duration"):
-        print(f"Could not get duration for '{video_path}'. Skipping default thumbnail.")
-        return None
+    The file is read in `UPLOAD_CHUNK_SIZE` chunks by a background reader
+    that stays at most `UPLOAD_READ_AHEAD` chunks ahead of the socket, and the
+    exact Content-Length is known up front so no chunked encoding is needed.
+    `on_progress(sent, total)` is awaited as file bytes are handed to the connection.
+    """
+
+    def __init__(self, file_path: str, fields: dict = None, on_progress=None, file_name: str = None):
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.on_progress = on_progress
+        self._build_parts(fields, file_name)
+
+    def _build_parts(self, fields: dict = None, file_name: str = None):
+        self.boundary = uuid.uuid4().hex
+        file_name = (file_name or os.path.basename(self.file_path)).replace('"', "%22")
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in (fields or {}).items()
+        )
+        head += (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def content_length(self) -> int:
+        return len(self.head) + self.file_size + len(self.tail)
+
+    async def _read_ahead(self, chunks: asyncio.Queue):
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE)
+                await chunks.put(chunk)
+                if not chunk:
+                    return
 
-    thumbnail_time = metadata["duration"] / 2
+    async def stream(self):
+        chunks = asyncio.Queue(maxsize=UPLOAD_READ_AHEAD)
+        reader = asyncio.ensure_future(self._read_ahead(chunks))
+        try:
+            yield self.head
+            sent = 0
+            while True:
+                chunk = await chunks.get()
+                if not chunk:
+                    break
+                yield chunk
+                sent += len(chunk)
+                if self.on_progress:
+                    await self.on_progress(sent, self.file_size)
+            if sent != self.file_size:
+                raise Exception(f"{self.file_path} changed size during upload")
+            yield self.tail
+            await reader
+        finally:
+            reader.cancel()
+
+class TailingMultipartBody(MultipartFileBody):
+    """
+    multipart/form-data body for a file ffmpeg is still writing.
 
-    command = [
-        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', video_path,
-        '-ss', str(thumbnail_time), '-vframes', '1',
-        '-c:v', 'mjpeg', '-f', 'image2', '-y', thumbnail_path
-    ]
+    The bytes come from an OutputAttempt as they land on disk. The final size
+    is unknown, so the body goes out with chunked transfer encoding, and the
+    stream raises if the ffmpeg pass fails, which aborts the request.
+    """
 
-    process = await asyncio.create_subprocess_exec(*command, stderr=asyncio.subprocess.PIPE)
-    _, stderr = await process.communicate()
+    def __init__(self, attempt, fields: dict = None, on_progress=None, file_name: str = None):
+        self.attempt = attempt
+        self.file_path = attempt.path
+        self.file_size = None
+        self.on_progress = on_progress
+        self._build_parts(fields, file_name)
 
-    if process.returncode != 0:
-        print(f"Error creating default thumbnail for '{video_path}': {stderr.decode().strip()}")
+    @property
+    def content_length(self) -> None:
         return None
 
-    return thumbnail_path if os.path.exists(thumbnail_path) else None
+    async def stream(self):
+        yield self.head
+        sent = 0
+        async for chunk in self.attempt.chunks(UPLOAD_CHUNK_SIZE):
+            yield chunk
+            sent += len(chunk)
+            if self.on_progress:
+                await self.on_progress(sent, None)
+        yield self.tail
+
+class GofileServerPool:
+    """
+    GoFile upload servers, ranked by measured latency.
+
+    The `/servers` list is cached for `GOFILE_SERVER_TTL` seconds. On refresh
+    every server is probed once and the ranking is kept in memory. A server
+    that fails an upload is marked down for `SERVER_DOWN_SECONDS`, so retries
+    and later uploads go elsewhere.
+    """
+
+    SERVER_DOWN_SECONDS = 300
+    PROBE_TIMEOUT = 5
+
+    def __init__(self, api_url: str = "https://api.gofile.io/"):
+        self.api_url = api_url
+        self.latency = {}
+        self._fetched_at = 0
+        self._down_until = {}
+        self._lock = asyncio.Lock()
+
+    async def _probe(self, server: str) -> float:
+        started = time.monotonic()
+        try:
+            async with http_client.session.head(
+                f"https://{server}.gofile.io/", timeout=ClientTimeout(total=self.PROBE_TIMEOUT)
+            ):
+                return time.monotonic() - started
+        except Exception:
+            return float("inf")
+
+    async def _refresh(self):
+        async with http_client.session.get(f"{self.api_url}servers") as resp:
+            resp.raise_for_status()
+            result = await resp.json()
+        if result.get("status") != "ok" or not result["data"]["servers"]:
+            raise Exception("Failed to fetch GoFile upload server.")
+        servers = [server["name"] for server in result["data"]["servers"]]
+        timings = await asyncio.gather(*[self._probe(server) for server in servers])
+        self.latency = dict(zip(servers, timings))
+        self._fetched_at = time.monotonic()
+        LOGGER.info("GoFile servers by latency: " + ", ".join(
+            f"{server} {timing * 1000:.0f}ms" for server, timing in sorted(self.latency.items(), key=lambda item: item[1])
+        ))
+
+    async def best(self, exclude=()) -> str:
+        """The fastest server that is not marked down or in `exclude`."""
+        async with self._lock:
+            if not self.latency or time.monotonic() - self._fetched_at > Config.GOFILE_SERVER_TTL:
+                await self._refresh()
+        now = time.monotonic()
+        candidates = [server for server in self.latency if server not in exclude]
+        healthy = [server for server in candidates if self._down_until.get(server, 0) <= now]
+        if not candidates:
+            raise Exception("No GoFile upload server left to try.")
+        return min(healthy or candidates, key=lambda server: self.latency[server])
+
+    def mark_down(self, server: str):
+        LOGGER.warning(f"GoFile server {server} marked down for {self.SERVER_DOWN_SECONDS}s")
+        self._down_until[server] = time.monotonic() + self.SERVER_DOWN_SECONDS
+
+
+gofile_servers = GofileServerPool()
 
 class GofileUploader:
     def __init__(self, token=None):
         self.api_url = "https://api.gofile.io/"
         self.token = token or Config.GOFILE_TOKEN
 
-    async def __get_server(self):
-        async with ClientSession() as session:
-            async with session.get(f"{self.api_url}servers") as resp:
-                resp.raise_for_status()
-                result = await resp.json()
-                if result.get("status") == "ok": 
-                    return choice(result["data"]["servers"])["name"]
-                raise Exception("Failed to fetch GoFile upload server.")
+    async def __get_server(self, exclude=()):
+        return await gofile_servers.best(exclude)
 
-    async def upload_file(self, file_path: str):
+    async def upload_file(self, file_path: str, on_progress=None):
         if not os.path.isfile(file_path): 
             raise FileNotFoundError(f"File not found: {file_path}")
-        
+
+        tried = []
+        for attempt in range(Config.GOFILE_UPLOAD_RETRIES + 1):
+            server = await self.__get_server(exclude=tried)
+            tried.append(server)
+            try:
+                return await self.__upload_to(server, MultipartFileBody(file_path, self.__fields(), on_progress))
+            except Exception as e:
+                LOGGER.warning(f"GoFile upload to {server} failed (attempt {attempt + 1}): {e}")
+                gofile_servers.mark_down(server)
+                if attempt == Config.GOFILE_UPLOAD_RETRIES:
+                    raise
+
+    async def upload_growing_file(self, attempt, on_progress=None):
+        """
+        Uploads a merge output while ffmpeg writes it. The body can't be
+        replayed, so there is a single try on the fastest server; the caller
+        falls back to `upload_file` once the merge is done.
+        """
         server = await self.__get_server()
+        try:
+            return await self.__upload_to(server, TailingMultipartBody(attempt, self.__fields(), on_progress))
+        except Exception:
+            if await attempt.wait():
+                gofile_servers.mark_down(server)
+            raise
+
+    def __fields(self) -> dict:
+        return {"token": self.token} if self.token else {}
+
+    async def __upload_to(self, server: str, body: MultipartFileBody):
         upload_url = f"https://{server}.gofile.io/uploadFile"
-        
-        data = FormData()
-        if self.token: 
-            data.add_field("token", self.token)
-        
-        with open(file_path, "rb") as f:
-            data.add_field("file", f, filename=os.path.basename(file_path))
-
-        async with ClientSession() as session:
-            async with session.post(upload_url, data=data) as resp:
-                resp.raise_for_status()
-                resp_json = await resp.json()
-                if resp_json.get("status") == "ok": 
-                    return resp_json["data"]["downloadPage"]
-                else: 
-                    raise Exception(f"GoFile upload failed: {resp_json.get('status')}")
 
-async def upload_to_telegram(client, chat_id: int, file_path: str, status_message, custom_thumbnail: str | None, custom_filename: str):
-    is_default_thumb_created = False
-    thumb_to_upload = custom_thumbnail
+        headers = {"Content-Type": body.content_type}
+        if body.content_length is not None:
+            headers["Content-Length"] = str(body.content_length)
 
+        async with http_client.session.post(upload_url, data=body.stream(), headers=headers, timeout=ClientTimeout(total=None)) as resp:
+            resp.raise_for_status()
+            resp_json = await resp.json()
+            if resp_json.get("status") == "ok": 
+                return resp_json["data"]["downloadPage"]
+            else: 
+                raise Exception(f"GoFile upload failed: {resp_json.get('status')}")
+
+async def upload_to_telegram(client, chat_id: int, file_path: str, status_message, custom_thumbnail: str | None, custom_filename: str):
     try:
-        if not thumb_to_upload:
-            await smart_progress_editor(status_message, "Analyzing video to create default thumbnail...")
-            thumb_to_upload = await create_default_thumbnail(file_path)
-            if thumb_to_upload:
-                is_default_thumb_created = True
+        await smart_progress_editor(status_message, "Preparing thumbnail...")
+        thumb_to_upload = await get_thumbnail(file_path, custom_thumbnail=custom_thumbnail)
 
         metadata = await get_video_properties(file_path)
         duration = metadata.get('duration', 0) if metadata else 0
@@ -124,34 +278,65 @@ async def upload_to_telegram(client, chat_id: int, file_path: str, status_messag
         await status_message.edit_text(f"❌ **Upload Failed!**\nError: `{e}`")
         return False
 
-    finally:
-        if is_default_thumb_created and thumb_to_upload and os.path.exists(thumb_to_upload):
-            os.remove(thumb_to_upload)
+async def upload_document_to_telegram(client, chat_id: int, file_path: str, status_message, index: int = 1, total: int = 1) -> bool:
+    """Sends `file_path` as a document, for extracted audio and subtitle streams. `status_message` is left in place."""
+    try:
+        file_name = os.path.basename(file_path)
+        caption = f"**File:** `{file_name}`\n**Size:** `{get_readable_file_size(os.path.getsize(file_path))}`"
+
+        async def progress(current, total_bytes):
+            progress_percent = current / total_bytes if total_bytes else 1
+            progress_text = (
+                f"📤 **Uploading {index} of {total} to Telegram...**\n"
+                f"➢ `{file_name}`\n"
+                f"➢ {get_progress_bar(progress_percent)} `{progress_percent:.1%}`"
+            )
+            await smart_progress_editor(status_message, progress_text)
+
+        await client.send_document(chat_id=chat_id, document=file_path, caption=caption, file_name=file_name, progress=progress)
+        return True
+
+    except Exception as e:
+        LOGGER.error(f"Upload of {file_path} failed: {e}")
+        await status_message.edit_text(f"❌ **Upload Failed!**\nError: `{e}`")
+        return False
 
 async def upload_to_gofile(file_path: str, status_message, custom_filename: str = None):
     """Upload file to GoFile.io and return download link"""
     try:
         await smart_progress_editor(status_message, "🌐 **Uploading to GoFile.io...**")
-        
+
+        async def progress(current, total):
+            progress_percent = current / total if total else 1
+            progress_text = (
+                f"🌐 **Uploading to GoFile.io...**\n"
+                f"➢ {get_progress_bar(progress_percent)} `{progress_percent:.1%}`\n"
+                f"➢ **Size:** `{get_readable_file_size(current)}` / `{get_readable_file_size(total)}`"
+            )
+            await smart_progress_editor(status_message, progress_text)
+
         uploader = GofileUploader()
-        download_link = await uploader.upload_file(file_path)
-        
-        file_size = get_readable_file_size(os.path.getsize(file_path))
-        filename = custom_filename or os.path.basename(file_path)
-        
-        success_text = (
-            f"✅ **Upload to GoFile Complete!**\n\n"
-            f"📁 **File:** `{filename}`\n"
-            f"📊 **Size:** `{file_size}`\n"
-            f"🔗 **Download:** {download_link}"
-        )
-        
-        await status_message.edit_text(success_text)
+        download_link = await uploader.upload_file(file_path, on_progress=progress)
+        await status_message.edit_text(gofile_complete_text(file_path, custom_filename, download_link))
         return download_link
         
     except Exception as e:
         await status_message.edit_text(f"❌ **GoFile Upload Failed!**\nError: `{e}`")
         return None
 
+def gofile_complete_text(file_path: str, custom_filename: str, download_link: str) -> str:
+    file_size = get_readable_file_size(os.path.getsize(file_path))
+    filename = custom_filename or os.path.basename(file_path)
+    return (
+        f"✅ **Upload to GoFile Complete!**\n\n"
+        f"📁 **File:** `{filename}`\n"
+        f"📊 **Size:** `{file_size}`\n"
+        f"🔗 **Download:** {download_link}"
+    )
+
+async def upload_growing_to_gofile(attempt) -> str:
+    """Uploads a merge output to GoFile while it is written. Raises on failure; the caller reports the result."""
+    return await GofileUploader().upload_growing_file(attempt)
+
 # Backward‐compatibility alias for mergeVideo plugin
 uploadVideo = upload_to_telegram
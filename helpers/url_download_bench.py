@@ -0,0 +1,82 @@
+# helpers/url_download_bench.py
+
+"""
+Compares URL download throughput: a single stream against parallel byte-range
+segments, the way `_download_url_file` fetches direct links.
+
+    python -m helpers.url_download_bench <url> --segments 1 4 8
+
+Each run downloads the same URL into a temporary folder, bypassing the media
+cache and any partial download left from an earlier run; the outputs are
+checked to be byte identical before the throughput table is printed. The
+server must support byte ranges for segment counts above 1 to take effect.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from config import Config
+from helpers import downloader
+from helpers.http_client import http_client
+from helpers.media_cache import media_cache
+from helpers.utils import get_readable_file_size
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def _no_progress(current, total, mode):
+    pass
+
+
+async def run(url: str, segment_counts: list, work_dir: str = None):
+    root = tempfile.mkdtemp(prefix="url-bench-", dir=work_dir)
+    # A cache hit would make every run after the first one free.
+    media_cache.quota = 0
+    Config.DOWNLOAD_SEGMENTS_PER_HOST = {}
+    results = []
+    try:
+        for segments in segment_counts:
+            Config.DOWNLOAD_SEGMENTS = segments
+            Config.DOWNLOAD_DIR = os.path.join(root, f"segments_{segments}")
+            Config.PARTIAL_DOWNLOAD_DIR = os.path.join(root, f"partials_{segments}")
+            started = time.monotonic()
+            path = await downloader._download_url_file(url, 0, _no_progress)
+            results.append((segments, time.monotonic() - started, path))
+
+        total_size = os.path.getsize(results[0][2])
+        reference = _sha256(results[0][2])
+        print(f"File: {get_readable_file_size(total_size)}")
+        print(f"{'segments':<10} {'time':>8}  {'throughput':>12}  identical")
+        for segments, elapsed, path in results:
+            print(
+                f"{segments:<10} {elapsed:>7.2f}s  {get_readable_file_size(total_size / elapsed):>10}/s"
+                f"  {'yes' if _sha256(path) == reference else 'NO'}"
+            )
+    finally:
+        await http_client.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-stream and segmented URL downloads.")
+    parser.add_argument("url")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 4, 8], help="Segment counts to try")
+    parser.add_argument("--dir", default=None, help="Where to put the downloads (default: system temp dir)")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.segments, args.dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
-import ffmpeg
 from typing import Union
+from helpers.probe import probe
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
 
@@ -58,20 +58,31 @@ class UserSettings:
         # save to database
         pass
 
+def video_properties_from_probe(data: dict) -> dict:
+    video = next(s for s in data["streams"] if s["codec_type"] == "video")
+    return {
+        "duration": float(data["format"].get("duration", 0)),
+        "width": int(video.get("width", 0)),
+        "height": int(video.get("height", 0)),
+        "streams": data["streams"],
+        "format": data["format"],
+    }
+
 async def get_video_properties(path: str) -> Union[dict, None]:
     try:
-        probe = ffmpeg.probe(path)
-        video = next(s for s in probe["streams"] if s["codec_type"] == "video")
-        return {
-            "duration": float(probe["format"].get("duration", 0)),
-            "width": int(video.get("width", 0)),
-            "height": int(video.get("height", 0)),
-            "streams": probe["streams"],
-            "format": probe["format"],
-        }
-    except:
+        return video_properties_from_probe(await probe(path))
+    except Exception:
         return None
 
+def get_path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
 def is_url_safe(url: str, domains: list) -> bool:
     from urllib.parse import urlparse
     netloc = urlparse(url).netloc.lower()
@@ -17,8 +17,10 @@ from bot import (
     urlDB,
 )
 from helpers import database
-from helpers.utils import UserSettings
-from plugins.mergeVideo import mergeNow
+from helpers.utils import UserSettings, get_readable_file_size
+from helpers.preflight import queue_mismatches, format_preflight
+from helpers.rclone_upload import cancel_rclone_uploads
+from plugins.mergeVideo import mergeNow, mergeUrls
 from plugins.mergeVideoAudio import mergeAudio
 from plugins.mergeVideoSub import mergeSub
 from plugins.streams_extractor import streamsExtractor
@@ -30,7 +32,7 @@ async def callback_handler(c: Client, cb: CallbackQuery):
     data = cb.data
     uid = cb.from_user.id
 
-    if data == "merge":
+    if data in ("merge", "download_urls"):
         await cb.message.edit(
             "Where do you want to upload?",
             reply_markup=InlineKeyboardMarkup([
@@ -160,7 +162,10 @@ async def callback_handler(c: Client, cb: CallbackQuery):
             new_name = f"downloads/{uid}/[@yashoswalyo]_merged.mkv"
 
         mode = user.merge_mode
-        if mode == 1:
+        url_queue = urlDB.get(uid, {}).get("urls")
+        if mode == 5 or (url_queue and not queueDB.get(uid, {}).get("videos")):
+            await mergeUrls(c, cb, new_name)
+        elif mode == 1:
             await mergeNow(c, cb, new_name)
         elif mode == 2:
             await mergeAudio(c, cb, new_name)
@@ -168,9 +173,42 @@ async def callback_handler(c: Client, cb: CallbackQuery):
             await mergeSub(c, cb, new_name)
         return
 
+    elif data == "show_url_queue":
+        urls = urlDB.get(uid, {}).get("urls", [])
+        if not urls:
+            await cb.answer("URL queue is empty", show_alert=True)
+            return
+        preflight = urlDB[uid].get("preflight", {})
+        mismatched = queue_mismatches([preflight[url] for url in urls if url in preflight])
+        lines = [
+            f"{i}. " + (format_preflight(preflight[url], url in mismatched) if url in preflight else f"`{url}`")
+            for i, url in enumerate(urls, start=1)
+        ]
+        known = [preflight[url] for url in urls if url in preflight]
+        lines.append(
+            f"\n**Total:** `{get_readable_file_size(sum(r['size'] for r in known))}`"
+            + (f"\n⚠️ {len(mismatched)} file(s) differ from the rest and will be re-encoded." if mismatched else "")
+        )
+        await cb.message.edit(
+            f"📋 **URL Queue ({len(urls)}):**\n\n" + "\n".join(lines),
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📥 Download & Merge", callback_data="download_urls")],
+                [InlineKeyboardButton("🗑️ Clear Queue", callback_data="clear_url_queue")],
+            ]),
+            disable_web_page_preview=True,
+        )
+        return
+
+    elif data == "clear_url_queue":
+        urlDB[uid] = {"urls": [], "downloaded_files": []}
+        await cb.message.edit("🗑️ **URL queue cleared!**")
+        return
+
     elif data == "cancel":
+        await cancel_rclone_uploads(uid)
         await delete_all(f"downloads/{uid}/")
         queueDB[uid] = {"videos": [], "subtitles": [], "audios": []}
+        urlDB[uid] = {"urls": [], "downloaded_files": []}
         formatDB[uid] = None
         await cb.message.edit("✅ Successfully Cancelled")
         await asyncio.sleep(2)
@@ -292,7 +330,9 @@ async def callback_handler(c: Client, cb: CallbackQuery):
     elif data.startswith("extract_"):
         parts = data.split("_")
         action, mid = parts[1], int(parts[2])
-        await streamsExtractor(c, cb, mid, exAudios=(action=="audio"), exSubs=(action=="subtitle"))
+        await streamsExtractor(
+            c, cb, mid, exAudios=(action=="audio"), exSubs=(action=="subtitle"), exAll=(action=="all")
+        )
         return
 
     else:
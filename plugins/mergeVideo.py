@@ -7,16 +7,19 @@ from pyrogram import Client
 from pyrogram.types import CallbackQuery
 
 # Original imports
-from __init__ import LOGGER, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, queueDB, formatDB
+from __init__ import LOGGER, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, queueDB, formatDB, urlDB
 
 # Enhanced imports - using your functions
 from config import Config
 from helpers.utils import UserSettings
-from helpers.merger import merge_videos  # YOUR merger
-from helpers.uploader import uploadVideo, upload_to_gofile  # Enhanced uploader
-from helpers.downloader import download_from_tg  # YOUR downloader
-from helpers.ffmpeg_helper import take_screen_shot
-from helpers.rclone_upload import rclone_driver
+from helpers.streaming_merge import merge_while_downloading
+from helpers.merger import add_seek_index
+from helpers.uploader import uploadVideo, upload_to_gofile, upload_growing_to_gofile, gofile_complete_text  # Enhanced uploader
+from helpers.downloader import start_tg_downloads, start_url_downloads
+from helpers.admission import disk_admission, estimate_merge_footprint, InsufficientDiskSpace
+from helpers.thumbnail import get_thumbnail
+from helpers.rclone_upload import rclone_driver, rclone_stream_driver, send_drive_link
+from helpers.live_output import LiveOutput
 from bot import delete_all
 
 # NEW: Import your upload flag
@@ -25,129 +28,145 @@ from __init__ import UPLOAD_TO_GOFILE
 async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
     """Enhanced merge function using your merger and uploader"""
     user_id = cb.from_user.id
-    
+
+    # Initial status
+    await cb.message.edit_text("🚀 **Starting Enhanced Merge Process...**")
+
+    # Get video files from queue
+    video_messages = []
+    if queueDB.get(user_id, None) and queueDB[user_id]["videos"]:
+        try:
+            video_messages = await c.get_messages(
+                chat_id=cb.message.chat.id, 
+                message_ids=queueDB[user_id]["videos"]
+            )
+        except Exception as e:
+            LOGGER.error(f"Error getting messages: {e}")
+            await cb.message.edit_text("❌ **Error getting video files!**")
+            return
+
+    if not video_messages or len(video_messages) < 2:
+        await cb.message.edit_text("❌ **Need at least 2 videos to merge!**")
+        return
+
+    # Download files and merge them as they land, once there is disk space for the whole job
+    video_messages = [msg for msg in video_messages if msg.video or msg.document]
+    estimate = estimate_merge_footprint([(msg.video or msg.document).file_size for msg in video_messages])
+    try:
+        async with disk_admission.reserve(os.path.join(Config.DOWNLOAD_DIR, str(user_id)), estimate, cb.message):
+            downloads = start_tg_downloads(video_messages, user_id, cb.message)
+            await _mergeAndUpload(c, cb, new_file_name, downloads, video_messages)
+    except InsufficientDiskSpace as e:
+        await cb.message.edit_text(f"❌ **Not enough disk space for this merge!**\n{e}")
+
+async def mergeUrls(c: Client, cb: CallbackQuery, new_file_name: str):
+    """Downloads the user's URL queue concurrently, then merges and uploads like `mergeNow`"""
+    user_id = cb.from_user.id
+    urls = urlDB.get(user_id, {}).get("urls", [])
+
+    if len(urls) < 2:
+        await cb.message.edit_text("❌ **Need at least 2 URLs to merge!**")
+        return
+
+    await cb.message.edit_text("🚀 **Starting URL Merge Process...**")
+    preflight = urlDB[user_id].get("preflight", {})
+    estimate = estimate_merge_footprint([preflight[url]["size"] for url in urls if url in preflight])
+    try:
+        async with disk_admission.reserve(os.path.join(Config.DOWNLOAD_DIR, str(user_id)), estimate, cb.message):
+            downloads = start_url_downloads(urls, user_id, cb.message)
+            await _mergeAndUpload(c, cb, new_file_name, downloads)
+    except InsufficientDiskSpace as e:
+        await cb.message.edit_text(f"❌ **Not enough disk space for this merge!**\n{e}")
+
+async def _mergeAndUpload(c: Client, cb: CallbackQuery, new_file_name: str, downloads: list, source_messages: list = None):
+    """Merges downloads as they finish, uploads the result and cleans up the user's queue"""
+    user_id = cb.from_user.id
+    video_files = []
+    merged_file = None
+    video_thumbnail = None
+    live_upload = None
+
     try:
-        # Initial status
-        await cb.message.edit_text("🚀 **Starting Enhanced Merge Process...**")
-        
         # Get user settings
         user = UserSettings(user_id, cb.from_user.first_name)
-        
-        # Get video files from queue
-        video_messages = []
-        if queueDB.get(user_id, None) and queueDB[user_id]["videos"]:
-            try:
-                video_messages = await c.get_messages(
-                    chat_id=cb.message.chat.id, 
-                    message_ids=queueDB[user_id]["videos"]
-                )
-            except Exception as e:
-                LOGGER.error(f"Error getting messages: {e}")
-                await cb.message.edit_text("❌ **Error getting video files!**")
-                return
-        
-        if not video_messages or len(video_messages) < 2:
-            await cb.message.edit_text("❌ **Need at least 2 videos to merge!**")
-            return
-        
-        # Download files using YOUR enhanced downloader
-        video_files = []
         status_msg = cb.message
-        
-        for i, msg in enumerate(video_messages):
-            if hasattr(msg, 'video') or hasattr(msg, 'document'):
-                try:
-                    await status_msg.edit_text(f"📥 **Downloading file {i+1}/{len(video_messages)}...**")
-                    # Using YOUR download function
-                    file_path = await download_from_tg(msg, user_id, status_msg)
-                    if file_path:
-                        video_files.append(file_path)
-                        LOGGER.info(f"Downloaded: {file_path}")
-                except Exception as e:
-                    LOGGER.error(f"Download failed for message {msg.id}: {e}")
-                    continue
-        
+
+        # GoFile and Drive uploads consume the merged file while ffmpeg is still writing it
+        live_output = None
+        if Config.UPLOAD_WHILE_MERGING:
+            if UPLOAD_TO_GOFILE.get(f"{user_id}", False):
+                live_output = LiveOutput()
+                live_upload = asyncio.ensure_future(live_output.follow(upload_growing_to_gofile))
+            elif UPLOAD_TO_DRIVE.get(f"{user_id}", False):
+                live_output = LiveOutput()
+                live_upload = asyncio.ensure_future(
+                    live_output.follow(lambda attempt: rclone_stream_driver(attempt, os.path.basename(new_file_name), user_id))
+                )
+
+        LOGGER.info(f"Starting merge for user {user_id} with {len(downloads)} files")
+        try:
+            merged_file, video_files = await merge_while_downloading(downloads, user_id, status_msg, live_output)
+        finally:
+            if live_output:
+                live_output.close()
+
         if len(video_files) < 2:
             await status_msg.edit_text("❌ **Failed to download enough files for merging!**")
             return
         
-        # Use YOUR enhanced merger
-        LOGGER.info(f"Starting merge for user {user_id} with {len(video_files)} files")
-        merged_file = await merge_videos(video_files, user_id, status_msg)
-        
         if not merged_file:
             await status_msg.edit_text("❌ **Merge failed!** Check logs for details.")
             return
         
         # Get file properties for upload
-        file_size = os.path.getsize(merged_file)
         custom_filename = os.path.splitext(os.path.basename(new_file_name))[0]
         
-        # Create thumbnail (original logic)
-        video_thumbnail = None
-        try:
-            if user.thumbnail:
-                video_thumbnail = f"downloads/{user_id}_thumb.jpg"
-                if not os.path.exists(video_thumbnail):
-                    video_thumbnail = None
-            
-            if not video_thumbnail:
-                await status_msg.edit_text("📸 **Creating thumbnail...**")
-                video_thumbnail = await take_screen_shot(merged_file, f"downloads/{user_id}/", 10)
-        except Exception as e:
-            LOGGER.error(f"Thumbnail creation failed: {e}")
-            video_thumbnail = None
-        
-        # Get video metadata for upload (original logic)
-        width = height = duration = 0
-        try:
-            import ffmpeg
-            probe = ffmpeg.probe(merged_file)
-            video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-            if video_stream:
-                width = int(video_stream.get('width', 0))
-                height = int(video_stream.get('height', 0))
-                duration = float(probe['format'].get('duration', 0))
-        except:
-            pass
-        
         # ENHANCED: Determine upload destination and upload
+        live_link = await _finishLiveUpload(live_upload, status_msg)
+        if live_upload and not live_link:
+            # The file on disk was written for streaming; restore its index before uploading it normally.
+            await add_seek_index(merged_file)
         if UPLOAD_TO_GOFILE.get(f"{user_id}", False):
-            # Use YOUR GoFile upload function
-            await upload_to_gofile(merged_file, status_msg, custom_filename)
+            if live_link:
+                await status_msg.edit_text(gofile_complete_text(merged_file, custom_filename, live_link))
+            else:
+                # Use YOUR GoFile upload function
+                await upload_to_gofile(merged_file, status_msg, custom_filename)
             
         elif UPLOAD_TO_DRIVE.get(f"{user_id}", False):
-            # Original Drive upload using rclone
-            await status_msg.edit_text("☁️ **Uploading to Google Drive...**")
-            try:
-                await rclone_driver(merged_file, new_file_name, user_id, c, cb.message)
-            except Exception as e:
-                LOGGER.error(f"Drive upload failed: {e}")
-                await status_msg.edit_text(f"❌ **Drive upload failed!**\nError: `{str(e)}`")
+            if live_link:
+                await status_msg.edit_text("✅ **Upload to Google Drive Complete!**")
+                await send_drive_link(cb.message, os.path.basename(new_file_name), live_link)
+            else:
+                # Original Drive upload using rclone
+                await status_msg.edit_text("☁️ **Uploading to Google Drive...**")
+                try:
+                    await rclone_driver(merged_file, new_file_name, user_id, c, cb.message)
+                except Exception as e:
+                    LOGGER.error(f"Drive upload failed: {e}")
+                    await status_msg.edit_text(f"❌ **Drive upload failed!**\nError: `{str(e)}`")
                 
         else:
-            # Enhanced Telegram upload using original function + your features
-            upload_as_doc = UPLOAD_AS_DOC.get(f"{user_id}", False)
-            
-            await uploadVideo(
-                c=c,
-                cb=cb,
-                merged_video_path=merged_file,
-                width=width,
-                height=height,
-                duration=duration,
-                video_thumbnail=video_thumbnail,
-                file_size=file_size,
-                upload_mode=upload_as_doc,
-                custom_filename=custom_filename,
-                upload_to_gofile_flag=False  # Enhanced parameter
-            )
+            # Create thumbnail: the user's own, else the source video's Telegram thumb, else a keyframe
+            try:
+                custom_thumbnail = f"downloads/{user_id}_thumb.jpg" if user.thumbnail else None
+                await status_msg.edit_text("📸 **Creating thumbnail...**")
+                video_thumbnail = await get_thumbnail(merged_file, source_messages, custom_thumbnail)
+            except Exception as e:
+                LOGGER.error(f"Thumbnail creation failed: {e}")
+                video_thumbnail = None
+
+            # Telegram upload; the thumbnail made above is reused as-is
+            await uploadVideo(c, cb.message.chat.id, merged_file, status_msg, video_thumbnail, custom_filename)
         
     except Exception as e:
         LOGGER.error(f"Enhanced merge error: {e}")
         await cb.message.edit_text(f"❌ **Merge process failed!**\nError: `{str(e)}`")
         
     finally:
+        if live_upload and not live_upload.done():
+            live_upload.cancel()
+
         # Cleanup (original logic enhanced)
         try:
             # Clean up downloaded files
@@ -156,11 +175,11 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                     os.remove(file_path)
                     
             # Clean up merged file
-            if 'merged_file' in locals() and merged_file and os.path.exists(merged_file):
+            if merged_file and os.path.exists(merged_file):
                 os.remove(merged_file)
                 
             # Clean up thumbnail
-            if video_thumbnail and os.path.exists(video_thumbnail) and "_thumb.jpg" in video_thumbnail:
+            if video_thumbnail and os.path.exists(video_thumbnail) and ".thumb.jpg" in video_thumbnail:
                 try:
                     os.remove(video_thumbnail)
                 except:
@@ -174,9 +193,22 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
             
         # Clear queues (original logic)
         queueDB.update({user_id: {"videos": [], "subtitles": [], "audios": []}})
+        urlDB.update({user_id: {"urls": [], "downloaded_files": []}})
         formatDB.update({user_id: None})
         
         # Reset upload flags (enhanced)
         UPLOAD_AS_DOC.update({f"{user_id}": False})
         UPLOAD_TO_DRIVE.update({f"{user_id}": False})
         UPLOAD_TO_GOFILE.update({f"{user_id}": False})
+
+async def _finishLiveUpload(live_upload, status_msg):
+    """Waits for the upload-while-merging task. Returns its link, or None if the file must be uploaded from disk"""
+    if live_upload is None:
+        return None
+    if not live_upload.done():
+        await status_msg.edit_text("📤 **Merge complete, finishing upload...**")
+    try:
+        return await live_upload
+    except Exception as e:
+        LOGGER.warning(f"Upload while merging failed, uploading the finished file instead: {e}")
+        return None
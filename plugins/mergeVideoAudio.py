@@ -7,9 +7,10 @@ from pyrogram.types import CallbackQuery
 from __init__ import LOGGER, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, UPLOAD_TO_GOFILE, queueDB, formatDB
 from config import Config
 from helpers.utils import UserSettings, get_readable_file_size
-from helpers.merger import merge_videos, MergeAudio
+from helpers.merger import merge_videos
+from helpers.ffmpeg_helper import MergeAudio
 from helpers.uploader import upload_to_telegram as uploadVideo, upload_to_gofile
-from helpers.downloader import download_from_tg
+from helpers.downloader import download_many_from_tg
 from helpers.rclone_upload import rclone_driver
 from bot import delete_all
 
@@ -26,18 +27,14 @@ async def mergeAudio(c: Client, cb: CallbackQuery, new_file_name: str):
             await cb.message.edit_text("❌ **Need a base video and at least one audio file!**")
             return
 
-        base_msg = await c.get_messages(cb.message.chat.id, vid_id)
-        base_path = await download_from_tg(base_msg, user_id, cb.message)
-
-        audio_paths = []
-        for i, aid in enumerate(msg_ids, 1):
-            msg = await c.get_messages(cb.message.chat.id, aid)
-            await cb.message.edit_text(f"📥 **Downloading audio {i}/{len(msg_ids)}...**")
-            path = await download_from_tg(msg, user_id, cb.message)
-            if path:
-                audio_paths.append(path)
+        messages = await c.get_messages(cb.message.chat.id, [vid_id, *msg_ids])
+        paths = await download_many_from_tg(messages, user_id, cb.message)
+        if not paths:
+            await cb.message.edit_text("❌ **Download failed!** Could not fetch all files.")
+            return
+        base_path, audio_paths = paths[0], paths[1:]
 
-        merged = await MergeAudio(base_path, audio_paths, user_id)
+        merged = await MergeAudio(base_path, [base_path, *audio_paths], user_id, cb.message)
         if not merged:
             await cb.message.edit_text("❌ **Audio merge failed!**")
             return
@@ -47,8 +44,6 @@ async def mergeAudio(c: Client, cb: CallbackQuery, new_file_name: str):
             tn = f"downloads/{user_id}_thumb.jpg"
             thumbnail = tn if os.path.exists(tn) else None
 
-        width = height = duration = 0
-        file_size = os.path.getsize(merged)
         basename = os.path.splitext(os.path.basename(new_file_name))[0]
 
         if UPLOAD_TO_GOFILE.get(str(user_id)):
@@ -57,20 +52,7 @@ async def mergeAudio(c: Client, cb: CallbackQuery, new_file_name: str):
             await cb.message.edit_text("☁️ **Uploading to Google Drive...**")
             await rclone_driver(merged, new_file_name, user_id, c, cb.message)
         else:
-            upload_mode = UPLOAD_AS_DOC.get(str(user_id), False)
-            await uploadVideo(
-                c,
-                cb,
-                merged,
-                width,
-                height,
-                duration,
-                thumbnail,
-                file_size,
-                upload_mode,
-                basename,
-                False,
-            )
+            await uploadVideo(c, cb.message.chat.id, merged, cb.message, thumbnail, basename)
     except Exception as e:
         LOGGER.error(f"Audio merge error: {e}")
         await cb.message.edit_text(f"❌ **Audio merge failed!**\nError: `{e}`")
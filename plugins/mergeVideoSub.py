@@ -7,9 +7,10 @@ from pyrogram.types import CallbackQuery
 from __init__ import LOGGER, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, UPLOAD_TO_GOFILE, queueDB, formatDB
 from config import Config
 from helpers.utils import UserSettings, get_readable_file_size
-from helpers.merger import merge_videos, MergeSubNew
+from helpers.merger import merge_videos
+from helpers.ffmpeg_helper import MergeSubNew
 from helpers.uploader import uploadVideo, upload_to_gofile
-from helpers.downloader import download_from_tg
+from helpers.downloader import download_many_from_tg
 from helpers.rclone_upload import rclone_driver
 from bot import delete_all
 
@@ -26,19 +27,15 @@ async def mergeSub(c: Client, cb: CallbackQuery, new_file_name: str):
             await cb.message.edit_text("❌ **Need a base video and at least one subtitle file!**")
             return
 
-        base_msg = await c.get_messages(cb.message.chat.id, vid_id)
-        base_path = await download_from_tg(base_msg, user_id, cb.message)
-
-        sub_paths = []
-        for i, sid in enumerate(sub_ids, 1):
-            if sid:
-                msg = await c.get_messages(cb.message.chat.id, sid)
-                await cb.message.edit_text(f"📥 **Downloading subtitle {i}/{len(sub_ids)}...**")
-                path = await download_from_tg(msg, user_id, cb.message)
-                if path:
-                    sub_paths.append(path)
+        sub_ids = [sid for sid in sub_ids if sid]
+        messages = await c.get_messages(cb.message.chat.id, [vid_id, *sub_ids])
+        paths = await download_many_from_tg(messages, user_id, cb.message)
+        if not paths:
+            await cb.message.edit_text("❌ **Download failed!** Could not fetch all files.")
+            return
+        base_path, sub_paths = paths[0], paths[1:]
 
-        merged = await MergeSubNew(base_path, None, user_id, sub_paths)
+        merged = await MergeSubNew(base_path, None, user_id, [base_path, *sub_paths], cb.message)
         if not merged:
             await cb.message.edit_text("❌ **Subtitle merge failed!**")
             return
@@ -48,8 +45,6 @@ async def mergeSub(c: Client, cb: CallbackQuery, new_file_name: str):
             tn = f"downloads/{user_id}_thumb.jpg"
             thumbnail = tn if os.path.exists(tn) else None
 
-        width = height = duration = 0
-        file_size = os.path.getsize(merged)
         basename = os.path.splitext(os.path.basename(new_file_name))[0]
 
         if UPLOAD_TO_GOFILE.get(str(user_id)):
@@ -58,20 +53,7 @@ async def mergeSub(c: Client, cb: CallbackQuery, new_file_name: str):
             await cb.message.edit_text("☁️ **Uploading to Google Drive...**")
             await rclone_driver(merged, new_file_name, user_id, c, cb.message)
         else:
-            upload_mode = UPLOAD_AS_DOC.get(str(user_id), False)
-            await uploadVideo(
-                c,
-                cb,
-                merged,
-                width,
-                height,
-                duration,
-                thumbnail,
-                file_size,
-                upload_mode,
-                basename,
-                False,
-            )
+            await uploadVideo(c, cb.message.chat.id, merged, cb.message, thumbnail, basename)
     except Exception as e:
         LOGGER.error(f"Subtitle merge error: {e}")
         await cb.message.edit_text(f"❌ **Subtitle merge failed!**\nError: `{e}`")
@@ -9,10 +9,11 @@ from __init__ import LOGGER, gDict, queueDB
 import os
 from bot import delete_all
 from helpers.display_progress import Progress
-from helpers.ffmpeg_helper import extractAudios, extractSubtitles
-from helpers.uploader import uploadFiles
+from helpers.ffmpeg_helper import extractAudios, extractSubtitles, extractStreams
+from helpers.uploader import upload_document_to_telegram
+from helpers.downloader import download_tg_media
 
-async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=False, exSubs=False):
+async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=False, exSubs=False, exAll=False):
     if not os.path.exists(f"downloads/{str(cb.from_user.id)}/"):
         os.makedirs(f"downloads/{str(cb.from_user.id)}/")
     _hold = await cb.message.edit(text="Please wait")
@@ -24,16 +25,18 @@ async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=Fals
     except Exception as e:
         LOGGER.error(f"Download failed: Unable to find media {e}")
         return
-    c.stream_media(media,)
     try:
         c_time = time.time()
         prog = Progress(cb.from_user.id, c, cb.message)
         progress=f"🚀 Downloading: `{media.file_name}`"
-        file_dl_path = await c.download_media(
-            message=media,
-            file_name=f"downloads/{str(cb.from_user.id)}/{str(omess.id)}/vid.mkv",  # fix for filename with single quote(') in name
-            progress=prog.progress_for_pyrogram,
-            progress_args=(progress, c_time),
+
+        async def on_progress(current, total):
+            await prog.progress_for_pyrogram(current, total, progress, c_time)
+
+        file_dl_path = await download_tg_media(
+            omess,
+            f"downloads/{str(cb.from_user.id)}/{str(omess.id)}/vid.mkv",  # fix for filename with single quote(') in name
+            on_progress,
         )
         if gDict[cb.message.chat.id] and cb.message.id in gDict[cb.message.chat.id]:
             return
@@ -49,12 +52,16 @@ async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=Fals
         await asyncio.sleep(4)
     await _hold.edit_text("Fetching data")
     await asyncio.sleep(3)
-    if exAudios:
+    extract_dir = None
+    if exAll:
+        await _hold.edit_text("Extracting Audios & Subtitles")
+        extract_dir = await extractStreams(file_dl_path, cb.from_user.id, status_message=_hold)
+    elif exAudios:
         await _hold.edit_text("Extracting Audios")
-        extract_dir = await extractAudios(file_dl_path,cb.from_user.id)
-    if exSubs:
+        extract_dir = await extractAudios(file_dl_path, cb.from_user.id, _hold)
+    elif exSubs:
         await _hold.edit_text("Extracting Subtitles")
-        extract_dir = await extractSubtitles(file_dl_path, cb.from_user.id)
+        extract_dir = await extractSubtitles(file_dl_path, cb.from_user.id, _hold)
 
     if extract_dir is None:
         await cb.message.edit("❌ Failed to Extract Streams !")
@@ -68,13 +75,7 @@ async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=Fals
         for f in filenames:
             await asyncio.sleep(5)
             up_path = os.path.join(dirpath,f)
-            await uploadFiles(
-                c=c,
-                cb=cb,
-                up_path=up_path,
-                n=cf,
-                all=no_of_files,
-            )
+            await upload_document_to_telegram(c, cb.message.chat.id, up_path, cb.message, cf, no_of_files)
             cf+=1
             LOGGER.info(f"Uploaded: {up_path}")
     await cb.message.delete()
@@ -0,0 +1,95 @@
+# tests/test_admission.py
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from helpers import admission
+from helpers.admission import DiskAdmission, InsufficientDiskSpace, estimate_merge_footprint
+from helpers.media_cache import MediaCache
+from helpers.merge_planner import STRATEGY_NORMALIZE, STRATEGY_REENCODE
+
+MB = 1024 * 1024
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+class DiskAdmissionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.root = tempfile.mkdtemp(prefix="admission-test-")
+        self.downloads = os.path.join(self.root, "downloads")
+        os.makedirs(self.downloads)
+        self.cache = MediaCache(os.path.join(self.root, "cache"), 100 * MB)
+        self.free = 0
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def disk_usage(self, path):
+        # The fake disk gains back whatever gets evicted from the cache.
+        return DiskUsage(0, 0, self.free + self.cache_size - self.cache.size)
+
+    async def cache_file(self, key: str, size: int) -> str:
+        async def fetch():
+            path = os.path.join(self.root, "src", key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\0" * size)
+            return path
+
+        path = await self.cache.get_or_fetch(key, os.path.join(self.root, "src", key), fetch)
+        os.remove(path)
+        return path
+
+    def test_estimate_scales_with_merge_strategy(self):
+        sizes = [100, 200]
+        self.assertEqual(estimate_merge_footprint(sizes), 600)
+        self.assertEqual(estimate_merge_footprint(sizes, STRATEGY_NORMALIZE, [100]), 700)
+        self.assertEqual(estimate_merge_footprint(sizes, STRATEGY_REENCODE), 900)
+
+    async def test_idle_cache_is_evicted_instead_of_refusing(self):
+        await self.cache_file("old", 30 * MB)
+        await self.cache_file("new", 30 * MB)
+        self.cache_size = self.cache.size
+        self.free = 20 * MB
+        disk = DiskAdmission(self.downloads, 0, self.cache)
+
+        with mock.patch.object(admission.shutil, "disk_usage", self.disk_usage):
+            self.assertTrue(disk.could_fit(70 * MB))
+            self.assertFalse(disk.could_fit(90 * MB))
+            async with disk.reserve(os.path.join(self.downloads, "1"), 40 * MB):
+                pass
+            with self.assertRaises(InsufficientDiskSpace):
+                async with disk.reserve(os.path.join(self.downloads, "1"), 90 * MB):
+                    pass
+
+        # Only the least recently used entry had to go.
+        self.assertEqual([e["key"] for e in self.cache._index.values()], ["new"])
+
+    async def test_linked_cache_hits_are_not_counted_as_written(self):
+        await self.cache_file("hit", 10 * MB)
+        time.sleep(0.05)
+        workspace = os.path.join(self.downloads, "1")
+        self.cache_size = self.cache.size
+        self.free = 500 * MB
+        disk = DiskAdmission(self.downloads, 0, self.cache)
+
+        with mock.patch.object(admission.shutil, "disk_usage", self.disk_usage):
+            async with disk.reserve(workspace, 50 * MB):
+                await self.cache.get_or_fetch("hit", os.path.join(workspace, "hit.mkv"), None)
+                with open(os.path.join(workspace, "merged.mkv"), "wb") as f:
+                    f.write(b"\0" * 5 * MB)
+                # A linked entry is in use, so it can't be evicted to make room either.
+                self.assertEqual(self.cache.reclaimable, 0)
+                self.assertEqual(await disk.available(), self.disk_usage(None).free - 45 * MB)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# tests/test_ffmpeg_job.py
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from helpers.ffmpeg_job import FFmpegJob
+from helpers.ffmpeg_helper import MergeAudio, MergeSub
+from test_merger import FakeStatus, HAVE_FFMPEG, make_clip, probe
+
+# How late a 10ms ticker may wake up while a job runs before we call the loop blocked.
+MAX_LOOP_LAG = 0.2
+TICK = 0.01
+
+
+async def _noop(chunk: bytes):
+    pass
+
+
+async def _run_measuring_lag(awaitable) -> tuple:
+    """Awaits `awaitable` next to a ticker; returns its result and the worst event loop lag seen meanwhile."""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal worst
+        while running:
+            started = loop.time()
+            await asyncio.sleep(TICK)
+            worst = max(worst, loop.time() - started - TICK)
+
+    tick_task = asyncio.ensure_future(ticker())
+    try:
+        result = await awaitable
+    finally:
+        running = False
+        await tick_task
+    return result, worst
+
+
+class FFmpegJobLoopTest(unittest.IsolatedAsyncioTestCase):
+    """
+    FFmpegJob only manages a subprocess, so stand-in commands (`sleep`, `yes`)
+    exercise the same code paths as a long ffmpeg run without needing ffmpeg.
+    """
+
+    async def test_long_silent_process_does_not_block_loop(self):
+        job = FFmpegJob(["sleep", "2"], on_stdout=_noop, stall_timeout=0)
+        started = time.monotonic()
+        _, lag = await _run_measuring_lag(job.run())
+        self.assertTrue(job.ok)
+        self.assertGreaterEqual(time.monotonic() - started, 2)
+        self.assertLess(lag, MAX_LOOP_LAG)
+
+    async def test_flooding_stdout_is_drained_without_blocking_loop(self):
+        received = 0
+
+        async def count(chunk: bytes):
+            nonlocal received
+            received += len(chunk)
+
+        job = FFmpegJob(["yes"], on_stdout=count, timeout=2)
+        _, lag = await _run_measuring_lag(job.run())
+        self.assertTrue(job.timed_out)
+        self.assertFalse(job.ok)
+        self.assertGreater(received, 1024 * 1024)
+        self.assertLess(lag, MAX_LOOP_LAG)
+
+    async def test_flooding_stderr_is_bounded(self):
+        # A single process, like ffmpeg; a shell wrapper's child would outlive the kill and hold the pipe open.
+        flood = "import sys\nwhile True: sys.stderr.write('x' * 4096)"
+        job = FFmpegJob([sys.executable, "-c", flood], on_stdout=_noop, timeout=2, stderr_limit=4096)
+        _, lag = await _run_measuring_lag(job.run())
+        self.assertTrue(job.timed_out)
+        self.assertLessEqual(len(job.stderr_tail), 4096)
+        self.assertLess(lag, MAX_LOOP_LAG)
+
+    async def test_stalled_process_is_killed(self):
+        job = FFmpegJob(["sleep", "30"], on_stdout=_noop, stall_timeout=1)
+        started = time.monotonic()
+        await job.run()
+        self.assertTrue(job.stalled)
+        self.assertLess(time.monotonic() - started, 10)
+
+    async def test_cancel_terminates_process(self):
+        job = FFmpegJob(["sleep", "30"], on_stdout=_noop, stall_timeout=0)
+        task = asyncio.ensure_future(job.run())
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertIsNotNone(job.process.returncode)
+
+
+@unittest.skipUnless(HAVE_FFMPEG, "ffmpeg and ffprobe are needed for a real mux")
+class MuxLoopTest(unittest.IsolatedAsyncioTestCase):
+    """The mux helpers build their paths under ./downloads/<user id>/, so each test runs in a scratch cwd."""
+
+    USER_ID = 7
+
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix="mux-test-")
+        os.chdir(self.root)
+        self.workspace = os.path.join("downloads", str(self.USER_ID))
+        os.makedirs(self.workspace)
+        self.video = os.path.join(self.workspace, "video.mkv")
+        make_clip(self.video, "1280x720", 20, ["-preset", "ultrafast"], audio_seconds=20)
+
+    async def asyncTearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    async def test_audio_mux_keeps_loop_responsive(self):
+        extra = os.path.join(self.workspace, "extra.m4a")
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=880:duration=20",
+            "-c:a", "aac", "-y", extra,
+        ], check=True)
+
+        output, lag = await _run_measuring_lag(MergeAudio(self.video, [self.video, extra], self.USER_ID, FakeStatus()))
+        self.assertLess(lag, MAX_LOOP_LAG)
+        streams = probe(output)["streams"]
+        self.assertEqual([s["codec_type"] for s in streams], ["video", "audio", "audio"])
+        self.assertAlmostEqual(float(probe(output)["format"]["duration"]), 20, delta=0.5)
+
+    async def test_subtitle_mux_keeps_loop_responsive(self):
+        subtitle = os.path.join(self.workspace, "subs.srt")
+        with open(subtitle, "w") as f:
+            f.write("1\n00:00:01,000 --> 00:00:04,000\nHello\n\n2\n00:00:10,000 --> 00:00:12,000\nWorld\n")
+
+        output, lag = await _run_measuring_lag(MergeSub(self.video, subtitle, self.USER_ID, FakeStatus()))
+        self.assertLess(lag, MAX_LOOP_LAG)
+        self.assertEqual(output, self.video)
+        streams = probe(output)["streams"]
+        self.assertEqual([s["codec_type"] for s in streams], ["video", "audio", "subtitle"])
+        self.assertEqual(streams[2]["tags"]["title"], "Track 1 - tg@yashoswalyo")
+
+
+if __name__ == "__main__":
+    unittest.main()
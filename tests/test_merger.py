@@ -0,0 +1,156 @@
+# tests/test_merger.py
+
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from config import Config
+from helpers.merger import merge_videos, _conform_command, _decodes_cleanly, _normalize_outliers
+from helpers.merge_planner import STRATEGY_NORMALIZE, plan_merge
+
+HAVE_FFMPEG = shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+USER_ID = 1
+_message_ids = itertools.count(1)
+
+
+class FakeStatus:
+    """Stands in for the pyrogram status message the merger keeps editing."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(id=USER_ID)
+        self.id = next(_message_ids)
+        self.texts = []
+
+    async def edit_text(self, text: str, *args, **kwargs):
+        self.texts.append(text)
+
+
+def make_clip(path: str, size: str, seconds: float, encoder_args: list, audio_seconds: float = None):
+    """Renders a testsrc clip (with a sine tone, if `audio_seconds` is given) using `encoder_args`."""
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc=size={size}:rate=30:duration={seconds}"]
+    if audio_seconds is not None:
+        command += ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={audio_seconds}"]
+        command += ["-c:a", "aac", "-ac", "2"]
+    command += ["-c:v", "libx264", "-pix_fmt", "yuv420p", *encoder_args, "-y", path]
+    subprocess.run(command, check=True)
+
+
+def probe(path: str) -> dict:
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        check=True, capture_output=True,
+    ).stdout
+    return json.loads(out)
+
+
+def decode_errors(path: str) -> list:
+    """Decodes every video frame of `path` and returns the decoder's error lines."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-v", "error", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    # Timestamp complaints of the null muxer aren't decoding problems.
+    return [line for line in result.stderr.splitlines() if not line.startswith("[null @") and "Last message" not in line]
+
+
+@unittest.skipUnless(HAVE_FFMPEG, "ffmpeg and ffprobe are needed to merge real clips")
+class NormalizeMergeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.root = tempfile.mkdtemp(prefix="merger-test-")
+        self.saved_dir = Config.DOWNLOAD_DIR
+        Config.DOWNLOAD_DIR = self.root
+        self.workspace = os.path.join(self.root, str(USER_ID))
+        os.makedirs(self.workspace)
+
+    async def asyncTearDown(self):
+        Config.DOWNLOAD_DIR = self.saved_dir
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_clips(self) -> list:
+        """Two clips from one encoder setup and, between them, an outlier from a different one."""
+        majority = ["-preset", "veryslow", "-profile:v", "high", "-x264-params", "bframes=0:ref=1"]
+        clips = []
+        for name, size, args in [
+            ("a.mkv", "640x360", majority),
+            ("b.mkv", "320x240", ["-preset", "ultrafast", "-profile:v", "high", "-x264-params", "cabac=0:ref=4"]),
+            ("c.mkv", "640x360", majority),
+        ]:
+            path = os.path.join(self.workspace, name)
+            make_clip(path, size, 2, args, audio_seconds=2)
+            clips.append(path)
+        return clips
+
+    async def test_normalized_outlier_decodes_after_copy_concat(self):
+        clips = self.make_clips()
+        plan = await plan_merge(clips)
+        self.assertEqual(plan["strategy"], STRATEGY_NORMALIZE)
+        self.assertEqual(plan["outliers"], [1])
+
+        merged = await merge_videos(clips, USER_ID, FakeStatus())
+        self.assertIsNotNone(merged)
+        self.assertEqual(decode_errors(merged), [])
+        info = probe(merged)
+        self.assertAlmostEqual(float(info["format"]["duration"]), 6, delta=0.3)
+        video = next(s for s in info["streams"] if s["codec_type"] == "video")
+        self.assertEqual((video["width"], video["height"]), (640, 360))
+        self.assertTrue(any(s["codec_type"] == "audio" for s in info["streams"]))
+
+    async def test_join_without_in_band_headers_fails_verification(self):
+        clips = self.make_clips()
+        conformed = os.path.join(self.workspace, "b_conformed.mkv")
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", clips[1], "-vf", "scale=640:360",
+            "-c:v", "libx264", "-preset", "fast", "-y", conformed,
+        ], check=True)
+        inputs = os.path.join(self.workspace, "inputs.txt")
+        with open(inputs, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in (clips[0], conformed, clips[2]))
+        # Without auto_convert the concat demuxer doesn't move parameter sets in-band either.
+        broken = os.path.join(self.workspace, "broken.mkv")
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-auto_convert", "0",
+            "-f", "concat", "-safe", "0", "-i", inputs, "-c", "copy", "-y", broken,
+        ], check=True)
+        self.assertFalse(await _decodes_cleanly(broken))
+
+    async def test_normalize_target_uses_clamped_average_frame_rate(self):
+        clips = self.make_clips()
+        plan = await plan_merge(clips)
+        # What VFR phone footage reports: a timebase instead of a frame rate.
+        for i in (0, 2):
+            video = next(s for s in plan["properties"][i]["streams"] if s["codec_type"] == "video")
+            video["r_frame_rate"] = "90000/1"
+            plan["signatures"][i]["video_r_frame_rate"] = "90000/1"
+        plan["target"] = plan["signatures"][0]
+
+        conformed = await _normalize_outliers(clips, USER_ID, FakeStatus(), plan)
+        self.assertIsNotNone(conformed)
+        video = next(s for s in probe(conformed[1])["streams"] if s["codec_type"] == "video")
+        self.assertEqual(video["avg_frame_rate"], "30/1")
+
+    async def test_conform_keeps_video_longer_than_its_audio(self):
+        source = os.path.join(self.workspace, "short_audio.mkv")
+        make_clip(source, "320x240", 3, [], audio_seconds=1)
+        target = {
+            "video_codec_name": "h264", "video_profile": "High", "video_width": 320, "video_height": 240,
+            "video_pix_fmt": "yuv420p", "video_r_frame_rate": "30/1", "video_time_base": None,
+            "audio_codec_name": "aac", "audio_sample_rate": "48000", "audio_channel_layout": "stereo",
+            "audio_bit_rate": "128k",
+        }
+        output = os.path.join(self.workspace, "conformed.mkv")
+        subprocess.run(_conform_command(source, output, target, has_audio=True), check=True)
+        self.assertAlmostEqual(float(probe(output)["format"]["duration"]), 3, delta=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
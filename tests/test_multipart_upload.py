@@ -0,0 +1,159 @@
+# tests/test_multipart_upload.py
+
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from aiohttp import web
+from helpers.http_client import http_client
+from helpers.live_output import LiveOutput
+from helpers.uploader import MultipartFileBody, TailingMultipartBody, UPLOAD_CHUNK_SIZE, UPLOAD_READ_AHEAD
+
+FILE_SIZE = 64 * 1024 * 1024
+
+
+class StandInUploadServer:
+    """Accepts a GoFile-style multipart upload and records what arrived."""
+
+    def __init__(self):
+        self.received = {}
+        self.runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application(client_max_size=2 * FILE_SIZE)
+        app.router.add_post("/uploadFile", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/uploadFile"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle(self, request: web.Request):
+        self.received["content_length"] = request.content_length
+        self.received["chunked"] = request.headers.get("Transfer-Encoding") == "chunked"
+        reader = await request.multipart()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            if part.filename is None:
+                self.received[part.name] = (await part.read()).decode()
+                continue
+            digest, size = hashlib.sha256(), 0
+            while True:
+                chunk = await part.read_chunk(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+            self.received["filename"] = part.filename
+            self.received["sha256"] = digest.hexdigest()
+            self.received["size"] = size
+        return web.json_response({"status": "ok", "data": {"downloadPage": "https://gofile.io/d/test"}})
+
+
+class MultipartUploadTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="upload-test-")
+        self.server = StandInUploadServer()
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await http_client.close()
+        await self.server.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def make_file(self, name: str, size: int) -> tuple:
+        path = os.path.join(self.work_dir, name)
+        digest = hashlib.sha256()
+        with open(path, "wb") as f:
+            for _ in range(size // (4 * 1024 * 1024)):
+                block = os.urandom(4 * 1024 * 1024)
+                digest.update(block)
+                f.write(block)
+        return path, digest.hexdigest()
+
+    async def post(self, body) -> dict:
+        headers = {"Content-Type": body.content_type}
+        if body.content_length is not None:
+            headers["Content-Length"] = str(body.content_length)
+        async with http_client.session.post(self.server.url, data=body.stream(), headers=headers) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def test_file_upload_is_exact_with_flat_memory_and_progress(self):
+        path, digest = self.make_file("merged.mkv", FILE_SIZE)
+        reports = []
+
+        async def on_progress(sent, total):
+            reports.append((sent, total))
+
+        body = MultipartFileBody(path, {"token": "abc"}, on_progress)
+        tracemalloc.start()
+        try:
+            result = await self.post(body)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(self.server.received["sha256"], digest)
+        self.assertEqual(self.server.received["filename"], "merged.mkv")
+        self.assertEqual(self.server.received["token"], "abc")
+        self.assertEqual(self.server.received["content_length"], body.content_length)
+        self.assertEqual(reports[-1], (FILE_SIZE, FILE_SIZE))
+        self.assertEqual([sent for sent, _ in reports], sorted(sent for sent, _ in reports))
+        # The read-ahead queue plus what aiohttp holds, far below the 64MB file.
+        self.assertLess(peak, (UPLOAD_READ_AHEAD + 8) * UPLOAD_CHUNK_SIZE)
+
+    async def test_growing_file_is_uploaded_chunked_while_written(self):
+        path = os.path.join(self.work_dir, "merged_live.mkv")
+        live = LiveOutput()
+        attempt = live.begin(path)
+        upload = asyncio.ensure_future(self.post(TailingMultipartBody(attempt, file_name="named.mkv")))
+
+        digest = hashlib.sha256()
+        with open(path, "wb") as f:
+            for _ in range(8):
+                block = os.urandom(1024 * 1024)
+                digest.update(block)
+                f.write(block)
+                f.flush()
+                await asyncio.sleep(0.1)
+        self.assertFalse(upload.done())
+        attempt.end(True)
+
+        await upload
+        self.assertTrue(self.server.received["chunked"])
+        self.assertEqual(self.server.received["filename"], "named.mkv")
+        self.assertEqual(self.server.received["size"], 8 * 1024 * 1024)
+        self.assertEqual(self.server.received["sha256"], digest.hexdigest())
+
+    async def test_failed_writer_aborts_growing_upload(self):
+        path = os.path.join(self.work_dir, "merged_failed.mkv")
+        attempt = LiveOutput().begin(path)
+        with open(path, "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+        upload = asyncio.ensure_future(self.post(TailingMultipartBody(attempt)))
+        await asyncio.sleep(0.3)
+        attempt.end(False)
+        with self.assertRaises(Exception):
+            await upload
+        self.assertNotIn("sha256", self.server.received)
+
+
+if __name__ == "__main__":
+    unittest.main()
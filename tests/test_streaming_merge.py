@@ -0,0 +1,92 @@
+# tests/test_streaming_merge.py
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from config import Config
+from helpers.streaming_merge import _streaming_blocker, merge_while_downloading
+from test_merger import FakeStatus, HAVE_FFMPEG, USER_ID, make_clip, probe
+
+SIGNATURE = {"video_codec_name": "h264", "audio_codec_name": "aac"}
+
+
+def _can_demux_ts() -> bool:
+    """Some static ffmpeg builds crash reading MPEG-TS, which streaming merges are built on."""
+    if not HAVE_FFMPEG:
+        return False
+    sample = subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=0.2", "-f", "mpegts", "-"],
+        capture_output=True,
+    ).stdout
+    result = subprocess.run(["ffmpeg", "-v", "error", "-f", "mpegts", "-i", "-", "-f", "null", "-"], input=sample, capture_output=True)
+    return result.returncode == 0
+
+
+CAN_DEMUX_TS = _can_demux_ts()
+
+
+class StreamingBlockerTest(unittest.TestCase):
+    def test_input_without_duration_is_not_streamed(self):
+        self.assertIsNone(_streaming_blocker(SIGNATURE, None, 12.5))
+        self.assertIsNotNone(_streaming_blocker(SIGNATURE, None, 0))
+        self.assertIsNotNone(_streaming_blocker(SIGNATURE, None, None))
+
+
+@unittest.skipUnless(HAVE_FFMPEG, "ffmpeg and ffprobe are needed to merge real clips")
+class MergeWhileDownloadingTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.root = tempfile.mkdtemp(prefix="streaming-merge-test-")
+        self.saved_dir = Config.DOWNLOAD_DIR
+        Config.DOWNLOAD_DIR = self.root
+        self.workspace = os.path.join(self.root, str(USER_ID))
+        os.makedirs(self.workspace)
+
+    async def asyncTearDown(self):
+        Config.DOWNLOAD_DIR = self.saved_dir
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def downloads(self, paths: list) -> list:
+        futures = [asyncio.get_running_loop().create_future() for _ in paths]
+        for future, path in zip(futures, paths):
+            future.set_result(path)
+        return futures
+
+    @unittest.skipUnless(CAN_DEMUX_TS, "this ffmpeg can't read MPEG-TS")
+    async def test_inputs_are_joined_back_to_back(self):
+        clips = []
+        for name in ("a.mkv", "b.mkv"):
+            clips.append(os.path.join(self.workspace, name))
+            make_clip(clips[-1], "320x240", 2, [], audio_seconds=2)
+
+        status = FakeStatus()
+        merged, files = await merge_while_downloading(self.downloads(clips), USER_ID, status)
+        self.assertEqual(files, clips)
+        self.assertIn("✅ **Merge Complete! (Streaming Mode)**", status.texts)
+        self.assertAlmostEqual(float(probe(merged)["format"]["duration"]), 4, delta=0.3)
+
+    async def test_input_without_duration_goes_through_the_planner(self):
+        source = os.path.join(self.workspace, "source.mkv")
+        make_clip(source, "320x240", 2, [])
+        # A raw elementary stream has no container duration to probe.
+        clips = [os.path.join(self.workspace, "a.h264"), os.path.join(self.workspace, "b.mkv")]
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", source, "-c", "copy", "-f", "h264", "-y", clips[0],
+        ], check=True)
+        shutil.copyfile(source, clips[1])
+
+        status = FakeStatus()
+        await merge_while_downloading(self.downloads(clips), USER_ID, status)
+        self.assertFalse(any("Merging While Downloading" in text for text in status.texts))
+        self.assertIn("🔍 **Analyzing videos...**\nChecking whether they can be merged without re-encoding.", status.texts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# tests/test_streams_extractor.py
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from plugins import cb_handler, streams_extractor
+from test_merger import HAVE_FFMPEG, make_clip, probe
+
+USER_ID = 42
+MEDIA_MESSAGE_ID = 5
+
+
+class FakeMessage:
+    def __init__(self):
+        self.chat = SimpleNamespace(id=USER_ID)
+        self.id = 100
+        self.texts = []
+        self.deleted = False
+
+    async def edit(self, text: str, *args, **kwargs):
+        self.texts.append(text)
+        return self
+
+    edit_text = edit
+
+    async def delete(self):
+        self.deleted = True
+
+
+class FakeClient:
+    """Serves the queued video message and records what gets sent back."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def get_messages(self, chat_id, message_ids):
+        return SimpleNamespace(id=message_ids, video=SimpleNamespace(file_name="clip.mkv"), document=None)
+
+    async def send_document(self, chat_id, document, caption=None, file_name=None, progress=None):
+        await progress(os.path.getsize(document), os.path.getsize(document))
+        self.sent.append((chat_id, file_name, probe(document)["streams"][0]["codec_type"]))
+
+
+async def _no_sleep(seconds):
+    pass
+
+
+@unittest.skipUnless(HAVE_FFMPEG, "ffmpeg and ffprobe are needed to extract real streams")
+class ExtractAllCallbackTest(unittest.IsolatedAsyncioTestCase):
+    """Drives the extract_all_<message id> button through the callback handler, as the bot does."""
+
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix="extract-test-")
+        os.chdir(self.root)
+        self.source = os.path.join(self.root, "source.mkv")
+        clip = os.path.join(self.root, "clip.mkv")
+        make_clip(clip, "320x240", 3, ["-preset", "ultrafast"], audio_seconds=3)
+        subtitle = os.path.join(self.root, "subs.srt")
+        with open(subtitle, "w") as f:
+            f.write("1\n00:00:00,500 --> 00:00:02,000\nHello\n")
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", clip, "-i", subtitle,
+            "-map", "0", "-map", "1", "-c", "copy", "-c:s", "srt", "-y", self.source,
+        ], check=True)
+
+    async def asyncTearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    async def fake_download(self, message, file_path, progress):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        shutil.copyfile(self.source, file_path)
+        return file_path
+
+    async def test_extract_all_uploads_every_stream(self):
+        client, message = FakeClient(), FakeMessage()
+        cb = SimpleNamespace(
+            data=f"extract_all_{MEDIA_MESSAGE_ID}",
+            from_user=SimpleNamespace(id=USER_ID, first_name="Tester", last_name=None),
+            message=message,
+        )
+        with mock.patch.object(streams_extractor, "download_tg_media", self.fake_download), \
+                mock.patch.object(streams_extractor, "asyncio", SimpleNamespace(sleep=_no_sleep)):
+            await cb_handler.callback_handler(client, cb)
+
+        self.assertEqual(sorted(kind for _, _, kind in client.sent), ["audio", "subtitle"])
+        self.assertTrue(all(chat_id == USER_ID for chat_id, _, _ in client.sent))
+        self.assertNotIn("❌ Failed to Extract Streams !", message.texts)
+        self.assertTrue(message.deleted)
+        # The workspace is cleaned up once everything is sent.
+        self.assertFalse(os.path.exists(os.path.join("downloads", str(USER_ID))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# tests/test_thumbnail.py
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from helpers import thumbnail
+from helpers.thumbnail import forget_thumbnails, get_thumbnail
+
+
+class ThumbnailCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.root = tempfile.mkdtemp(prefix="thumbnail-test-")
+        self.custom = os.path.join(self.root, "custom.png")
+        Image.new("RGB", (640, 360), "red").save(self.custom)
+        thumbnail._thumbnails.clear()
+
+    async def asyncTearDown(self):
+        thumbnail._thumbnails.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def output(self, workspace: str, name: str) -> str:
+        path = os.path.join(self.root, workspace, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\0")
+        return path
+
+    async def test_cache_keeps_only_the_most_recent_outputs(self):
+        with mock.patch.object(thumbnail, "THUMB_CACHE_SIZE", 2):
+            first = self.output("1", "a.mkv")
+            await get_thumbnail(first, custom_thumbnail=self.custom)
+            for name in ("b.mkv", "c.mkv"):
+                await get_thumbnail(self.output("1", name), custom_thumbnail=self.custom)
+        self.assertEqual(len(thumbnail._thumbnails), 2)
+        self.assertNotIn(os.path.abspath(first), thumbnail._thumbnails)
+
+    async def test_deleted_workspace_is_forgotten(self):
+        kept = self.output("2", "a.mkv")
+        for path in (self.output("1", "a.mkv"), self.output("1", "b.mkv"), kept):
+            self.assertIsNotNone(await get_thumbnail(path, custom_thumbnail=self.custom))
+        forget_thumbnails(os.path.join(self.root, "1"))
+        self.assertEqual(list(thumbnail._thumbnails), [os.path.abspath(kept)])
+
+
+if __name__ == "__main__":
+    unittest.main()
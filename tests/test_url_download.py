@@ -0,0 +1,217 @@
+# tests/test_url_download.py
+
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the shared media cache out of the way, so every download really hits the stand-in server.
+os.environ["MEDIA_CACHE_QUOTA"] = "0"
+
+from aiohttp import web
+from config import Config
+from helpers.http_client import http_client
+from helpers import downloader
+
+FILE_SIZE = 32 * 1024 * 1024
+# Per-connection rate limit like on a real CDN; it also keeps the segments of one download in flight together.
+CONNECTION_RATE = 16 * 1024 * 1024
+WRITE_SIZE = 256 * 1024
+
+
+class StandInServer:
+    """
+    Serves one random file with HEAD, single byte ranges and If-Range.
+
+    - `ranges=False` makes it ignore Range headers, like servers without range support.
+    - `drop_after` closes the first response after that many bytes, a mid-stream disconnect.
+    """
+
+    def __init__(self, data: bytes, ranges: bool = True, drop_after: int = None):
+        self.data = data
+        self.ranges = ranges
+        self.drop_after = drop_after
+        self.etag = '"v1"'
+        self.bytes_sent = 0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/video.mp4", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/video.mp4"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle(self, request: web.Request):
+        headers = {"ETag": self.etag}
+        if self.ranges:
+            headers["Accept-Ranges"] = "bytes"
+        start, end, status = 0, len(self.data) - 1, 200
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if self.ranges and range_header and (if_range is None or if_range == self.etag):
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start, end, status = int(first), int(last) if last else len(self.data) - 1, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(self.data)}"
+        headers["Content-Length"] = str(end + 1 - start)
+        self.requests.append((request.method, range_header))
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        if request.method == "HEAD":
+            return response
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            position = start
+            while position <= end:
+                block = self.data[position: min(position + WRITE_SIZE, end + 1)]
+                if self.drop_after is not None and self.bytes_sent + len(block) > self.drop_after:
+                    self.drop_after = None
+                    request.transport.close()
+                    return response
+                await response.write(block)
+                position += len(block)
+                self.bytes_sent += len(block)
+                await asyncio.sleep(len(block) / CONNECTION_RATE)
+            await response.write_eof()
+            return response
+        finally:
+            self.active -= 1
+
+
+class UrlDownloadTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data = os.urandom(FILE_SIZE)
+        cls.digest = hashlib.sha256(cls.data).hexdigest()
+
+    async def asyncSetUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="url-download-test-")
+        self.saved = (Config.DOWNLOAD_DIR, Config.PARTIAL_DOWNLOAD_DIR, Config.DOWNLOAD_SEGMENTS, Config.DOWNLOAD_RETRIES)
+        Config.DOWNLOAD_DIR = os.path.join(self.work_dir, "downloads")
+        Config.PARTIAL_DOWNLOAD_DIR = os.path.join(self.work_dir, "partials")
+        Config.DOWNLOAD_SEGMENTS = 4
+        Config.DOWNLOAD_RETRIES = 2
+        self.modes = []
+
+    async def asyncTearDown(self):
+        await http_client.close()
+        Config.DOWNLOAD_DIR, Config.PARTIAL_DOWNLOAD_DIR, Config.DOWNLOAD_SEGMENTS, Config.DOWNLOAD_RETRIES = self.saved
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def progress(self, current, total, mode):
+        if mode not in self.modes:
+            self.modes.append(mode)
+
+    async def download(self, server: StandInServer) -> str:
+        path = await downloader._download_url_file(server.url, 1, self.progress)
+        with open(path, "rb") as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), self.digest)
+        return path
+
+    async def serve(self, **options) -> StandInServer:
+        server = StandInServer(self.data, **options)
+        await server.start()
+        self.addAsyncCleanup(server.stop)
+        return server
+
+    async def test_server_without_ranges_gets_one_stream(self):
+        server = await self.serve(ranges=False)
+        await self.download(server)
+        self.assertEqual(server.max_active, 1)
+        self.assertEqual([r for r in server.requests if r[0] == "GET"], [("GET", None)])
+
+    async def test_ranged_download_uses_concurrent_segments(self):
+        # Throughput against real servers is measured by helpers.url_download_bench instead.
+        server = await self.serve()
+        await self.download(server)
+        self.assertIn(" (4 connections)", self.modes)
+        self.assertEqual(server.max_active, 4)
+        ranges = [r for method, r in server.requests if method == "GET"]
+        self.assertEqual(len(ranges), 4)
+        self.assertTrue(all(r and r.startswith("bytes=") for r in ranges))
+        self.assertEqual(server.bytes_sent, FILE_SIZE)
+
+    async def test_mid_stream_disconnect_is_resumed_from_last_byte(self):
+        server = await self.serve(drop_after=FILE_SIZE // 3)
+        await self.download(server)
+        # Only the bytes lost with the dropped connection's last block may be fetched twice.
+        self.assertLess(server.bytes_sent, FILE_SIZE + 4 * WRITE_SIZE)
+        self.assertGreater(len([r for r in server.requests if r[0] == "GET"]), 4)
+
+    async def test_interrupted_download_resumes_on_next_attempt(self):
+        server = await self.serve()
+        task = asyncio.ensure_future(downloader._download_url_file(server.url, 1, self.progress))
+        while server.bytes_sent < FILE_SIZE // 2:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        first_attempt = server.bytes_sent
+
+        await self.download(server)
+        self.assertIn(" (resumed)", self.modes)
+        self.assertLess(server.bytes_sent - first_attempt, FILE_SIZE - first_attempt // 2)
+
+    async def test_partial_download_survives_workspace_cleanup(self):
+        server = await self.serve()
+        task = asyncio.ensure_future(downloader._download_url_file(server.url, 1, self.progress))
+        while server.bytes_sent < FILE_SIZE // 2:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        # What the merge flow and the cancel button do after every job.
+        shutil.rmtree(os.path.join(Config.DOWNLOAD_DIR, "1"))
+        await self.download(server)
+        self.assertIn(" (resumed)", self.modes)
+        self.assertEqual(os.listdir(os.path.join(Config.PARTIAL_DOWNLOAD_DIR, "1")), [])
+
+    async def test_stale_partials_are_pruned(self):
+        server = await self.serve()
+        task = asyncio.ensure_future(downloader._download_url_file(server.url, 1, self.progress))
+        while server.bytes_sent < FILE_SIZE // 4:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        downloader.prune_partials(max_age=3600)
+        self.assertEqual(len(os.listdir(os.path.join(Config.PARTIAL_DOWNLOAD_DIR, "1"))), 1)
+        downloader.prune_partials(max_age=-1)
+        self.assertEqual(os.listdir(os.path.join(Config.PARTIAL_DOWNLOAD_DIR, "1")), [])
+
+    async def test_changed_remote_file_restarts_download(self):
+        server = await self.serve()
+        task = asyncio.ensure_future(downloader._download_url_file(server.url, 1, self.progress))
+        while server.bytes_sent < FILE_SIZE // 4:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        # New validator: the saved manifest no longer matches, so nothing stale is reused.
+        server.etag = '"v2"'
+        await self.download(server)
+        self.assertNotIn(" (resumed)", self.modes)
+
+
+if __name__ == "__main__":
+    unittest.main()